@@ -56,6 +56,34 @@ MINIO_ACCESS_KEY = env("MINIO_ACCESS_KEY", default="minioadmin")
 MINIO_SECRET_KEY = env("MINIO_SECRET_KEY", default="minioadmin")
 MINIO_USE_SSL = env.bool("MINIO_USE_SSL", default=False)
 MINIO_PUBLIC_USE_SSL = env.bool("MINIO_PUBLIC_USE_SSL", default=True)
+# Threads serving blocking MinIO and ORM calls of the datalake API
+DATALAKE_IO_WORKERS = env.int("DATALAKE_IO_WORKERS", default=32)
+# Upper bound for Cache-Control max-age of datalake listings (seconds)
+DATALAKE_LISTING_MAX_AGE = env.int("DATALAKE_LISTING_MAX_AGE", default=300)
+# Bundle downloads: parallel range reads per request and their in-flight memory cap
+DATALAKE_BUNDLE_WORKERS = env.int("DATALAKE_BUNDLE_WORKERS", default=8)
+DATALAKE_BUNDLE_PART_SIZE = env.int("DATALAKE_BUNDLE_PART_SIZE", default=8 * 1024 * 1024)
+DATALAKE_BUNDLE_MEMORY_BUDGET = env.int("DATALAKE_BUNDLE_MEMORY_BUDGET", default=128 * 1024 * 1024)
+# Largest bounding box (km²) the subset query API accepts
+DATALAKE_QUERY_MAX_AREA = env.int("DATALAKE_QUERY_MAX_AREA", default=2500)
+# Vector tiles: zoom range served from the parquet files and in-process tile cache size
+DATALAKE_TILES_MIN_ZOOM = env.int("DATALAKE_TILES_MIN_ZOOM", default=13)
+DATALAKE_TILES_MAX_ZOOM = env.int("DATALAKE_TILES_MAX_ZOOM", default=16)
+DATALAKE_TILE_CACHE_BYTES = env.int("DATALAKE_TILE_CACHE_BYTES", default=256 * 1024 * 1024)
+# Seconds between checks for a newer per-version manifest in each API process
+DATALAKE_MANIFEST_CHECK_INTERVAL = env.int("DATALAKE_MANIFEST_CHECK_INTERVAL", default=60)
+# Rows per record batch when streaming a partition into GPKG/SHP; bounds the memory of a conversion
+DATALAKE_CONVERT_BATCH_ROWS = env.int("DATALAKE_CONVERT_BATCH_ROWS", default=50_000)
+# Processes of the conversion pool of each heavy worker process (1 converts in-process)
+DATALAKE_CONVERT_PROCESSES = env.int("DATALAKE_CONVERT_PROCESSES", default=1)
+# Rows per chunk when a partition is converted by several processes; chunks are merged afterwards
+DATALAKE_CONVERT_CHUNK_ROWS = env.int("DATALAKE_CONVERT_CHUNK_ROWS", default=500_000)
+# Partitions with more rows are converted in shards of about this many rows on any heavy worker (0 disables)
+DATALAKE_CONVERT_SHARD_ROWS = env.int("DATALAKE_CONVERT_SHARD_ROWS", default=2_000_000)
+# Convert partitions to GPKG/SHP only when a client asks for them instead of at ingest
+DATALAKE_LAZY_CONVERSION = env.bool("DATALAKE_LAZY_CONVERSION", default=False)
+# Target uncompressed row group size of the Hilbert-sorted parquet rewrite
+DATALAKE_ROW_GROUP_BYTES = env.int("DATALAKE_ROW_GROUP_BYTES", default=32 * 1024 * 1024)
 
 
 # URLS
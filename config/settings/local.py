@@ -77,6 +77,7 @@ CELERY_TASK_QUEUES = {
     "default": {},
     "io_tasks": {},
     "heavy_tasks": {},
+    "convert_on_demand": {},
 }
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 10
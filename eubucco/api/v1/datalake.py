@@ -1,23 +1,28 @@
-import tempfile
-import zipfile
+import hashlib
+from datetime import datetime, timezone
 from enum import Enum
-from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
-
-from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-
-from eubucco.data.constants import DATASET_PREFIX
-from eubucco.data.minio_client import (
-    MinioSettings,
-    build_client,
-    ensure_bucket,
-    extract_partitions_from_key,
-    list_objects,
-    presign_get_url,
-    public_s3_uri,
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings as django_settings
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from eubucco.data import catalog, conversions, resolver
+from eubucco.data.async_store import AsyncObjectStore, iterate_io, run_db
+from eubucco.data.bundles import (
+    bundle_fingerprint,
+    bundle_layout,
+    current_prebuilt_bundle,
+    iter_bundle_range,
+    iter_zip_stream,
 )
+from eubucco.data.constants import DATASET_PREFIX
+from eubucco.data.converters import SPATIAL_FORMATS
+from eubucco.data.minio_client import MinioSettings, public_s3_uri, settings_from_django
+from eubucco.data.models import CatalogObject
+from eubucco.data.presign import presign_get_url, presign_many, signing_window
+from eubucco.data.resolver import resolve_partition
 
 router = APIRouter()
 
@@ -32,14 +37,25 @@ class NutsPartitionResponse(BaseModel):
     version: str
     object_count: int
     total_size_bytes: int
+    # From the Parquet footers; None until the catalog has them
+    building_count: Optional[int] = None
+    extent: Optional[List[float]] = Field(default=None, description="xmin, ymin, xmax, ymax in EPSG:3035")
     files: List[DatalakeObject]
 
+class ConversionPendingResponse(BaseModel):
+    status: str = "converting"
+    version: str
+    format: str
+    pending: List[str]
+    retry_after: int
+
 class FileListResponse(BaseModel):
     version: str
     path: str
     object_count: int
     total_size_bytes: int
     files: List[DatalakeObject]
+    next_cursor: Optional[str] = None
 
 class DownloadFormat(str, Enum):
     parquet = "parquet"
@@ -47,133 +63,318 @@ class DownloadFormat(str, Enum):
     shp = "shp"
 
 PartitionKey = Tuple[str, str]  # (version, nuts_id)
+DOWNLOAD_FORMATS = [fmt.value for fmt in DownloadFormat]
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+DEFAULT_PAGE_SIZE = 100
+STREAM_PAGE_SIZE = 500
+CURSOR_DESCRIPTION = "Resume after this nuts_id / key (the last one received)"
+LIMIT_DESCRIPTION = "Page size; enables pagination (see the X-Next-Cursor header)"
 
-def _group_by_partition(objects: Iterable, dataset_prefix: str) -> Dict[PartitionKey, List]:
-    """
-    Group MinIO objects into (version, nuts_id) partitions.
 
-    Expected key layout:
-      {version}/{DATASET_PREFIX}/.../nuts_id={NUTS_CODE}/...
+def _group_by_partition(entries: Iterable[CatalogObject]) -> Dict[PartitionKey, List[CatalogObject]]:
     """
-    grouped: Dict[PartitionKey, List] = {}
-    for obj in objects:
-        parts = obj.object_name.split("/")
-        if len(parts) < 2 or parts[1] != dataset_prefix:
-            continue
+    Group catalog entries into (version, nuts_id) partitions.
+    """
+    grouped: Dict[PartitionKey, List[CatalogObject]] = {}
+    for entry in entries:
+        grouped.setdefault((entry.version, entry.nuts_id or "unspecified"), []).append(entry)
+    return grouped
 
-        version = parts[0]
-        partitions = extract_partitions_from_key(obj.object_name)
-        nuts_id = partitions.get("nuts_id", "unspecified")
 
-        grouped.setdefault((version, nuts_id), []).append(obj)
-    return grouped
+def _to_datalake_objects(settings: MinioSettings, entries: List[CatalogObject]) -> List[DatalakeObject]:
+    urls = presign_many(settings, (entry.key for entry in entries))
+    return [
+        DatalakeObject(
+            key=entry.key,
+            size_bytes=entry.size,
+            s3_uri=public_s3_uri(settings, entry.key),
+            presigned_url=urls[entry.key],
+        )
+        for entry in entries
+    ]
+
+
+def _footer_summary(entries: List[CatalogObject]) -> Tuple[Optional[int], Optional[List[float]]]:
+    """Building count and extent of the partition from the footers of its Parquet objects."""
+    parquet = [entry for entry in entries if entry.format == DownloadFormat.parquet.value]
+    if not parquet or any(entry.num_rows is None for entry in parquet):
+        return None, None
+    extents = [(entry.footer_stats or {}).get("extent") for entry in parquet]
+    if None in extents:
+        return sum(entry.num_rows for entry in parquet), None
+    xmins, ymins, xmaxs, ymaxs = zip(*extents)
+    return sum(entry.num_rows for entry in parquet), [min(xmins), min(ymins), max(xmaxs), max(ymaxs)]
 
 
 def _to_partition_response(
-    client, settings: MinioSettings, partition_key: PartitionKey, objects: List
+    settings: MinioSettings, partition_key: PartitionKey, entries: List[CatalogObject]
 ) -> NutsPartitionResponse:
     version, nuts_id = partition_key
-    files: List[DatalakeObject] = [
-        DatalakeObject(
-            key=obj.object_name,
-            size_bytes=obj.size,
-            s3_uri=public_s3_uri(settings, obj.object_name),
-            presigned_url=presign_get_url(client, settings, obj.object_name),
-        )
-        for obj in objects
-    ]
+    files = _to_datalake_objects(settings, entries)
+    building_count, extent = _footer_summary(entries)
     return NutsPartitionResponse(
         nuts_id=nuts_id,
         version=version,
         object_count=len(files),
         total_size_bytes=sum(file.size_bytes for file in files),
+        building_count=building_count,
+        extent=extent,
         files=files,
     )
 
 
-def _build_zip_for_objects(client, settings: MinioSettings, objects: Iterable) -> Path:
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
-    tmp_path = Path(tmp.name)
+def _cache_headers(request: Request, content_fingerprint: Optional[str]) -> Dict[str, str]:
+    """
+    Validators for a listing built from the catalog rows behind `content_fingerprint`.
 
-    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for obj in objects:
-            resp = client.get_object(settings.bucket, obj.object_name)
-            try:
-                filename = Path(obj.object_name).name
-                zf.writestr(filename, resp.read())
-            finally:
-                resp.close()
-                resp.release_conn()
+    The presigned URLs in the body change with every signing window, so the
+    window is part of the ETag and caches never outlive it.
+    """
+    if content_fingerprint is None:
+        return {}
+    window_start, window_end = signing_window()
+    etag = hashlib.sha256(
+        "|".join([
+            content_fingerprint,
+            request.url.path,
+            request.url.query,
+            request.headers.get("accept", ""),
+            window_start.isoformat(),
+        ]).encode()
+    ).hexdigest()[:32]
+    max_age = min(
+        django_settings.DATALAKE_LISTING_MAX_AGE,
+        int((window_end - datetime.now(timezone.utc)).total_seconds()),
+    )
+    return {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={max(max_age, 0)}",
+        "Vary": "Accept",
+    }
 
-    tmp.close()
-    return tmp_path
 
+def _not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    if "ETag" not in headers:
+        return None
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if headers["ETag"] in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+    return None
 
-@router.get("/nuts/{version}", response_model=List[NutsPartitionResponse])
-async def list_nuts_partitions(version: str, format: DownloadFormat = Query(default=None)):
+
+def _byte_range(request: Request, size: int, etag: str) -> Optional[Tuple[int, int]]:
     """
-    List all NUTS partitions for a specific version and, optionally, a specific format.
+    The `(start, end)` slice requested by a single-range `Range` header, if it applies.
+
+    Multiple ranges, invalid ranges and a stale `If-Range` validator get the
+    full body instead; a range starting past the end is not satisfiable (416).
     """
-    client, settings = build_client()
-    ensure_bucket(client, settings)
+    header = request.headers.get("range", "")
+    if_range = request.headers.get("if-range")
+    if not header.startswith("bytes=") or "," in header or (if_range and if_range != etag):
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            end = min(int(last) + 1, size) if last else size
+        else:
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        return None
+    if start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
 
-    prefix = f"{version}/{DATASET_PREFIX}/"
-    objects = list(list_objects(client, settings, prefix=prefix))
-    grouped = _group_by_partition(objects, dataset_prefix=DATASET_PREFIX)
 
-    if format:
-        for key in grouped:
-            grouped[key] = [
-                obj for obj in grouped[key] if f"/{format.value}/" in obj.object_name
-            ]
+async def _conversion_pending(version: str, nuts_ids: List[str], fmt: str) -> Optional[JSONResponse]:
+    """
+    202 with a `Retry-After` while on-demand conversions of `nuts_ids` to `fmt`
+    are running (enqueued here if needed); None once they are all catalogued.
+    """
+    if not django_settings.DATALAKE_LAZY_CONVERSION or fmt not in SPATIAL_FORMATS:
+        return None
+    pending = await run_db(conversions.request_conversions, version, nuts_ids, fmt)
+    if not pending:
+        return None
+    body = ConversionPendingResponse(
+        version=version, format=fmt, pending=pending, retry_after=conversions.RETRY_AFTER
+    )
+    return JSONResponse(
+        status_code=202, content=body.dict(), headers={"Retry-After": str(conversions.RETRY_AFTER)}
+    )
+
+
+def _wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _set_next_cursor(request: Request, response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor is None:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+async def _iter_pages(fetch_page, after: Optional[str], limit: Optional[int], cursor_of) -> AsyncIterator:
+    """Walk keyset pages of the catalog until `limit` items were produced."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = STREAM_PAGE_SIZE if remaining is None else min(remaining, STREAM_PAGE_SIZE)
+        page = await run_db(fetch_page, after, page_size)
+        for item in page:
+            yield item
+        if len(page) < page_size:
+            break
+        after = cursor_of(page[-1])
+        if remaining is not None:
+            remaining -= len(page)
+
+
+@router.get("/nuts/{version}", response_model=List[NutsPartitionResponse])
+async def list_nuts_partitions(
+    request: Request,
+    response: Response,
+    version: str,
+    format: DownloadFormat = Query(default=None),
+    cursor: Optional[str] = Query(default=None, description=CURSOR_DESCRIPTION),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000, description=LIMIT_DESCRIPTION),
+):
+    """
+    List all NUTS partitions for a specific version and, optionally, a specific format.
+
+    Send `Accept: application/x-ndjson` to receive one partition per line as soon
+    as it is read, instead of a single JSON array.
+    """
+    settings = settings_from_django()
+    formats = [format.value] if format else DOWNLOAD_FORMATS
+
+    # Pages are read from the catalog, the whole listing from the manifest; the ETag follows the body
+    paged = _wants_ndjson(request) or cursor is not None or limit is not None
+    if paged:
+        fingerprint = await run_db(catalog.version_fingerprint, version, formats)
+    else:
+        fingerprint = await resolver.version_fingerprint(version, formats)
+    headers = _cache_headers(request, fingerprint)
+    not_modified = _not_modified(request, headers)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+
+    def fetch_page(after, page_size):
+        return catalog.partition_page(version, formats, after, page_size)
+
+    if _wants_ndjson(request):
+        async def lines():
+            async for nuts_id, entries in _iter_pages(fetch_page, cursor, limit, lambda item: item[0]):
+                partition = _to_partition_response(settings, (version, nuts_id or "unspecified"), entries)
+                yield partition.json() + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+    if cursor is None and limit is None:
+        entries = await resolver.version_objects(version, formats)
+        grouped = _group_by_partition(entries)
+    else:
+        limit = limit or DEFAULT_PAGE_SIZE
+        page = await run_db(fetch_page, cursor, limit)
+        grouped = {(version, nuts_id or "unspecified"): entries for nuts_id, entries in page}
+        _set_next_cursor(request, response, page[-1][0] if len(page) == limit else None)
 
     responses = [
-        _to_partition_response(client, settings, partition_key=key, objects=value)
+        _to_partition_response(settings, partition_key=key, entries=value)
         for key, value in grouped.items()
     ]
 
     return sorted(responses, key=lambda entry: (entry.version, entry.nuts_id))
 
 
-@router.get("/nuts/{version}/{nuts_id}", response_model=NutsPartitionResponse)
-async def get_partition(version: str, nuts_id: str):
+@router.get(
+    "/nuts/{version}/{nuts_id}",
+    response_model=NutsPartitionResponse,
+    responses={202: {"model": ConversionPendingResponse}},
+)
+async def get_partition(
+    request: Request,
+    response: Response,
+    version: str,
+    nuts_id: str,
+    format: DownloadFormat = Query(default=None),
+):
     """
     Return all objects belonging to a specific (version, nuts_id) partition.
-    """
-    client, settings = build_client()
-    ensure_bucket(client, settings)
-
-    prefix = f"{version}/{DATASET_PREFIX}/"
-    objects = list(list_objects(client, settings, prefix=prefix))
-    grouped = _group_by_partition(objects, dataset_prefix=DATASET_PREFIX)
 
-    key: PartitionKey = (version, nuts_id)
-    if key not in grouped:
+    With lazy conversion, asking for a spatial `format` that is not there yet
+    starts its conversion and answers 202 with a `Retry-After` until it is.
+    """
+    store = AsyncObjectStore.from_django()
+    formats = [format.value] if format else DOWNLOAD_FORMATS
+
+    headers = _cache_headers(request, await resolver.partition_fingerprint(version, nuts_id, formats))
+    not_modified = _not_modified(request, headers)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
+
+    entries = await resolve_partition(store, version, nuts_id, formats)
+    if not entries and format is not None:
+        pending = await _conversion_pending(version, [nuts_id], format.value)
+        if pending:
+            return pending
+        # Converted since the manifest was loaded
+        entries = await run_db(catalog.partition_objects, version, nuts_id, formats)
+    if not entries:
         raise HTTPException(status_code=404, detail="Partition not found in object storage")
 
-    return _to_partition_response(client, settings, partition_key=key, objects=grouped[key])
+    return _to_partition_response(store.settings, partition_key=(version, nuts_id), entries=entries)
 
 
-@router.get("/nuts/{version}/{nuts_prefix}/bundle", response_class=FileResponse)
+@router.api_route(
+    "/nuts/{version}/{nuts_prefix}/bundle",
+    methods=["GET", "HEAD"],
+    response_class=StreamingResponse,
+    responses={202: {"model": ConversionPendingResponse}},
+)
 async def download_bundle(
+    request: Request,
     version: str,
     nuts_prefix: str,
     format: DownloadFormat = Query(default=DownloadFormat.parquet)
 ):
-    client, settings = build_client()
-    ensure_bucket(client, settings)
-
-    prefix = f"{version}/{DATASET_PREFIX}/"
-    objects = list(list_objects(client, settings, prefix=prefix))
-    grouped = _group_by_partition(objects, dataset_prefix=DATASET_PREFIX)
+    """
+    Download all objects of a NUTS prefix as one ZIP archive.
 
-    matching_objects = []
-    for (obj_version, nuts_id), objs in grouped.items():
-        if obj_version == version and nuts_id.startswith(nuts_prefix):
-            for obj in objs:
-                if f"/{format.value}/" in obj.object_name:
-                    matching_objects.append(obj)
+    Once the checksums of all members are catalogued the archive has a fixed
+    layout, so `Range` and `If-Range` are honoured and interrupted downloads
+    can be resumed or fetched in parallel segments. With lazy conversion,
+    partitions missing in a spatial `format` are converted first (202 with a
+    `Retry-After` until they are all there).
+    """
+    store = AsyncObjectStore.from_django()
+    await store.ensure_bucket()
+
+    matching_objects = await resolver.prefix_objects(version, nuts_prefix, format.value)
+    if format != DownloadFormat.parquet:
+        converted = {entry.nuts_id for entry in matching_objects}
+        missing = [
+            entry.nuts_id
+            for entry in await resolver.prefix_objects(version, nuts_prefix, DownloadFormat.parquet.value)
+            if entry.nuts_id not in converted
+        ]
+        if missing:
+            pending = await _conversion_pending(version, missing, format.value)
+            if pending:
+                return pending
+            matching_objects = await run_db(catalog.prefix_objects, version, nuts_prefix, format.value)
 
     if not matching_objects:
         raise HTTPException(
@@ -181,32 +382,68 @@ async def download_bundle(
             detail=f"No {format.value} files found for NUTS prefix {nuts_prefix}"
         )
 
-    zip_path = _build_zip_for_objects(client, settings, matching_objects)
     filename = f"eubucco_{version}_{nuts_prefix}_{format.value}.zip"
+    content_disposition = f'attachment; filename="{filename}"'
+
+    prebuilt = await run_db(current_prebuilt_bundle, version, nuts_prefix, format.value, matching_objects)
+    if prebuilt:
+        return RedirectResponse(
+            presign_get_url(
+                store.settings,
+                prebuilt.key,
+                response_headers={"response-content-disposition": content_disposition},
+            )
+        )
+
+    layout = bundle_layout(matching_objects)
+    if layout is None:
+        return StreamingResponse(
+            iterate_io(iter_zip_stream(store.client, store.settings, matching_objects)),
+            media_type="application/zip",
+            headers={"Content-Disposition": content_disposition, "Accept-Ranges": "none"},
+        )
 
-    return FileResponse(
-        zip_path,
+    etag = f'"{bundle_fingerprint(matching_objects)[:32]}"'
+    headers = {"Content-Disposition": content_disposition, "Accept-Ranges": "bytes", "ETag": etag}
+    start, end = _byte_range(request, layout.size, etag) or (0, layout.size)
+    status_code = 200
+    if (start, end) != (0, layout.size):
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{layout.size}"
+    headers["Content-Length"] = str(end - start)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, media_type="application/zip", headers=headers)
+
+    return StreamingResponse(
+        iterate_io(iter_bundle_range(store.client, store.settings, layout, start, end)),
+        status_code=status_code,
         media_type="application/zip",
-        filename=filename,
-        background=None
+        headers=headers,
     )
 
 
 @router.get("/files/{version}", response_model=FileListResponse)
 async def list_files_for_version(
+    request: Request,
+    response: Response,
     version: str,
     path: str = Query(default="", description="Optional subdirectory inside the dataset folder"),
+    cursor: Optional[str] = Query(default=None, description=CURSOR_DESCRIPTION),
+    limit: Optional[int] = Query(default=None, ge=1, le=10000, description=LIMIT_DESCRIPTION),
 ):
     """
     List all files stored under a dataset version (and optional sub-path).
 
+    Send `Accept: application/x-ndjson` to receive one file per line instead.
+
     Examples:
         GET /files/v0.1
         GET /files/v0.1?path=metadata
         GET /files/v0.2?path=nuts_id=DE1
+        GET /files/v0.2?limit=500&cursor=v0.2/buildings/gpkg/nuts_id=DE11/DE11.gpkg
     """
-    client, settings = build_client()
-    ensure_bucket(client, settings)
+    settings = settings_from_django()
 
     prefix = f"{version}/{DATASET_PREFIX}/"
     if path:
@@ -215,17 +452,32 @@ async def list_files_for_version(
         if not prefix.endswith("/"):
             prefix += "/"
 
-    objects = list(list_objects(client, settings, prefix=prefix))
+    headers = _cache_headers(request, await run_db(catalog.path_fingerprint, prefix))
+    not_modified = _not_modified(request, headers)
+    if not_modified:
+        return not_modified
+    response.headers.update(headers)
 
-    files = [
-        DatalakeObject(
-            key=obj.object_name,
-            size_bytes=obj.size,
-            s3_uri=public_s3_uri(settings, obj.object_name),
-            presigned_url=presign_get_url(client, settings, obj.object_name),
-        )
-        for obj in objects
-    ]
+    def fetch_page(after, page_size):
+        return catalog.path_page(prefix, after, page_size)
+
+    if _wants_ndjson(request):
+        async def lines():
+            async for entry in _iter_pages(fetch_page, cursor, limit, lambda item: item.key):
+                yield _to_datalake_objects(settings, [entry])[0].json() + "\n"
+
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+    next_cursor = None
+    if cursor is None and limit is None:
+        entries = await run_db(catalog.path_objects, prefix)
+    else:
+        limit = limit or DEFAULT_PAGE_SIZE
+        entries = await run_db(fetch_page, cursor, limit)
+        next_cursor = entries[-1].key if len(entries) == limit else None
+        _set_next_cursor(request, response, next_cursor)
+
+    files = _to_datalake_objects(settings, entries)
 
     return FileListResponse(
         version=version,
@@ -233,4 +485,5 @@ async def list_files_for_version(
         object_count=len(files),
         total_size_bytes=sum(f.size_bytes for f in files),
         files=files,
+        next_cursor=next_cursor,
     )
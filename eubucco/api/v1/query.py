@@ -0,0 +1,180 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from eubucco.data import aggregate, query, resolver
+from eubucco.data.async_store import iterate_io, run_io
+from eubucco.data.minio_client import settings_from_django
+
+router = APIRouter()
+
+GEOPARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class AggregateResponse(BaseModel):
+    version: str
+    nuts_prefix: str
+    group_by: List[str]
+    metrics: List[str]
+    rows: List[Dict[str, Any]]
+
+
+class BBoxCRS(str, Enum):
+    etrs89_laea = "3035"
+    wgs84 = "4326"
+
+
+def _parse_bbox(value: str) -> query.BBox:
+    try:
+        xmin, ymin, xmax, ymax = (float(part) for part in value.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be 'xmin,ymin,xmax,ymax'")
+    if xmin >= xmax or ymin >= ymax:
+        raise HTTPException(status_code=400, detail="bbox must satisfy xmin < xmax and ymin < ymax")
+    return xmin, ymin, xmax, ymax
+
+
+@router.get("/bbox", response_class=StreamingResponse)
+async def query_bbox(
+    version: str = Query(..., description="Dataset version, e.g. v0.2"),
+    bbox: str = Query(..., description="xmin,ymin,xmax,ymax", example="4040000,2980000,4050000,2990000"),
+    crs: BBoxCRS = Query(default=BBoxCRS.etrs89_laea, description="EPSG code of the bbox coordinates"),
+):
+    """
+    Stream the buildings intersecting a bounding box as a GeoParquet file.
+
+    Only the partitions and Parquet row groups whose `bbox` statistics overlap
+    the box are read; the result keeps the schema of the dataset (EPSG:3035).
+    """
+    box = query.to_dataset_crs(_parse_bbox(bbox), int(crs.value))
+    if query.area_km2(box) > django_settings.DATALAKE_QUERY_MAX_AREA:
+        raise HTTPException(
+            status_code=400,
+            detail=f"bbox is larger than {django_settings.DATALAKE_QUERY_MAX_AREA} km²",
+        )
+
+    entries = await resolver.version_objects(version, ["parquet"])
+    if not entries:
+        raise HTTPException(status_code=404, detail=f"No parquet files found for version {version}")
+
+    settings = settings_from_django()
+    filesystem = query.get_filesystem(settings)
+    candidates = query.candidate_partitions(entries, box)
+    # An empty result still carries the dataset schema, taken from any partition
+    footers = await query.read_footers(filesystem, settings, candidates or entries[:1])
+    selections = query.select_row_groups(zip(candidates, footers), box)
+    schema = query.output_schema([footer.schema for footer in footers])
+
+    filename = f"eubucco_{version}_bbox.parquet"
+    return StreamingResponse(
+        iterate_io(query.iter_bbox_geoparquet(filesystem, settings, selections, box, schema)),
+        media_type=GEOPARQUET_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/attributes", response_class=StreamingResponse)
+async def query_attributes(
+    version: str = Query(..., description="Dataset version, e.g. v0.2"),
+    nuts_prefix: str = Query(
+        ..., min_length=2, description="NUTS code or prefix of the partitions to scan, e.g. DE3"
+    ),
+    columns: Optional[str] = Query(default=None, description="Comma-separated columns (default: all)"),
+    filter: List[str] = Query(
+        default=[],
+        description="Repeatable predicates: `column <op> value` or `column ± column <op> value`",
+        example="height_confidence_upper - height_confidence_lower < 2",
+    ),
+):
+    """
+    Stream selected columns of the buildings matching all filters as Arrow IPC record batches.
+
+    Columns and filters are pushed into the Parquet scan, so only the needed
+    columns are read and row groups are skipped where their statistics allow.
+    Read the response with e.g. `pyarrow.ipc.open_stream`.
+    """
+    entries = await resolver.prefix_objects(version, nuts_prefix, "parquet")
+    if not entries:
+        raise HTTPException(status_code=404, detail=f"No parquet files found for NUTS prefix {nuts_prefix}")
+
+    settings = settings_from_django()
+    filesystem = query.get_filesystem(settings)
+    footers = await query.read_footers(filesystem, settings, entries)
+    schema = query.output_schema([footer.schema for footer in footers])
+    try:
+        projection = query.projection([name.strip() for name in columns.split(",")] if columns else None, schema)
+        row_filter = query.parse_filters(filter, schema)
+    except query.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"eubucco_{version}_{nuts_prefix}.arrows"
+    return StreamingResponse(
+        iterate_io(query.iter_arrow_stream(filesystem, settings, entries, schema, projection, row_filter)),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/aggregate", response_model=AggregateResponse)
+async def query_aggregate(
+    response: Response,
+    version: str = Query(..., description="Dataset version, e.g. v0.2"),
+    nuts_prefix: str = Query(default="", description="Only aggregate partitions with this NUTS prefix"),
+    group_by: str = Query(
+        default="nuts_id", description=f"Comma-separated, any of {', '.join(aggregate.GROUP_COLUMNS)}"
+    ),
+    metric: List[str] = Query(
+        default=["count"],
+        description=f"Repeatable: count or {'/'.join(aggregate.FUNCTIONS[1:])}(column), e.g. avg(height)",
+    ),
+):
+    """
+    Aggregate the buildings of a version server-side, e.g. count and mean height by type per NUTS2.
+
+    Plain counts come from the Parquet footer summaries in the catalog; other
+    results are cached until one of the input partitions changes. The `X-Cache`
+    header tells whether the data was scanned (MISS) or not (HIT, CATALOG).
+    """
+    try:
+        aggregate_query = aggregate.AggregateQuery.parse(group_by.split(","), metric, nuts_prefix)
+    except query.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    entries = await resolver.prefix_objects(version, nuts_prefix, "parquet")
+    if not entries:
+        raise HTTPException(status_code=404, detail=f"No parquet files found for version {version}")
+
+    rows = aggregate.catalog_rows(aggregate_query, entries)
+    if rows is not None:
+        response.headers["X-Cache"] = "CATALOG"
+    else:
+        cache_key = aggregate_query.cache_key(version, entries)
+        rows = await run_io(cache.get, cache_key)
+        response.headers["X-Cache"] = "HIT" if rows is not None else "MISS"
+    if rows is None:
+        settings = settings_from_django()
+        filesystem = query.get_filesystem(settings)
+        footers = await query.read_footers(filesystem, settings, entries)
+        schema = query.output_schema([footer.schema for footer in footers])
+        try:
+            aggregate_query.validate(schema)
+        except query.QueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        rows = await run_io(
+            aggregate.run_aggregate, filesystem, settings, version, entries, schema, aggregate_query
+        )
+        await run_io(cache.set, cache_key, rows, aggregate.CACHE_TIMEOUT)
+
+    return AggregateResponse(
+        version=version,
+        nuts_prefix=nuts_prefix,
+        group_by=list(aggregate_query.group_by),
+        metrics=[metric.label for metric in aggregate_query.metrics],
+        rows=rows,
+    )
@@ -0,0 +1,74 @@
+from django.conf import settings as django_settings
+from fastapi import APIRouter, HTTPException, Path, Request, Response
+
+from eubucco.data import query, resolver, tiles
+from eubucco.data.async_store import run_io
+from eubucco.data.minio_client import settings_from_django
+
+router = APIRouter()
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+TILE_MAX_AGE = 60 * 60
+
+
+@router.get("/{version}.json")
+async def get_tilejson(request: Request, version: str):
+    """TileJSON describing the building tiles of a version, e.g. for MapLibre sources."""
+    if not await resolver.has_version(version):
+        raise HTTPException(status_code=404, detail=f"Unknown version {version}")
+    tile_url = str(request.url_for("get_tile", version=version, z=0, x=0, y=0))
+    return {
+        "tilejson": "3.0.0",
+        "name": f"EUBUCCO {version} buildings",
+        "tiles": [tile_url.replace("/0/0/0.mvt", "/{z}/{x}/{y}.mvt")],
+        "minzoom": django_settings.DATALAKE_TILES_MIN_ZOOM,
+        "maxzoom": django_settings.DATALAKE_TILES_MAX_ZOOM,
+        "vector_layers": [
+            {"id": tiles.LAYER_NAME, "fields": {name: "" for name in tiles.TILE_ATTRIBUTES}},
+        ],
+    }
+
+
+@router.get("/{version}/{z}/{x}/{y}.mvt", response_class=Response)
+async def get_tile(
+    version: str,
+    z: int = Path(..., ge=0, le=24),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+):
+    """
+    Building footprints of an XYZ tile as a Mapbox vector tile (layer `buildings`).
+
+    Tiles below the minimum zoom and tiles without buildings are answered with
+    204 No Content.
+    """
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    headers = {"Cache-Control": f"public, max-age={TILE_MAX_AGE}"}
+    if not django_settings.DATALAKE_TILES_MIN_ZOOM <= z <= django_settings.DATALAKE_TILES_MAX_ZOOM:
+        return Response(status_code=204, headers=headers)
+
+    # The version fingerprint comes from the manifest or one catalog query, so hot tiles skip the footers
+    fingerprint = await resolver.version_fingerprint(version, ["parquet"])
+    if fingerprint is None:
+        raise HTTPException(status_code=404, detail=f"No parquet files found for version {version}")
+    tile_cache = tiles.get_tile_cache()
+    cache_key = (version, z, x, y, fingerprint)
+    tile = tile_cache.get(cache_key)
+    headers["X-Cache"] = "HIT" if tile is not None else "MISS"
+    if tile is None:
+        bbox = tiles.tile_bbox(z, x, y)
+        # Only the footers of partitions whose catalogued extent reaches the tile are read
+        entries = query.candidate_partitions(await resolver.version_objects(version, ["parquet"]), bbox)
+        tile = b""
+        if entries:
+            settings = settings_from_django()
+            filesystem = query.get_filesystem(settings)
+            footers = await query.read_footers(filesystem, settings, entries)
+            selections = query.select_row_groups(zip(entries, footers), bbox)
+            tile = await run_io(tiles.render_tile, filesystem, settings, selections, z, x, y)
+        tile_cache.put(cache_key, tile)
+
+    if not tile:
+        return Response(status_code=204, headers=headers)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE, headers=headers)
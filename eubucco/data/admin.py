@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import CatalogObject, PrebuiltBundle
+
+
+class CatalogObjectAdmin(admin.ModelAdmin):
+    list_display = ("key", "version", "format", "nuts_id", "size", "last_modified")
+    list_filter = ("version", "format")
+    search_fields = ("key",)
+
+
+admin.site.register(CatalogObject, CatalogObjectAdmin)
+
+
+class PrebuiltBundleAdmin(admin.ModelAdmin):
+    list_display = ("key", "version", "nuts_prefix", "format", "size", "built_on")
+    list_filter = ("version", "format")
+
+
+admin.site.register(PrebuiltBundle, PrebuiltBundleAdmin)
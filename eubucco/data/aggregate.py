@@ -0,0 +1,164 @@
+"""
+Server-side aggregations over the Parquet partitions.
+
+DuckDB runs the group-by directly on an Arrow dataset of the MinIO objects, so
+only the grouped and aggregated columns are ever read. Results are cached under
+a key made of the dataset version, the normalised query and the fingerprint of
+the input objects' ETags (`AggregateQuery.cache_key`): a repeated query is
+answered without touching the data and a replaced partition simply leads to a
+new key.
+"""
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import duckdb
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from .catalog import fingerprint
+from .constants import DATASET_PREFIX
+from .minio_client import MinioSettings
+from .models import CatalogObject
+from .query import QueryError, object_path
+
+PARTITION_COLUMN = "nuts_id"
+GROUP_COLUMNS = (PARTITION_COLUMN, "region_id", "city_id", "type", "subtype")
+FUNCTIONS = ("count", "avg", "min", "max", "sum")
+CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+_METRIC = re.compile(r"^(?P<function>[a-z]+)(?:\((?P<column>[A-Za-z_]\w*)\))?$")
+
+
+@dataclass(frozen=True)
+class Metric:
+    function: str
+    column: Optional[str] = None
+
+    @classmethod
+    def parse(cls, text: str) -> "Metric":
+        """Parse `count`, `count(height)` or e.g. `avg(height)`."""
+        match = _METRIC.match(text.strip())
+        if match is None or match["function"] not in FUNCTIONS:
+            raise QueryError(f"Unknown metric: {text} (use one of {', '.join(FUNCTIONS)})")
+        if match["column"] is None and match["function"] != "count":
+            raise QueryError(f"Metric {match['function']} needs a column, e.g. {match['function']}(height)")
+        return cls(match["function"], match["column"])
+
+    @property
+    def label(self) -> str:
+        return self.function if self.column is None else f"{self.function}_{self.column}"
+
+    def sql(self) -> str:
+        return f'{self.function}("{self.column}")' if self.column else "count(*)"
+
+
+@dataclass(frozen=True)
+class AggregateQuery:
+    group_by: Tuple[str, ...]
+    metrics: Tuple[Metric, ...]
+    nuts_prefix: str = ""
+
+    @classmethod
+    def parse(cls, group_by: Iterable[str], metrics: Iterable[str], nuts_prefix: str = "") -> "AggregateQuery":
+        group_by = tuple(column.strip() for column in group_by if column.strip())
+        for column in group_by:
+            if column not in GROUP_COLUMNS:
+                raise QueryError(f"Cannot group by {column} (use one of {', '.join(GROUP_COLUMNS)})")
+        return cls(group_by, tuple(Metric.parse(text) for text in metrics), nuts_prefix)
+
+    def validate(self, schema: pa.Schema) -> None:
+        """Check the metric columns against the dataset schema."""
+        for metric in self.metrics:
+            if metric.column is None:
+                continue
+            index = schema.get_field_index(metric.column)
+            if index < 0:
+                raise QueryError(f"Unknown column: {metric.column}")
+            data_type = schema.field(index).type
+            numeric = pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+            if metric.function != "count" and not numeric:
+                raise QueryError(f"{metric.function} needs a numeric column, {metric.column} is {data_type}")
+
+    def sql(self, relation: str) -> str:
+        groups = [f'"{column}"' for column in self.group_by]
+        metrics = [f'{metric.sql()} AS "{metric.label}"' for metric in self.metrics]
+        statement = f"SELECT {', '.join(groups + metrics)} FROM {relation}"
+        if groups:
+            statement += f" GROUP BY {', '.join(groups)} ORDER BY {', '.join(groups)}"
+        return statement
+
+    def cache_key(self, version: str, entries: Iterable[CatalogObject]) -> str:
+        inputs = fingerprint((entry.key, entry.etag) for entry in entries)
+        query = json.dumps(
+            [self.group_by, [metric.label for metric in self.metrics], self.nuts_prefix]
+        )
+        digest = hashlib.sha256(f"{version}|{query}|{inputs}".encode()).hexdigest()
+        return f"datalake:aggregate:{digest}"
+
+
+def catalog_rows(query: AggregateQuery, entries: List[CatalogObject]) -> Optional[List[dict]]:
+    """
+    Answer counts in total or per partition from the footer summaries in the catalog.
+
+    Returns None when the data has to be scanned: other metrics or groups, or
+    partitions whose footer summary is missing.
+    """
+    if query.group_by not in ((), (PARTITION_COLUMN,)):
+        return None
+    if any(metric.function != "count" for metric in query.metrics):
+        return None
+
+    groups: Dict[Tuple[str, ...], dict] = {}
+    for entry in entries:
+        if entry.num_rows is None:
+            return None
+        columns = (entry.footer_stats or {}).get("columns", {})
+        group = tuple(entry.nuts_id for _ in query.group_by)
+        if group not in groups:
+            groups[group] = {**dict(zip(query.group_by, group)), **{m.label: 0 for m in query.metrics}}
+        row = groups[group]
+        for metric in query.metrics:
+            nulls = 0
+            if metric.column is not None:
+                nulls = columns.get(metric.column, {}).get("null_count")
+                if nulls is None:
+                    return None
+            row[metric.label] += entry.num_rows - nulls
+    return [groups[group] for group in sorted(groups)]
+
+
+def _dataset(
+    filesystem: fs.FileSystem,
+    settings: MinioSettings,
+    version: str,
+    entries: Iterable[CatalogObject],
+    schema: pa.Schema,
+) -> ds.Dataset:
+    if PARTITION_COLUMN not in schema.names:
+        schema = schema.append(pa.field(PARTITION_COLUMN, pa.string()))
+    return ds.dataset(
+        [object_path(settings, entry.key) for entry in entries],
+        schema=schema,
+        format="parquet",
+        filesystem=filesystem,
+        partitioning="hive",
+        partition_base_dir=object_path(settings, f"{version}/{DATASET_PREFIX}/parquet"),
+    )
+
+
+def run_aggregate(
+    filesystem: fs.FileSystem,
+    settings: MinioSettings,
+    version: str,
+    entries: List[CatalogObject],
+    schema: pa.Schema,
+    query: AggregateQuery,
+) -> List[dict]:
+    buildings = _dataset(filesystem, settings, version, entries, schema)
+    with duckdb.connect() as connection:
+        connection.register("buildings", buildings)
+        return connection.execute(query.sql("buildings")).fetch_arrow_table().to_pylist()
@@ -0,0 +1,102 @@
+"""
+Async access to the object store and the catalog for the FastAPI routes.
+
+The `minio` client and the Django ORM are blocking, so every call is pushed to
+a dedicated, explicitly sized thread pool instead of running on the event loop
+(or on the single shared thread `sync_to_async` uses by default). One slow
+listing or bundle therefore no longer stalls every other request of the
+uvicorn process.
+"""
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+from django.conf import settings as django_settings
+from django.db import close_old_connections
+from minio import Minio
+
+from .minio_client import MinioSettings, build_client, ensure_bucket, list_objects
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_exhausted = object()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=django_settings.DATALAKE_IO_WORKERS,
+                    thread_name_prefix="datalake-io",
+                )
+    return _executor
+
+
+async def run_io(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call on the datalake IO pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+
+def _with_db_connection(func: Callable[..., T], *args, **kwargs) -> T:
+    # Same connection lifecycle as a Django request on the pool thread
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run an ORM call on the datalake IO pool and await its result."""
+    return await run_io(_with_db_connection, func, *args, **kwargs)
+
+
+async def iterate_io(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Drive a blocking iterator from the datalake IO pool, one item at a time."""
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(run_io(next, iterator, _exhausted))
+            # Shielded, so a disconnecting client does not lose track of the next() still running on the pool
+            item = await asyncio.shield(pending)
+            pending = None
+            if item is _exhausted:
+                break
+            yield item
+    finally:
+        if pending is not None:
+            # A generator cannot be closed while it is executing
+            with contextlib.suppress(Exception):
+                await pending
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_io(close)
+
+
+class AsyncObjectStore:
+    """Awaitable wrappers around the blocking MinIO calls used by the API."""
+
+    def __init__(self, client: Minio, settings: MinioSettings):
+        self.client = client
+        self.settings = settings
+
+    @classmethod
+    def from_django(cls) -> "AsyncObjectStore":
+        return cls(*build_client())
+
+    async def ensure_bucket(self) -> None:
+        await run_io(ensure_bucket, self.client, self.settings)
+
+    async def stat_object(self, object_name: str):
+        return await run_io(self.client.stat_object, self.settings.bucket, object_name)
+
+    async def list_objects(self, prefix: str = "") -> list:
+        return await run_io(lambda: list(list_objects(self.client, self.settings, prefix=prefix)))
@@ -0,0 +1,291 @@
+"""
+Streaming ZIP bundles of datalake objects.
+
+Objects are piped chunk by chunk from MinIO into a ZIP64 stream, so building a
+bundle never holds a whole object in memory and never touches the disk. The
+chunks are HTTP range reads prefetched by a small thread pool under a fixed
+in-flight memory budget, and are always emitted in catalog order.
+
+When the catalog knows the CRC-32 of every member, the archive is laid out
+deterministically (stored entries, ZIP64 headers, no data descriptors), so its
+size and every byte offset are known up front. Such bundles support `Range`
+requests: any slice of the archive maps to generated header bytes and range
+reads of the member objects.
+
+Bundles of popular NUTS prefixes are additionally materialised at ingest time
+and served as presigned downloads while their members are unchanged.
+"""
+import struct
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from django.conf import settings as django_settings
+from minio import Minio
+
+from .catalog import fingerprint
+from .minio_client import MinioSettings
+from .models import CatalogObject, PrebuiltBundle
+from .streams import ChunkSink
+
+Part = Tuple[CatalogObject, int, int]  # (entry, offset, length)
+Segment = Union[bytes, Part]  # generated bytes or a slice of a member object
+
+# NUTS code lengths that get a prebuilt bundle: countries and NUTS1 regions
+PREBUILT_PREFIX_LENGTHS = (2, 3)
+
+
+def _zip_info(entry: CatalogObject) -> zipfile.ZipInfo:
+    date_time = entry.last_modified.timetuple()[:6] if entry.last_modified else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(Path(entry.key).name, date_time=date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _iter_parts(ranges: Iterable[Part], part_size: int) -> Iterator[Part]:
+    for entry, start, length in ranges:
+        if length <= 0:
+            yield entry, start, 0
+            continue
+        for offset in range(start, start + length, part_size):
+            yield entry, offset, min(part_size, start + length - offset)
+
+
+def _whole_objects(entries: Iterable[CatalogObject]) -> Iterator[Part]:
+    return ((entry, 0, entry.size) for entry in entries)
+
+
+class ObjectPrefetcher:
+    """
+    Fetch `(entry, offset, length)` ranges concurrently while yielding them in order.
+
+    Every range is split into reads of at most `part_size` bytes, and new reads
+    are only scheduled while the parts held in memory stay below `memory_budget`
+    (one part is always allowed so progress is guaranteed).
+    """
+
+    def __init__(
+        self,
+        client: Minio,
+        settings: MinioSettings,
+        ranges: Iterable[Part],
+        workers: Optional[int] = None,
+        part_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+    ):
+        self.client = client
+        self.settings = settings
+        self.workers = workers or django_settings.DATALAKE_BUNDLE_WORKERS
+        self.part_size = part_size or django_settings.DATALAKE_BUNDLE_PART_SIZE
+        self.memory_budget = memory_budget or django_settings.DATALAKE_BUNDLE_MEMORY_BUDGET
+        self._parts = _iter_parts(ranges, self.part_size)
+
+    def _fetch(self, entry: CatalogObject, offset: int, length: int) -> bytes:
+        if length == 0:
+            return b""
+        resp = self.client.get_object(self.settings.bucket, entry.key, offset=offset, length=length)
+        try:
+            return resp.read()
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def __iter__(self) -> Iterator[Tuple[CatalogObject, int, bytes]]:
+        """Yield `(entry, offset, data)` for every part, in range and offset order."""
+        pending: Deque[Tuple[Part, Future]] = deque()
+        in_flight = 0
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bundle")
+        try:
+            next_part = next(self._parts, None)
+            while next_part is not None or pending:
+                while next_part is not None and (
+                    not pending or in_flight + next_part[2] <= self.memory_budget
+                ):
+                    pending.append((next_part, executor.submit(self._fetch, *next_part)))
+                    in_flight += next_part[2]
+                    next_part = next(self._parts, None)
+
+                (entry, offset, length), future = pending.popleft()
+                data = future.result()
+                in_flight -= length
+                yield entry, offset, data
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_zip_stream(
+    client: Minio, settings: MinioSettings, entries: Iterable[CatalogObject]
+) -> Iterator[bytes]:
+    """Yield the bytes of a ZIP archive holding `entries` as they are read from MinIO."""
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w") as zf:
+        dest = None
+        try:
+            for entry, offset, data in ObjectPrefetcher(client, settings, _whole_objects(entries)):
+                if offset == 0:
+                    if dest is not None:
+                        dest.close()
+                    dest = zf.open(_zip_info(entry), "w", force_zip64=True)
+                dest.write(data)
+                yield from sink.drain()
+        finally:
+            if dest is not None:
+                dest.close()
+    yield from sink.drain()
+
+
+ZIP64_VERSION = 45
+UTF8_NAME_FLAG = 0x0800
+ZIP64_MARKER = 0xFFFFFFFF
+
+
+def _dos_date_time(entry: CatalogObject) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = _zip_info(entry).date_time
+    return (
+        (hour << 11) | (minute << 5) | (second // 2),
+        ((year - 1980) << 9) | (month << 5) | day,
+    )
+
+
+@dataclass
+class BundleLayout:
+    """Byte layout of a deterministic bundle: header bytes interleaved with member objects."""
+
+    segments: List[Segment]
+    size: int
+
+    @classmethod
+    def build(cls, entries: Sequence[CatalogObject]) -> "BundleLayout":
+        segments: List[Segment] = []
+        central_directory = []
+        offset = 0
+        for entry in entries:
+            name = Path(entry.key).name.encode()
+            time, date = _dos_date_time(entry)
+            common = (0, time, date, entry.crc32, ZIP64_MARKER, ZIP64_MARKER, len(name))
+            local_header = (
+                struct.pack("<IHHHHHIIIHH", 0x04034B50, ZIP64_VERSION, UTF8_NAME_FLAG, *common, 20)
+                + name
+                + struct.pack("<HHQQ", 0x0001, 16, entry.size, entry.size)
+            )
+            central_directory.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50, ZIP64_VERSION, ZIP64_VERSION, UTF8_NAME_FLAG, *common,
+                    28, 0, 0, 0, 0, ZIP64_MARKER,
+                )
+                + name
+                + struct.pack("<HHQQQ", 0x0001, 24, entry.size, entry.size, offset)
+            )
+            segments.append(local_header)
+            if entry.size:
+                segments.append((entry, 0, entry.size))
+            offset += len(local_header) + entry.size
+
+        directory = b"".join(central_directory)
+        count = len(central_directory)
+        trailer = (
+            struct.pack(
+                "<IQHHIIQQQQ",
+                0x06064B50, 44, ZIP64_VERSION, ZIP64_VERSION, 0, 0, count, count, len(directory), offset,
+            )
+            + struct.pack("<IIQI", 0x07064B50, 0, offset + len(directory), 1)
+            + struct.pack(
+                "<IHHHHIIH",
+                0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF), ZIP64_MARKER, ZIP64_MARKER, 0,
+            )
+        )
+        segments.append(directory + trailer)
+        return cls(segments, offset + len(directory) + len(trailer))
+
+    def slice(self, start: int, end: int) -> Iterator[Segment]:
+        """The segments covering bytes `start` to `end` (exclusive), trimmed to that range."""
+        position = 0
+        for segment in self.segments:
+            length = len(segment) if isinstance(segment, bytes) else segment[2]
+            lo, hi = max(start, position), min(end, position + length)
+            if lo < hi:
+                if isinstance(segment, bytes):
+                    yield segment[lo - position:hi - position]
+                else:
+                    entry, offset, _ = segment
+                    yield entry, offset + lo - position, hi - lo
+            position += length
+            if position >= end:
+                break
+
+
+def bundle_layout(entries: Sequence[CatalogObject]) -> Optional[BundleLayout]:
+    """Deterministic layout of a bundle, or None while a member's checksum is unknown."""
+    if any(entry.crc32 is None for entry in entries):
+        return None
+    return BundleLayout.build(entries)
+
+
+def iter_bundle_range(
+    client: Minio, settings: MinioSettings, layout: BundleLayout, start: int = 0, end: Optional[int] = None
+) -> Iterator[bytes]:
+    """Yield bytes `start` to `end` (exclusive) of a deterministic bundle."""
+    segments = list(layout.slice(start, layout.size if end is None else end))
+    parts = iter(
+        ObjectPrefetcher(client, settings, (s for s in segments if not isinstance(s, bytes)))
+    )
+    try:
+        for segment in segments:
+            if isinstance(segment, bytes):
+                yield segment
+                continue
+            remaining = segment[2]
+            while remaining > 0:
+                _, _, data = next(parts)
+                remaining -= len(data)
+                yield data
+    finally:
+        parts.close()
+
+
+def write_bundle(
+    client: Minio, settings: MinioSettings, entries: Sequence[CatalogObject], output_path: Path
+) -> None:
+    layout = bundle_layout(entries)
+    chunks = (
+        iter_bundle_range(client, settings, layout)
+        if layout is not None
+        else iter_zip_stream(client, settings, entries)
+    )
+    with open(output_path, "wb") as fh:
+        for chunk in chunks:
+            fh.write(chunk)
+
+
+def bundle_fingerprint(entries: Iterable[CatalogObject]) -> str:
+    """Hash of the member keys and ETags; changes whenever any member does."""
+    return fingerprint((entry.key, entry.etag) for entry in entries)
+
+
+def prebuilt_bundle_key(version: str, nuts_prefix: str, fmt: str) -> str:
+    return f"{version}/bundles/{fmt}/{nuts_prefix}.zip"
+
+
+def prebuilt_prefixes(nuts_ids: Iterable[str]) -> List[str]:
+    return sorted({
+        nuts_id[:length]
+        for nuts_id in nuts_ids
+        for length in PREBUILT_PREFIX_LENGTHS
+        if len(nuts_id) >= length
+    })
+
+
+def current_prebuilt_bundle(
+    version: str, nuts_prefix: str, fmt: str, entries: Iterable[CatalogObject]
+) -> Optional[PrebuiltBundle]:
+    """Return the prebuilt bundle for the prefix if it was built from exactly `entries`."""
+    return PrebuiltBundle.objects.filter(
+        version=version,
+        nuts_prefix=nuts_prefix,
+        format=fmt,
+        fingerprint=bundle_fingerprint(entries),
+    ).first()
@@ -0,0 +1,292 @@
+"""
+Postgres-backed catalog of the datalake objects.
+
+The ingestion tasks register every object they upload and the reconciliation
+job keeps the table in sync with the bucket, so the API can resolve partitions,
+NUTS prefixes and formats with indexed queries instead of listing MinIO.
+"""
+import hashlib
+import logging
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from minio import Minio
+
+from .constants import DATASET_PREFIX
+from .minio_client import MinioSettings, extract_partitions_from_key, list_objects
+from .models import CatalogObject
+from .spatial_index import INDEX_FORMAT
+
+
+# Objects derived from the data formats for the API's own use, left out of file listings
+DERIVED_FORMATS = (INDEX_FORMAT, "pmtiles")
+
+
+def parse_key(object_name: str) -> Optional[dict]:
+    """
+    Split a dataset key into its catalog columns.
+
+    Expected key layout:
+      {version}/{DATASET_PREFIX}/{format}/nuts_id={NUTS_CODE}/...
+    """
+    parts = object_name.split("/")
+    # Names starting with "_" are bookkeeping (e.g. manifests of older releases), not data
+    if len(parts) < 3 or parts[1] != DATASET_PREFIX or parts[-1].startswith("_"):
+        return None
+    return {
+        "version": parts[0],
+        "format": parts[2] if len(parts) > 3 else "",
+        "nuts_id": extract_partitions_from_key(object_name).get("nuts_id", ""),
+    }
+
+
+def partition_prefix(version: str, fmt: str, nuts_id: str) -> str:
+    return f"{version}/{DATASET_PREFIX}/{fmt}/nuts_id={nuts_id}/"
+
+
+def entry_from_object(obj) -> Optional[CatalogObject]:
+    """Unsaved catalog entry for a MinIO listing or stat result."""
+    fields = _catalog_fields(obj)
+    return CatalogObject(key=obj.object_name, **fields) if fields is not None else None
+
+
+def _catalog_fields(obj) -> Optional[dict]:
+    fields = parse_key(obj.object_name)
+    if fields is None:
+        return None
+    fields.update(
+        size=obj.size,
+        etag=(obj.etag or "").strip('"'),
+        last_modified=obj.last_modified,
+    )
+    return fields
+
+
+CRC_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CRC_CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def object_crc32(client: Minio, settings: MinioSettings, object_name: str) -> int:
+    crc = 0
+    resp = client.get_object(settings.bucket, object_name)
+    try:
+        for chunk in resp.stream(CRC_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    finally:
+        resp.close()
+        resp.release_conn()
+    return crc
+
+
+# Catalog columns derived from the content of an object, only valid for its ETag
+FOOTER_FIELDS = ("num_rows", "num_row_groups", "uncompressed_size", "footer_stats")
+CONTENT_FIELDS = ("crc32", *FOOTER_FIELDS)
+
+
+def register_object(
+    client: Minio,
+    settings: MinioSettings,
+    object_name: str,
+    crc32: Optional[int] = None,
+    footer: Optional[dict] = None,
+) -> Optional[CatalogObject]:
+    """
+    Stat a freshly uploaded (or skipped) object and upsert its catalog row.
+
+    Pass the `crc32` of the uploaded file and, for Parquet, its `footer`
+    (`query.footer_stats`); without them the values already in the catalog are
+    kept as long as the object's ETag did not change.
+    """
+    fields = _catalog_fields(client.stat_object(settings.bucket, object_name))
+    if fields is None:
+        logging.warning(f"Not a dataset key, skipping catalog entry: {object_name}")
+        return None
+    kept = (
+        CatalogObject.objects.filter(key=object_name, etag=fields["etag"]).values(*CONTENT_FIELDS).first()
+        or {}
+    )
+    fields["crc32"] = crc32 if crc32 is not None else kept.get("crc32")
+    for name in FOOTER_FIELDS:
+        fields[name] = footer[name] if footer is not None else kept.get(name)
+    entry, _ = CatalogObject.objects.update_or_create(key=object_name, defaults=fields)
+    return entry
+
+
+@transaction.atomic
+def reconcile_version(client: Minio, settings: MinioSettings, version: str) -> dict:
+    """
+    Bring the catalog rows of a version in line with the bucket contents.
+
+    This is the only place that walks the whole version prefix.
+    """
+    existing = {entry.key: entry for entry in CatalogObject.objects.filter(version=version)}
+    created, updated = [], []
+
+    for obj in list_objects(client, settings, prefix=f"{version}/{DATASET_PREFIX}/"):
+        fields = _catalog_fields(obj)
+        if fields is None:
+            continue
+        entry = existing.pop(obj.object_name, None)
+        if entry is None:
+            created.append(CatalogObject(key=obj.object_name, **fields))
+        elif entry.etag != fields["etag"] or entry.size != fields["size"]:
+            for name, value in fields.items():
+                setattr(entry, name, value)
+            for name in CONTENT_FIELDS:
+                setattr(entry, name, None)
+            updated.append(entry)
+
+    CatalogObject.objects.bulk_create(created, batch_size=1000)
+    CatalogObject.objects.bulk_update(
+        updated, ["format", "nuts_id", "size", "etag", "last_modified", *CONTENT_FIELDS], batch_size=1000
+    )
+    CatalogObject.objects.filter(pk__in=[entry.pk for entry in existing.values()]).delete()
+
+    return {"created": len(created), "updated": len(updated), "deleted": len(existing)}
+
+
+def fill_missing_checksums(client: Minio, settings: MinioSettings, version: str) -> int:
+    """
+    Compute the CRC-32 of the objects the catalog has no checksum for.
+
+    Only objects that were uploaded outside of the ingestion tasks have to be
+    read back; returns how many were.
+    """
+    missing = CatalogObject.objects.filter(version=version, crc32__isnull=True)
+    count = 0
+    for entry in missing.iterator():
+        entry.crc32 = object_crc32(client, settings, entry.key)
+        entry.save(update_fields=["crc32"])
+        count += 1
+    return count
+
+
+def fill_missing_footer_stats(version: str, read_stats: Callable[[CatalogObject], dict]) -> int:
+    """
+    Store the footer summary of the Parquet objects the catalog has none for.
+
+    `read_stats` returns the `FOOTER_FIELDS` of an entry; returns how many
+    footers were read.
+    """
+    missing = CatalogObject.objects.filter(version=version, format="parquet", num_rows__isnull=True)
+    count = 0
+    for entry in missing.iterator():
+        for name, value in read_stats(entry).items():
+            setattr(entry, name, value)
+        entry.save(update_fields=list(FOOTER_FIELDS))
+        count += 1
+    return count
+
+
+def _ordered(queryset) -> List[CatalogObject]:
+    return list(queryset.order_by("nuts_id", "key"))
+
+
+def fingerprint(rows: Iterable[Tuple[str, str]]) -> str:
+    """Hash of `(key, etag)` pairs; changes whenever any object is added, removed or replaced."""
+    digest = hashlib.sha256()
+    for key, etag in sorted(rows):
+        digest.update(f"{key}:{etag}\n".encode())
+    return digest.hexdigest()
+
+
+def listing_fingerprint(rows: Iterable[Tuple[str, str, Optional[int]]]) -> Optional[str]:
+    """Fingerprint of listed `(key, etag, num_rows)` rows, None when there are none."""
+    # Listings show the footer summary as well, which may be filled in after the object
+    rows = [(key, etag if num_rows is None else f"{etag}:{num_rows}") for key, etag, num_rows in rows]
+    return fingerprint(rows) if rows else None
+
+
+def _queryset_fingerprint(queryset) -> Optional[str]:
+    return listing_fingerprint(queryset.values_list("key", "etag", "num_rows"))
+
+
+def version_fingerprint(version: str, formats: Iterable[str]) -> Optional[str]:
+    return _queryset_fingerprint(CatalogObject.objects.filter(version=version, format__in=list(formats)))
+
+
+def partition_fingerprint(version: str, nuts_id: str, formats: Iterable[str]) -> Optional[str]:
+    return _queryset_fingerprint(
+        CatalogObject.objects.filter(version=version, nuts_id=nuts_id, format__in=list(formats))
+    )
+
+
+def _path_queryset(key_prefix: str):
+    return CatalogObject.objects.filter(key__startswith=key_prefix).exclude(format__in=DERIVED_FORMATS)
+
+
+def path_fingerprint(key_prefix: str) -> Optional[str]:
+    return _queryset_fingerprint(_path_queryset(key_prefix))
+
+
+def has_version(version: str) -> bool:
+    return CatalogObject.objects.filter(version=version).exists()
+
+
+def version_objects(version: str, formats: Optional[Iterable[str]] = None) -> List[CatalogObject]:
+    queryset = CatalogObject.objects.filter(version=version)
+    if formats is not None:
+        queryset = queryset.filter(format__in=list(formats))
+    return _ordered(queryset)
+
+
+def partition_objects(
+    version: str, nuts_id: str, formats: Optional[Iterable[str]] = None
+) -> List[CatalogObject]:
+    queryset = CatalogObject.objects.filter(version=version, nuts_id=nuts_id)
+    if formats is not None:
+        queryset = queryset.filter(format__in=list(formats))
+    return _ordered(queryset)
+
+
+def prefix_objects(version: str, nuts_prefix: str, fmt: str) -> List[CatalogObject]:
+    return _ordered(
+        CatalogObject.objects.filter(
+            version=version, format=fmt, nuts_id__startswith=nuts_prefix
+        )
+    )
+
+
+def objects_by_key(keys: Iterable[str]) -> Dict[str, CatalogObject]:
+    return CatalogObject.objects.in_bulk(list(keys), field_name="key")
+
+
+def path_objects(key_prefix: str) -> List[CatalogObject]:
+    return list(_path_queryset(key_prefix).order_by("key"))
+
+
+def partition_page(
+    version: str, formats: Iterable[str], after: Optional[str] = None, limit: int = 100
+) -> List[Tuple[str, List[CatalogObject]]]:
+    """Keyset page of `(nuts_id, entries)` for the partitions sorting after `after`."""
+    queryset = CatalogObject.objects.filter(version=version, format__in=list(formats))
+    following = queryset if after is None else queryset.filter(nuts_id__gt=after)
+    nuts_ids = list(
+        following.order_by("nuts_id")
+        .values_list("nuts_id", flat=True)
+        .distinct()[:limit]
+    )
+    if not nuts_ids:
+        return []
+
+    page = {nuts_id: [] for nuts_id in nuts_ids}
+    for entry in _ordered(queryset.filter(nuts_id__in=nuts_ids)):
+        page[entry.nuts_id].append(entry)
+    return list(page.items())
+
+
+def path_page(key_prefix: str, after: Optional[str] = None, limit: int = 1000) -> List[CatalogObject]:
+    """Keyset page of the objects below `key_prefix` whose key sorts after `after`."""
+    queryset = _path_queryset(key_prefix)
+    if after is not None:
+        queryset = queryset.filter(key__gt=after)
+    return list(queryset.order_by("key")[:limit])
@@ -0,0 +1,61 @@
+"""
+On-demand conversion of the Parquet partitions to the spatial download formats.
+
+With `DATALAKE_LAZY_CONVERSION` the ingestion pipeline only uploads Parquet.
+When a client asks for a partition or bundle in a format that is not there yet,
+the API enqueues one conversion job per missing partition on a queue served by
+a worker of its own (`celeryworker-on-demand`), so it never waits behind the
+ingestion backlog, and answers 202 with a `Retry-After`. A job
+is single-flighted through `cache.add` on a key per (version, format,
+partition), so concurrent requests share it; the task deletes the key when it
+is done, and a failed job only runs again once the key has expired. The
+converted object is stored in MinIO and catalogued like an eagerly converted
+one.
+"""
+from typing import Iterable, List
+
+from django.core.cache import cache
+
+from config import celery_app
+
+from .models import CatalogObject
+
+ON_DEMAND_QUEUE = "convert_on_demand"
+CONVERT_TASK = "eubucco.data.tasks.convert_partition_task"
+# Longest a conversion may take before another request may enqueue it again
+PENDING_TIMEOUT = 60 * 60
+RETRY_AFTER = 30
+
+
+def pending_key(version: str, nuts_id: str, fmt: str) -> str:
+    return f"datalake:convert:{version}:{fmt}:{nuts_id}"
+
+
+def missing_partitions(version: str, nuts_ids: Iterable[str], fmt: str) -> List[str]:
+    """The partitions among `nuts_ids` that have Parquet but no `fmt` object in the catalog."""
+    nuts_ids = list(nuts_ids)
+    present = set(
+        CatalogObject.objects.filter(version=version, format=fmt, nuts_id__in=nuts_ids)
+        .values_list("nuts_id", flat=True)
+    )
+    stored = set(
+        CatalogObject.objects.filter(version=version, format="parquet", nuts_id__in=nuts_ids)
+        .values_list("nuts_id", flat=True)
+    )
+    return sorted(stored - present)
+
+
+def request_conversions(version: str, nuts_ids: Iterable[str], fmt: str) -> List[str]:
+    """
+    Make sure a conversion job runs for every missing partition; returns the
+    partitions still missing (empty once they are all in the catalog).
+    """
+    missing = missing_partitions(version, nuts_ids, fmt)
+    for nuts_id in missing:
+        if cache.add(pending_key(version, nuts_id, fmt), True, PENDING_TIMEOUT):
+            celery_app.send_task(CONVERT_TASK, args=(version, nuts_id, fmt), queue=ON_DEMAND_QUEUE)
+    return missing
+
+
+def finish_conversion(version: str, nuts_id: str, fmt: str) -> None:
+    cache.delete(pending_key(version, nuts_id, fmt))
@@ -1,105 +1,390 @@
+"""
+Conversion of EUBUCCO parquet partitions to the spatial download formats.
+
+`convert_partition` reads a partition one record batch at a time, normalises
+each batch once with the column types of `schema.COLUMNS` (typed numeric
+columns, categoricals as strings, list columns as JSON) and hands it to the
+writers of all requested formats concurrently. Writers only apply their own
+layout on top of the shared batch and never modify it, so formats do not
+depend on the order they run in.
+
+`convert_partition_parallel` spreads the same work over a process pool: one
+job per format and chunk of row groups, each writing a part that is merged
+afterwards (GeoPackage parts are appended in SQLite, shapefile parts are
+zipped side by side). The ingestion pipeline uses the same parts to shard
+large partitions across heavy workers.
+"""
 import abc
-import json
+import logging
+import multiprocessing
 import shutil
-import tempfile
+import sqlite3
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
 import geopandas as gpd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .schema import SHAPEFILE_NAMES, BatchNormaliser, shapefile_dtypes
+
+# Rows per record batch when streaming a partition into another format
+DEFAULT_BATCH_ROWS = 50_000
+
+
+def read_batches(
+    source: Union[Path, pa.NativeFile], batch_rows: int = DEFAULT_BATCH_ROWS, row_groups: Optional[List[int]] = None
+) -> Iterator[pa.RecordBatch]:
+    """
+    The record batches of a parquet file (or of some of its row groups), at
+    most `batch_rows` rows each, so only one batch is in memory at a time. No
+    rows yield one empty batch, so converters still write the layer.
+    """
+    parquet_file = pq.ParquetFile(source)
+    empty = True
+    for batch in parquet_file.iter_batches(batch_size=batch_rows, row_groups=row_groups):
+        empty = False
+        yield batch
+    if empty:
+        schema = parquet_file.schema_arrow
+        yield pa.RecordBatch.from_arrays([pa.array([], type=f.type) for f in schema], schema=schema)
+
+
+class LayerWriter(abc.ABC):
+    """Writes the normalised batches of one partition to one output file."""
+    def __init__(self, output_path: Path, nuts_id: str):
+        self.output_path = output_path
+        self.nuts_id = nuts_id
+        self.batches = 0
+
+    def write(self, gdf: gpd.GeoDataFrame):
+        """Create the layer with the first batch and append the others; `gdf` must not be modified."""
+        self._write(gdf, "a" if self.batches else "w")
+        self.batches += 1
+
+    @abc.abstractmethod
+    def _write(self, gdf: gpd.GeoDataFrame, mode: str):
+        pass
+
+    def close(self):
+        pass
+
 
 class SpatialConverter(abc.ABC):
     """Base class for converting EUBUCCO parquet data to other formats."""
     @abc.abstractmethod
-    def convert(self, gdf: gpd.GeoDataFrame, output_path: Path, nuts_id: str):
+    def writer(self, output_path: Path, nuts_id: str) -> LayerWriter:
         pass
 
+    def part_writer(self, output_path: Path, nuts_id: str, part: int) -> LayerWriter:
+        """Writer of one part of the output, for partitions converted in chunks."""
+        raise NotImplementedError(f"{type(self).__name__} cannot write parts")
+
+    def part_files(self, output_path: Path, nuts_id: str, part: int) -> List[Path]:
+        """The files a closed part writer left, where `merge_parts` expects them."""
+        raise NotImplementedError(f"{type(self).__name__} cannot write parts")
+
+    def merge_parts(self, output_path: Path, nuts_id: str, parts: int):
+        """Combine the parts written by `part_writer` into the output."""
+        raise NotImplementedError(f"{type(self).__name__} cannot write parts")
+
+    def convert_file(self, source: Path, output_path: Path, nuts_id: str, batch_rows: int = DEFAULT_BATCH_ROWS):
+        """Stream a parquet partition into the output, one record batch at a time."""
+        report = convert_partition(source, nuts_id, {"output": (self, output_path)}, batch_rows)
+        for e in report.errors.values():
+            raise e
+
+
+class GeoPackageWriter(LayerWriter):
+    def _write(self, gdf: gpd.GeoDataFrame, mode: str):
+        gdf.to_file(self.output_path, driver="GPKG", layer=self.nuts_id, mode=mode)
+
+
+def append_geopackage(target: Path, part: Path, layer: str):
+    """
+    Append the features and spatial index entries of a layer in `part` to the
+    same layer in `target`, without decoding them. The layer triggers need
+    GDAL's SQL functions, so they are dropped while copying and restored.
+    """
+    con = sqlite3.connect(target)
+    try:
+        con.execute("ATTACH DATABASE ? AS part", (str(part),))
+        geom = con.execute(
+            "SELECT column_name FROM gpkg_geometry_columns WHERE table_name = ?", (layer,)
+        ).fetchone()[0]
+        table_info = con.execute(f'PRAGMA main.table_info("{layer}")').fetchall()
+        columns = ", ".join(f'"{row[1]}"' for row in table_info if row[1] != "fid")
+        triggers = con.execute(
+            "SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (layer,)
+        ).fetchall()
+        rtree = f'"rtree_{layer}_{geom}"'
+
+        with con:
+            for name, _ in triggers:
+                con.execute(f'DROP TRIGGER main."{name}"')
+            offset = con.execute(f'SELECT COALESCE(MAX(fid), 0) FROM main."{layer}"').fetchone()[0]
+            con.execute(
+                f'INSERT INTO main."{layer}" (fid, {columns}) SELECT fid + ?, {columns} FROM part."{layer}"', (offset,)
+            )
+            con.execute(f"INSERT INTO main.{rtree} SELECT id + ?, minx, maxx, miny, maxy FROM part.{rtree}", (offset,))
+            con.execute(
+                "UPDATE main.gpkg_ogr_contents SET feature_count = (SELECT COUNT(*) FROM main.\"{0}\") "
+                "WHERE lower(table_name) = lower(?)".format(layer),
+                (layer,),
+            )
+            con.execute(
+                f"UPDATE main.gpkg_contents SET "
+                f"min_x = (SELECT MIN(minx) FROM main.{rtree}), max_x = (SELECT MAX(maxx) FROM main.{rtree}), "
+                f"min_y = (SELECT MIN(miny) FROM main.{rtree}), max_y = (SELECT MAX(maxy) FROM main.{rtree}) "
+                f"WHERE table_name = ?",
+                (layer,),
+            )
+            for _, sql in triggers:
+                con.execute(sql)
+        con.execute("DETACH DATABASE part")
+    finally:
+        con.close()
+
+
 class GeoPackageConverter(SpatialConverter):
-    def convert(self, gdf: gpd.GeoDataFrame, output_path: Path, nuts_id: str):
-        # Ensure numeric columns are properly typed
-        float_cols = [
-            "height", "floors", "type_confidence", "subtype_confidence",
-            "height_confidence_lower", "height_confidence_upper",
-            "floors_confidence_lower", "floors_confidence_upper"
-        ]
-        for col in float_cols:
-            gdf[col] = gdf[col].astype(float)
+    def writer(self, output_path: Path, nuts_id: str) -> LayerWriter:
+        return GeoPackageWriter(output_path, nuts_id)
+
+    @staticmethod
+    def part_path(output_path: Path, part: int) -> Path:
+        return output_path.with_name(f"{output_path.stem}.part{part}{output_path.suffix}")
+
+    def part_writer(self, output_path: Path, nuts_id: str, part: int) -> LayerWriter:
+        return GeoPackageWriter(self.part_path(output_path, part), nuts_id)
+
+    def part_files(self, output_path: Path, nuts_id: str, part: int) -> List[Path]:
+        return [path for path in [self.part_path(output_path, part)] if path.exists()]
+
+    def merge_parts(self, output_path: Path, nuts_id: str, parts: int):
+        shutil.move(self.part_path(output_path, 0), output_path)
+        for part in range(1, parts):
+            append_geopackage(output_path, self.part_path(output_path, part), nuts_id)
+            self.part_path(output_path, part).unlink()
 
-        int_cols = [
-            "construction_year",
-            "construction_year_confidence_lower",
-            "construction_year_confidence_upper"
-        ]
-        for col in int_cols:
-            gdf[col] = gdf[col].astype('Int64')
 
-        # Convert categorical -> string
-        for col in gdf.select_dtypes(include=['category']).columns:
-            gdf[col] = gdf[col].astype(str)
+def shapefile_dir(output_path: Path, nuts_id: str) -> Path:
+    # Next to the output, so it is cleaned up with it
+    return output_path.parent / f"{nuts_id}_shp"
 
-        # Convert lists -> JSON strings
-        list_cols = ['type_source_ids', 'subtype_source_ids', 'height_source_ids',
-                    'floors_source_ids', 'construction_year_source_ids']
-        for col in list_cols:
-            gdf[col] = gdf[col].apply(lambda x: json.dumps(list(x)) if x is not None else None)
 
-        gdf.to_file(output_path, driver="GPKG", layer=nuts_id)
+def archive_shapefiles(output_path: Path, nuts_id: str):
+    # Zip the sidecar files (.dbf, .prj, .shx) into the final output
+    shp_dir = shapefile_dir(output_path, nuts_id)
+    shutil.make_archive(str(output_path.with_suffix('')), 'zip', shp_dir)
+    shutil.rmtree(shp_dir)
+
+
+class ShapefileWriter(LayerWriter):
+    def __init__(self, output_path: Path, nuts_id: str, part: Optional[int] = None):
+        super().__init__(output_path, nuts_id)
+        self.part = part
+        self.shp_dir = shapefile_dir(output_path, nuts_id)
+        self.shp_dir.mkdir(exist_ok=True)
+
+    def _write(self, gdf: gpd.GeoDataFrame, mode: str):
+        name = self.nuts_id if self.part is None else f"{self.nuts_id}_part{self.part}"
+        shp_gdf = gdf.astype(shapefile_dtypes(gdf.columns)).rename(columns=SHAPEFILE_NAMES)
+        shp_gdf.to_file(self.shp_dir / f"{name}.shp", driver="ESRI Shapefile", mode=mode)
+
+    def close(self):
+        if self.part is None:
+            archive_shapefiles(self.output_path, self.nuts_id)
+
 
 class ShapefileConverter(SpatialConverter):
-    def convert(self, gdf: gpd.GeoDataFrame, output_path: Path, nuts_id: str):
+    def writer(self, output_path: Path, nuts_id: str) -> LayerWriter:
+        return ShapefileWriter(output_path, nuts_id)
 
-        shp_gdf = gdf.copy()
+    def part_writer(self, output_path: Path, nuts_id: str, part: int) -> LayerWriter:
+        return ShapefileWriter(output_path, nuts_id, part)
 
-        # Ensure numeric columns are properly typed
-        float_cols = [
-            "height", "floors", "type_confidence", "subtype_confidence",
-            "height_confidence_lower", "height_confidence_upper",
-            "floors_confidence_lower", "floors_confidence_upper"
-        ]
-        int_cols = [
-            "construction_year",
-            "construction_year_confidence_lower",
-            "construction_year_confidence_upper"
+    def part_files(self, output_path: Path, nuts_id: str, part: int) -> List[Path]:
+        return sorted(shapefile_dir(output_path, nuts_id).glob(f"{nuts_id}_part{part}.*"))
+
+    def merge_parts(self, output_path: Path, nuts_id: str, parts: int):
+        # Shapefile fields have per-file widths, so the parts stay separate layers in the archive
+        archive_shapefiles(output_path, nuts_id)
+
+
+# The spatial download formats: converter and extension of the stored object
+SPATIAL_FORMATS = {
+    "gpkg": (GeoPackageConverter(), ".gpkg"),
+    "shp": (ShapefileConverter(), ".zip"),
+}
+
+
+@dataclass
+class ConversionReport:
+    # Seconds spent reading, normalising and in the writer of each format
+    seconds: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, Exception] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {seconds:.1f} s" for name, seconds in self.seconds.items())
+
+
+def convert_partition(
+    source: Path,
+    nuts_id: str,
+    outputs: Dict[str, Tuple[SpatialConverter, Path]],
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+) -> ConversionReport:
+    """
+    Convert a parquet partition to several formats in one pass over its
+    record batches. A format whose writer fails is dropped and reported in
+    `errors`; the other formats are still written.
+    """
+    report = ConversionReport(seconds=dict.fromkeys(["read", "normalise", *outputs], 0.0))
+    normaliser = BatchNormaliser(pq.read_schema(source))
+    writers = {fmt: converter.writer(path, nuts_id) for fmt, (converter, path) in outputs.items()}
+
+    def run(fmt: str, step, *args):
+        started = time.perf_counter()
+        try:
+            step(*args)
+        except Exception as e:
+            report.errors[fmt] = e
+        report.seconds[fmt] += time.perf_counter() - started
+
+    batches = read_batches(source, batch_rows)
+    with ThreadPoolExecutor(max_workers=max(len(writers), 1), thread_name_prefix="convert") as executor:
+        while len(report.errors) < len(writers):
+            started = time.perf_counter()
+            batch = next(batches, None)
+            report.seconds["read"] += time.perf_counter() - started
+            if batch is None:
+                break
+
+            started = time.perf_counter()
+            gdf = normaliser(batch)
+            report.seconds["normalise"] += time.perf_counter() - started
+
+            futures = [
+                executor.submit(run, fmt, writer.write, gdf)
+                for fmt, writer in writers.items() if fmt not in report.errors
+            ]
+            for future in futures:
+                future.result()
+
+    for fmt, writer in writers.items():
+        if fmt not in report.errors:
+            run(fmt, writer.close)
+    return report
+
+
+def plan_chunks(source: Path, chunk_rows: int) -> List[List[int]]:
+    """Consecutive row groups of a parquet file, grouped into chunks of about `chunk_rows` rows."""
+    metadata = pq.ParquetFile(source).metadata
+    chunks, rows = [[]], 0
+    for i in range(metadata.num_row_groups):
+        if chunks[-1] and rows >= chunk_rows:
+            chunks.append([])
+            rows = 0
+        chunks[-1].append(i)
+        rows += metadata.row_group(i).num_rows
+    return chunks
+
+
+def convert_chunk(
+    source: Union[Path, pa.NativeFile],
+    nuts_id: str,
+    converter: SpatialConverter,
+    output_path: Path,
+    part: Optional[int],
+    row_groups: Optional[List[int]],
+    batch_rows: int,
+) -> float:
+    """Write some row groups of a partition to one format (or one part of it); returns the seconds it took."""
+    started = time.perf_counter()
+    writer = converter.writer(output_path, nuts_id) if part is None else converter.part_writer(
+        output_path, nuts_id, part
+    )
+    normaliser = BatchNormaliser(pq.read_schema(source))
+    for batch in read_batches(source, batch_rows, row_groups):
+        writer.write(normaliser(batch))
+    writer.close()
+    return time.perf_counter() - started
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool(processes: int) -> Optional[ProcessPoolExecutor]:
+    """
+    The conversion process pool of this worker, created on first use; None
+    when conversions should stay in-process (one process, or a daemonic
+    worker process that may not have children).
+    """
+    global _process_pool
+    if processes <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if _process_pool is None:
+        # Spawned rather than forked, as the calling worker may run threads
+        _process_pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def convert_partition_parallel(
+    source: Path,
+    nuts_id: str,
+    outputs: Dict[str, Tuple[SpatialConverter, Path]],
+    executor: Executor,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    chunk_rows: int = 10 * DEFAULT_BATCH_ROWS,
+) -> ConversionReport:
+    """
+    Convert a parquet partition to several formats with one job per format
+    and chunk of about `chunk_rows` rows. Each job reads and normalises its
+    own batches, which is cheap next to the writes it runs in parallel with.
+    Failures are reported per format like in `convert_partition`.
+    """
+    global _process_pool
+    chunks = plan_chunks(source, chunk_rows)
+    report = ConversionReport(seconds=dict.fromkeys([*outputs, "merge"], 0.0))
+    futures = {
+        fmt: [
+            executor.submit(
+                convert_chunk, source, nuts_id, converter, path, None if len(chunks) == 1 else part, row_groups,
+                batch_rows,
+            )
+            for part, row_groups in enumerate(chunks)
         ]
-        for col in int_cols + float_cols:
-            shp_gdf[col] = shp_gdf[col].astype(float)
-
-        # Convert categorical -> string
-        for col in shp_gdf.select_dtypes(include=['category']).columns:
-            shp_gdf[col] = shp_gdf[col].astype(str)
-
-        # Convert lists -> JSON strings
-        list_cols = ['type_source_ids', 'subtype_source_ids', 'height_source_ids',
-                    'floors_source_ids', 'construction_year_source_ids']
-        for col in list_cols:
-            shp_gdf[col] = shp_gdf[col].apply(lambda x: json.dumps(list(x)) if x is not None else None)
-
-        # Shapefile column names must be <= 10 chars.
-        rename_dict = {
-            "construction_year": "const_yr",
-            "type_confidence": "t_conf",
-            "subtype_confidence": "s_conf",
-            "height_confidence_lower": "h_conf_lo",
-            "height_confidence_upper": "h_conf_hi",
-            "floors_confidence_lower": "f_conf_lo",
-            "floors_confidence_upper": "f_conf_hi",
-            "construction_year_confidence_lower": "c_conf_lo",
-            "construction_year_confidence_upper": "c_conf_hi",
-            "geometry_source": "geom_src",
-            "type_source": "t_src",
-            "subtype_source": "s_src",
-            "height_source": "h_src",
-            "floors_source": "f_src",
-            "construction_year_source": "c_src",
-            "geometry_source_id": "geom_sid",
-            "type_source_ids": "t_sids",
-            "subtype_source_ids": "s_sids",
-            "height_source_ids": "h_sids",
-            "floors_source_ids": "f_sids",
-            "construction_year_source_ids": "c_sids",
-            "subtype_raw": "s_raw"
-        }
-        shp_gdf = shp_gdf.rename(columns=rename_dict)
-
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            shp_path = Path(tmp_dir) / f"{nuts_id}.shp"
-            shp_gdf.to_file(shp_path, driver="ESRI Shapefile")
-            # Zip the sidecar files (.dbf, .prj, .shx) into the final output
-            shutil.make_archive(str(output_path.with_suffix('')), 'zip', tmp_dir)
+        for fmt, (converter, path) in outputs.items()
+    }
+
+    for fmt, (converter, path) in outputs.items():
+        try:
+            report.seconds[fmt] = sum(future.result() for future in futures[fmt])
+            if len(chunks) > 1:
+                started = time.perf_counter()
+                converter.merge_parts(path, nuts_id, len(chunks))
+                report.seconds["merge"] += time.perf_counter() - started
+        except BrokenProcessPool as e:
+            # A child died (most likely out of memory); the next conversion starts a new pool
+            logging.error(f"Conversion process pool broke while converting {nuts_id}")
+            executor.shutdown(wait=False, cancel_futures=True)
+            if executor is _process_pool:
+                _process_pool = None
+            report.errors[fmt] = e
+            _discard(futures[fmt])
+        except Exception as e:
+            report.errors[fmt] = e
+            _discard(futures[fmt])
+    return report
+
+
+def _discard(futures: List[Future]) -> None:
+    """Cancel the pending chunks of a failed format and wait for the running ones."""
+    # Otherwise they keep writing into the output directory the caller is about to remove
+    for future in futures:
+        future.cancel()
+    wait(futures)
@@ -0,0 +1,67 @@
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from eubucco.data.converters import SPATIAL_FORMATS, convert_partition_parallel
+from eubucco.data.management.commands.benchmark_normalise import synthetic_batch
+
+def write_synthetic_partition(path: Path, rows: int, batch_rows: int, seed: int):
+    batch = synthetic_batch(batch_rows, seed)
+    with pq.ParquetWriter(path, batch.schema) as writer:
+        for start in range(0, rows, batch_rows):
+            writer.write_batch(batch.slice(0, min(batch_rows, rows - start)), row_group_size=batch_rows)
+
+
+class Command(BaseCommand):
+    help = "Measure how the GPKG/SHP conversion of a partition scales with the size of the process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", type=Path, help="Parquet partitions (default: a synthetic one)")
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--cores", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument("--formats", nargs="+", choices=list(SPATIAL_FORMATS), default=list(SPATIAL_FORMATS))
+        parser.add_argument("--batch-rows", type=int, default=settings.DATALAKE_CONVERT_BATCH_ROWS)
+        parser.add_argument("--chunk-rows", type=int, default=settings.DATALAKE_CONVERT_CHUNK_ROWS)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = options["paths"]
+            if not paths:
+                paths = [Path(tmp_dir) / "XX00.parquet"]
+                write_synthetic_partition(paths[0], options["rows"], options["batch_rows"], seed=0)
+
+            for source in paths:
+                rows = pq.ParquetFile(source).metadata.num_rows
+                self.stdout.write(f"{source.stem}: {rows} rows, {', '.join(options['formats'])}")
+                baseline = None
+                for cores in options["cores"]:
+                    elapsed = self.run(source, Path(tmp_dir) / f"{cores}", cores, options)
+                    baseline = baseline or elapsed
+                    self.stdout.write(
+                        f"{cores:>4} cores: {elapsed:8.1f} s, {rows / elapsed:10,.0f} rows/s, "
+                        f"speedup {baseline / elapsed:.1f}x"
+                    )
+
+    def run(self, source: Path, output_dir: Path, cores: int, options) -> float:
+        output_dir.mkdir()
+        outputs = {}
+        for fmt in options["formats"]:
+            converter, ext = SPATIAL_FORMATS[fmt]
+            outputs[fmt] = (converter, output_dir / f"{source.stem}{ext}")
+        with ProcessPoolExecutor(max_workers=cores, mp_context=multiprocessing.get_context("spawn")) as executor:
+            # Start the processes before timing
+            list(executor.map(time.sleep, [0.5] * cores))
+            started = time.perf_counter()
+            report = convert_partition_parallel(
+                source, source.stem, outputs, executor, options["batch_rows"], options["chunk_rows"]
+            )
+            elapsed = time.perf_counter() - started
+        for fmt, e in report.errors.items():
+            self.stderr.write(f"{fmt} failed: {e}")
+        return elapsed
@@ -0,0 +1,81 @@
+import json
+import time
+from typing import Union
+
+import geopandas as gpd
+import numpy as np
+import pyarrow as pa
+import shapely
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from eubucco.data.schema import COLUMNS, FLOAT, INT, LIST, BatchNormaliser, columns_of_kind
+
+SOURCES = ["osm", "msft", "gov-france", "estimated"]
+GEO = {"version": "1.1.0", "primary_column": "geometry", "columns": {"geometry": {"encoding": "WKB"}}}
+
+
+def synthetic_batch(rows: int, seed: int) -> pa.RecordBatch:
+    """A record batch of random buildings with the EUBUCCO columns and about 30% nulls."""
+    rng = np.random.default_rng(seed)
+
+    def nulls():
+        return rng.random(rows) < 0.3
+
+    arrays = {}
+    for column in COLUMNS:
+        if column.kind == FLOAT:
+            arrays[column.name] = pa.array(rng.random(rows) * 30, mask=nulls())
+        elif column.kind == INT:
+            arrays[column.name] = pa.array(rng.integers(1800, 2024, rows), mask=nulls())
+        elif column.kind == LIST:
+            ids = [[f"{SOURCES[i % 4]}_{i}" for i in range(n)] for n in rng.integers(1, 4, rows)]
+            arrays[column.name] = pa.array(ids, pa.list_(pa.string()), mask=nulls())
+        else:
+            arrays[column.name] = pa.array(rng.choice(SOURCES, rows), mask=nulls()).dictionary_encode()
+    x, y = rng.random(rows) * 1e5, rng.random(rows) * 1e5
+    arrays["geometry"] = pa.array(shapely.to_wkb(shapely.box(x, y, x + 10, y + 10)))
+    return pa.RecordBatch.from_pydict(arrays, metadata={"geo": json.dumps(GEO)})
+
+
+def pandas_normalise(batch: Union[pa.RecordBatch, pa.Table]) -> gpd.GeoDataFrame:
+    """The row-wise pandas normalisation the converters used before `BatchNormaliser`, as the baseline."""
+    df = batch.to_pandas()
+    df["geometry"] = gpd.GeoSeries.from_wkb(df["geometry"], crs="EPSG:3035")
+    gdf = gpd.GeoDataFrame(df, geometry="geometry")
+    columns = set(gdf.columns)
+    for col in columns.intersection(columns_of_kind(FLOAT)):
+        gdf[col] = gdf[col].astype(float)
+    for col in columns.intersection(columns_of_kind(INT)):
+        gdf[col] = gdf[col].astype("Int64")
+    for col in gdf.select_dtypes(include=["category"]).columns:
+        gdf[col] = gdf[col].astype(object).fillna("nan").astype(str)
+    for col in columns.intersection(columns_of_kind(LIST)):
+        gdf[col] = gdf[col].apply(lambda x: json.dumps(list(x)) if x is not None else None)
+    return gdf
+
+
+class Command(BaseCommand):
+    help = "Compare the rows/sec of the pandas and the Arrow normalisation of converter batches on synthetic data."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5_000_000)
+        parser.add_argument("--batch-rows", type=int, default=settings.DATALAKE_CONVERT_BATCH_ROWS)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rows, batch_rows = options["rows"], options["batch_rows"]
+        # One batch, fed repeatedly, stands in for a partition of `rows` rows
+        batch = synthetic_batch(min(rows, batch_rows), options["seed"])
+        normaliser = BatchNormaliser(batch.schema)
+        sizes = [batch_rows] * (rows // batch_rows) + ([rows % batch_rows] if rows % batch_rows else [])
+
+        self.stdout.write(f"{rows} rows in {len(sizes)} batches of up to {batch_rows} rows")
+        timings = {}
+        for name, run in [("pandas", pandas_normalise), ("arrow", normaliser)]:
+            started = time.perf_counter()
+            for size in sizes:
+                run(batch.slice(0, size))
+            timings[name] = time.perf_counter() - started
+            self.stdout.write(f"{name:>8}: {timings[name]:8.1f} s, {rows / timings[name]:12,.0f} rows/s")
+        self.stdout.write(f" speedup: {timings['pandas'] / timings['arrow']:.1f}x")
@@ -0,0 +1,89 @@
+import asyncio
+import bisect
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from eubucco.data.async_store import AsyncObjectStore
+from eubucco.data.constants import DATASET_PREFIX
+from eubucco.data.minio_client import MinioSettings, extract_partitions_from_key, list_objects
+from eubucco.data.resolver import list_partition_prefixes
+
+FORMATS = {"parquet": "parquet", "gpkg": "gpkg", "shp": "zip"}
+LIST_PAGE_SIZE = 1000  # keys per ListObjectsV2 response
+
+
+class SyntheticBucket:
+    """In-memory stand-in for MinIO that charges a round trip per listing page."""
+
+    def __init__(self, keys, page_latency: float):
+        self.keys = sorted(keys)
+        self.page_latency = page_latency
+        self.listed = 0
+
+    def list_objects(self, bucket, prefix="", recursive=True):
+        start = bisect.bisect_left(self.keys, prefix)
+        time.sleep(self.page_latency)
+        for count, key in enumerate(self.keys[start:], start=1):
+            if not key.startswith(prefix):
+                break
+            if count % LIST_PAGE_SIZE == 0:
+                time.sleep(self.page_latency)
+            self.listed += 1
+            yield SimpleNamespace(
+                object_name=key, size=1, etag="0", last_modified=datetime.now(timezone.utc)
+            )
+
+
+def full_scan_lookup(client, settings, version, nuts_id):
+    """The previous get_partition: list the whole version and group it in Python."""
+    grouped = {}
+    for obj in list_objects(client, settings, prefix=f"{version}/{DATASET_PREFIX}/"):
+        partitions = extract_partitions_from_key(obj.object_name)
+        grouped.setdefault(partitions.get("nuts_id", "unspecified"), []).append(obj)
+    return grouped.get(nuts_id, [])
+
+
+class Command(BaseCommand):
+    help = "Compare full-version scans with per-partition prefix listings on a synthetic bucket."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--partitions", type=int, default=1500)
+        parser.add_argument("--lookups", type=int, default=20)
+        parser.add_argument("--page-latency-ms", type=float, default=15.0)
+
+    def handle(self, *args, **options):
+        version = "v0.2"
+        nuts_ids = [f"X{i // 100:02d}{i % 100:02d}" for i in range(options["partitions"])]
+        keys = [
+            f"{version}/{DATASET_PREFIX}/{fmt}/nuts_id={nuts_id}/{nuts_id}.{ext}"
+            for nuts_id in nuts_ids
+            for fmt, ext in FORMATS.items()
+        ]
+        bucket = SyntheticBucket(keys, options["page_latency_ms"] / 1000)
+        settings = MinioSettings()
+        store = AsyncObjectStore(bucket, settings)
+        targets = random.Random(0).sample(nuts_ids, min(options["lookups"], len(nuts_ids)))
+
+        def full_scan(nuts_id):
+            return full_scan_lookup(bucket, settings, version, nuts_id)
+
+        def prefix_fan_out(nuts_id):
+            return asyncio.run(list_partition_prefixes(store, version, nuts_id, FORMATS))
+
+        self.stdout.write(f"{len(keys)} objects, {options['page_latency_ms']} ms per listing page")
+        for name, lookup in [("full version scan", full_scan), ("prefix fan-out", prefix_fan_out)]:
+            timings = []
+            bucket.listed = 0
+            for nuts_id in targets:
+                started = time.perf_counter()
+                assert len(lookup(nuts_id)) == len(FORMATS)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"{name:>18}: mean {statistics.mean(timings):8.1f} ms, "
+                f"max {max(timings):8.1f} ms, {bucket.listed / len(targets):7.0f} keys listed per lookup"
+            )
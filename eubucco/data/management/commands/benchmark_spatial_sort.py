@@ -0,0 +1,40 @@
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from eubucco.data.spatial_sort import benchmark_bboxes, scan_cost_report, sort_partition
+
+
+class Command(BaseCommand):
+    help = "Compare the benchmark bbox scan cost of a parquet partition before and after the Hilbert sort."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", type=Path)
+        parser.add_argument("--row-group-mb", type=float, default=settings.DATALAKE_ROW_GROUP_BYTES / 2 ** 20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        target_bytes = int(options["row_group_mb"] * 2 ** 20)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for source in options["paths"]:
+                output = Path(tmp_dir) / source.name
+                started = time.perf_counter()
+                rows = sort_partition(source, output, target_bytes)
+                elapsed = time.perf_counter() - started
+                bboxes = benchmark_bboxes(source, options["seed"])
+                report = scan_cost_report(source, output, bboxes)
+
+                self.stdout.write(
+                    f"{source.stem}: sorted in {elapsed:.1f} s, {rows} rows per row group, "
+                    f"{len(bboxes)} queries"
+                )
+                for side in ("before", "after"):
+                    cost = report[side]
+                    self.stdout.write(
+                        f"{side:>8}: {cost['row_groups']:6d} row groups, {cost['rows']:10d} rows, "
+                        f"{cost['bytes'] / 1e6:10.1f} MB read"
+                    )
+                output.unlink()
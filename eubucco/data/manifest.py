@@ -0,0 +1,207 @@
+"""
+Per-version manifest of the datalake, written once by the ingestion pipeline.
+
+`write_manifest` dumps the catalog rows of a version (partitions, formats,
+sizes, checksums and footer summaries) into one small Parquet object,
+`{version}/_manifest.parquet`, outside the dataset prefix so the catalog never
+lists it. API processes load it into an immutable `ManifestIndex` the first
+time a version is requested and answer partition, prefix and format lookups
+from memory afterwards.
+
+`ManifestStore` checks the manifest's ETag at most every
+`DATALAKE_MANIFEST_CHECK_INTERVAL` seconds and swaps in a new index when the
+pipeline has written a newer one. It only tracks versions the catalog knows, as
+versions come from client URLs. Versions without a manifest fall back to the
+catalog.
+"""
+import bisect
+import io
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings as django_settings
+from minio import Minio
+from minio.error import S3Error
+
+from . import catalog
+from .async_store import run_db, run_io
+from .minio_client import MinioSettings, build_client, upload_file
+from .models import CatalogObject
+
+MANIFEST_NAME = "_manifest.parquet"
+MANIFEST_SCHEMA = pa.schema([
+    ("key", pa.string()),
+    ("format", pa.string()),
+    ("nuts_id", pa.string()),
+    ("size", pa.int64()),
+    ("etag", pa.string()),
+    ("last_modified", pa.timestamp("us", tz="UTC")),
+    ("crc32", pa.int64()),
+    ("num_rows", pa.int64()),
+    ("num_row_groups", pa.int32()),
+    ("uncompressed_size", pa.int64()),
+    ("footer_stats", pa.string()),
+])
+
+
+def manifest_key(version: str) -> str:
+    return f"{version}/{MANIFEST_NAME}"
+
+
+def manifest_table(entries: Iterable[CatalogObject]) -> pa.Table:
+    rows = [
+        {
+            **{name: getattr(entry, name) for name in MANIFEST_SCHEMA.names},
+            "footer_stats": json.dumps(entry.footer_stats) if entry.footer_stats is not None else None,
+        }
+        for entry in entries
+    ]
+    return pa.Table.from_pylist(rows, schema=MANIFEST_SCHEMA)
+
+
+def write_manifest(client: Minio, settings: MinioSettings, version: str) -> int:
+    """Upload the manifest of a version from its catalog rows; returns the number of objects listed."""
+    key = manifest_key(version)
+    entries = [entry for entry in catalog.version_objects(version) if entry.key != key]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / MANIFEST_NAME
+        pq.write_table(manifest_table(entries), path, compression="zstd")
+        upload_file(client, settings, key, str(path))
+    return len(entries)
+
+
+class ManifestIndex:
+    """Immutable in-memory view of a version's manifest; the entries must not be modified."""
+
+    def __init__(self, version: str, etag: str, entries: Iterable[CatalogObject]):
+        self.version = version
+        self.etag = etag
+        self.entries: Tuple[CatalogObject, ...] = tuple(sorted(entries, key=lambda e: (e.nuts_id, e.key)))
+        self._nuts_ids = [entry.nuts_id for entry in self.entries]
+        self._by_key = {entry.key: entry for entry in self.entries}
+
+    @classmethod
+    def load(cls, version: str, etag: str, data: bytes) -> "ManifestIndex":
+        entries = []
+        for row in pq.read_table(io.BytesIO(data)).to_pylist():
+            footer_stats = row.pop("footer_stats")
+            entries.append(CatalogObject(
+                version=version,
+                footer_stats=json.loads(footer_stats) if footer_stats is not None else None,
+                **row,
+            ))
+        return cls(version, etag, entries)
+
+    @staticmethod
+    def _filter(entries: Iterable[CatalogObject], formats: Optional[Iterable[str]]) -> List[CatalogObject]:
+        if formats is None:
+            return list(entries)
+        formats = set(formats)
+        return [entry for entry in entries if entry.format in formats]
+
+    def _nuts_range(self, nuts_prefix: str, exact: bool = False) -> Tuple[CatalogObject, ...]:
+        start = bisect.bisect_left(self._nuts_ids, nuts_prefix)
+        if exact:
+            end = bisect.bisect_right(self._nuts_ids, nuts_prefix)
+        else:
+            end = start
+            while end < len(self._nuts_ids) and self._nuts_ids[end].startswith(nuts_prefix):
+                end += 1
+        return self.entries[start:end]
+
+    def version_objects(self, formats: Optional[Iterable[str]] = None) -> List[CatalogObject]:
+        return self._filter(self.entries, formats)
+
+    def partition_objects(self, nuts_id: str, formats: Optional[Iterable[str]] = None) -> List[CatalogObject]:
+        return self._filter(self._nuts_range(nuts_id, exact=True), formats)
+
+    def prefix_objects(self, nuts_prefix: str, fmt: str) -> List[CatalogObject]:
+        return self._filter(self._nuts_range(nuts_prefix), [fmt])
+
+    def objects_by_key(self, keys: Iterable[str]) -> Dict[str, CatalogObject]:
+        return {key: self._by_key[key] for key in keys if key in self._by_key}
+
+    @staticmethod
+    def fingerprint(entries: Iterable[CatalogObject]) -> Optional[str]:
+        """Same value as the catalog's fingerprint of these entries."""
+        return catalog.listing_fingerprint((entry.key, entry.etag, entry.num_rows) for entry in entries)
+
+
+def fetch_manifest(client: Minio, settings: MinioSettings, version: str, etag: Optional[str]):
+    """
+    `(etag, data)` of the manifest of a version, `(etag, None)` if it still has
+    the given ETag and None if there is no manifest.
+    """
+    key = manifest_key(version)
+    try:
+        current = client.stat_object(settings.bucket, key).etag.strip('"')
+        if current == etag:
+            return current, None
+        response = client.get_object(settings.bucket, key)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return None
+        raise
+    try:
+        return response.headers.get("ETag", current).strip('"'), response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
+
+class ManifestStore:
+    """The manifest indexes of the process, one per version, hot-swapped when a newer manifest appears."""
+
+    def __init__(self, client: Minio, settings: MinioSettings, check_interval: float):
+        self.client = client
+        self.settings = settings
+        self.check_interval = check_interval
+        self._indexes: Dict[str, ManifestIndex] = {}
+        self._checked: Dict[str, float] = {}
+
+    async def get(self, version: str) -> Optional[ManifestIndex]:
+        if version not in self._checked and not await run_db(catalog.has_version, version):
+            # Unknown versions fall back to the catalog without a MinIO check or an entry here
+            return None
+        now = time.monotonic()
+        current = self._indexes.get(version)
+        if now - self._checked.get(version, float("-inf")) < self.check_interval:
+            return current
+        # Claimed before awaiting, so concurrent requests keep using the current index
+        self._checked[version] = now
+
+        try:
+            fetched = await run_io(
+                fetch_manifest, self.client, self.settings, version, current.etag if current else None
+            )
+        except Exception as e:
+            logging.warning(f"Could not check the manifest of {version}: {e}")
+            return current
+
+        if fetched is None:
+            indexes = dict(self._indexes)
+            indexes.pop(version, None)
+            self._indexes = indexes
+            return None
+        etag, data = fetched
+        if data is not None:
+            index = await run_io(ManifestIndex.load, version, etag, data)
+            self._indexes = {**self._indexes, version: index}
+            logging.info(f"Loaded manifest of {version} ({len(index.entries)} objects)")
+        return self._indexes.get(version)
+
+
+_manifests: Optional[ManifestStore] = None
+
+
+def get_manifests() -> ManifestStore:
+    global _manifests
+    if _manifests is None:
+        _manifests = ManifestStore(*build_client(), django_settings.DATALAKE_MANIFEST_CHECK_INTERVAL)
+    return _manifests
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=512, unique=True)),
+                ('version', models.CharField(max_length=10)),
+                ('format', models.CharField(max_length=20)),
+                ('nuts_id', models.CharField(blank=True, db_index=True, max_length=10)),
+                ('size', models.BigIntegerField()),
+                ('etag', models.CharField(max_length=64)),
+                ('last_modified', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='catalogobject',
+            index=models.Index(fields=['version', 'nuts_id'], name='data_catalog_version_nuts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogobject',
+            index=models.Index(fields=['version', 'format', 'nuts_id'], name='data_catalog_ver_fmt_nuts_idx'),
+        ),
+    ]
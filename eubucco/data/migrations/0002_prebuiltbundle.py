@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0001_init'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrebuiltBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(max_length=10)),
+                ('nuts_prefix', models.CharField(max_length=10)),
+                ('format', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=512, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('built_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='prebuiltbundle',
+            constraint=models.UniqueConstraint(fields=('version', 'nuts_prefix', 'format'), name='data_prebuilt_bundle_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0002_prebuiltbundle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogobject',
+            name='crc32',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
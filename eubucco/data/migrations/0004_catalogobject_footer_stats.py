@@ -0,0 +1,33 @@
+# Generated by Django 3.2.15 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0003_catalogobject_crc32'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogobject',
+            name='footer_stats',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='catalogobject',
+            name='num_row_groups',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='catalogobject',
+            name='num_rows',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='catalogobject',
+            name='uncompressed_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,5 @@
 import os
 from dataclasses import dataclass
-from datetime import timedelta
 from typing import Optional
 from urllib.parse import urlparse
 
@@ -83,24 +82,6 @@ def build_client(
     return client, settings
 
 
-def build_presign_client(settings: MinioSettings) -> Minio:
-    """
-    Use the public endpoint (if set) for presigning so the host in the signature
-    matches the URL the browser will hit.
-    """
-    endpoint, secure = _normalize_endpoint(
-        settings.public_endpoint,
-        settings.public_secure,
-    )
-    return Minio(
-        endpoint,
-        access_key=settings.access_key,
-        secret_key=settings.secret_key,
-        secure=secure,
-        region=settings.region,
-    )
-
-
 def ensure_bucket(client: Minio, settings: MinioSettings) -> None:
     if client.bucket_exists(settings.bucket):
         return
@@ -126,18 +107,6 @@ def upload_file(
     client.fput_object(settings.bucket, object_name, file_path)
 
 
-def presign_get_url(
-    client: Minio,
-    settings: MinioSettings,
-    object_name: str,
-    expiry: timedelta = timedelta(hours=1),
-) -> str:
-    public_client = build_presign_client(settings)
-    return public_client.presigned_get_object(
-        settings.bucket, object_name, expires=expiry
-    )
-
-
 def list_objects(client: Minio, settings: MinioSettings, prefix: str = ""):
     return client.list_objects(settings.bucket, prefix=prefix, recursive=True)
 
@@ -0,0 +1,64 @@
+from django.db import models
+
+
+class CatalogObject(models.Model):
+    """
+    One object of the datalake bucket below `{version}/{DATASET_PREFIX}/`.
+
+    Filled by the ingestion tasks and the reconciliation job so that the API
+    can answer partition, prefix and format queries without listing MinIO.
+    """
+
+    key = models.CharField(max_length=512, unique=True)
+    version = models.CharField(max_length=10)
+    format = models.CharField(max_length=20)
+    nuts_id = models.CharField(max_length=10, blank=True, db_index=True)
+    size = models.BigIntegerField()
+    etag = models.CharField(max_length=64)
+    last_modified = models.DateTimeField(null=True, blank=True)
+    # CRC-32 of the content, needed to lay out bundles before reading the object
+    crc32 = models.BigIntegerField(null=True, blank=True)
+    # Parquet footer summary: counts, sizes, schema, column statistics and extent (EPSG:3035)
+    num_rows = models.BigIntegerField(null=True, blank=True)
+    num_row_groups = models.IntegerField(null=True, blank=True)
+    uncompressed_size = models.BigIntegerField(null=True, blank=True)
+    footer_stats = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["version", "nuts_id"], name="data_catalog_version_nuts_idx"),
+            models.Index(
+                fields=["version", "format", "nuts_id"],
+                name="data_catalog_ver_fmt_nuts_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class PrebuiltBundle(models.Model):
+    """
+    A bundle ZIP materialised in MinIO at ingest time.
+
+    `fingerprint` hashes the keys and ETags of the members it was built from;
+    the bundle is only served while it matches the current catalog.
+    """
+
+    version = models.CharField(max_length=10)
+    nuts_prefix = models.CharField(max_length=10)
+    format = models.CharField(max_length=20)
+    key = models.CharField(max_length=512, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    built_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["version", "nuts_prefix", "format"], name="data_prebuilt_bundle_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
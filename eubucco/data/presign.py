@@ -0,0 +1,164 @@
+"""
+Presigned GET URLs for the public MinIO endpoint.
+
+URLs are signed locally with AWS Signature V4 by a process-wide presigner that
+caches the derived signing key per day. The signing time is aligned to fixed
+windows, so every API process produces byte-identical URLs for the same object
+within a window and they can be memoised until the window rolls over.
+"""
+import hashlib
+import hmac
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+
+from .minio_client import MinioSettings, _normalize_endpoint
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+DEFAULT_EXPIRY = timedelta(hours=1)
+# Longest time a cached URL is handed out; it is still valid for expiry - window
+SIGNING_WINDOW = timedelta(minutes=15)
+
+
+def _uri_encode(value: str, safe: str = "") -> str:
+    return quote(value, safe=safe)
+
+
+@lru_cache(maxsize=32)
+def _signing_key(secret_key: str, date_stamp: str, region: str) -> bytes:
+    key = f"AWS4{secret_key}".encode()
+    for part in (date_stamp, region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def signing_window(
+    expiry: timedelta = DEFAULT_EXPIRY, now: Optional[datetime] = None
+) -> Tuple[datetime, datetime]:
+    """Start and end of the window whose URLs are currently handed out."""
+    window = min(SIGNING_WINDOW, expiry / 4)
+    now = now or datetime.now(timezone.utc)
+    timestamp = int(now.timestamp() // window.total_seconds() * window.total_seconds())
+    start = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return start, start + window
+
+
+@dataclass(frozen=True)
+class Presigner:
+    scheme: str
+    host: str
+    bucket: str
+    access_key: str
+    secret_key: str
+    region: str
+
+    def presign(
+        self,
+        object_name: str,
+        expiry: timedelta = DEFAULT_EXPIRY,
+        response_headers: Optional[dict] = None,
+        signed_at: Optional[datetime] = None,
+    ) -> str:
+        signed_at = signed_at or datetime.now(timezone.utc)
+        amz_date = signed_at.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = amz_date[:8]
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+
+        query = {
+            "X-Amz-Algorithm": ALGORITHM,
+            "X-Amz-Credential": f"{self.access_key}/{scope}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(int(expiry.total_seconds())),
+            "X-Amz-SignedHeaders": "host",
+        }
+        query.update(response_headers or {})
+        canonical_query = "&".join(
+            f"{_uri_encode(key)}={_uri_encode(value)}" for key, value in sorted(query.items())
+        )
+        path = _uri_encode(f"/{self.bucket}/{object_name}", safe="/")
+
+        canonical_request = "\n".join(
+            ["GET", path, canonical_query, f"host:{self.host}", "", "host", "UNSIGNED-PAYLOAD"]
+        )
+        string_to_sign = "\n".join(
+            [ALGORITHM, amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()]
+        )
+        signature = hmac.new(
+            _signing_key(self.secret_key, date_stamp, self.region),
+            string_to_sign.encode(),
+            hashlib.sha256,
+        ).hexdigest()
+
+        return f"{self.scheme}://{self.host}{path}?{canonical_query}&X-Amz-Signature={signature}"
+
+
+@lru_cache(maxsize=8)
+def _presigner(endpoint: str, secure: bool, bucket: str, access_key: str, secret_key: str, region: str):
+    host, secure = _normalize_endpoint(endpoint, secure)
+    scheme = "https" if secure else "http"
+    hostname, _, port = host.partition(":")
+    if (scheme, port) in {("http", "80"), ("https", "443")}:
+        host = hostname
+    return Presigner(scheme, host, bucket, access_key, secret_key, region)
+
+
+def get_presigner(settings: MinioSettings) -> Presigner:
+    """
+    Use the public endpoint (if set) for presigning so the host in the signature
+    matches the URL the browser will hit.
+    """
+    return _presigner(
+        settings.public_endpoint,
+        settings.public_secure,
+        settings.bucket,
+        settings.access_key,
+        settings.secret_key,
+        settings.region,
+    )
+
+
+_url_cache: Dict[Tuple[Presigner, int, str], str] = {}
+_url_cache_window: Optional[datetime] = None
+_url_cache_lock = threading.Lock()
+
+
+def presign_many(
+    settings: MinioSettings,
+    object_names: Iterable[str],
+    expiry: timedelta = DEFAULT_EXPIRY,
+) -> Dict[str, str]:
+    """Presign a batch of objects, reusing the URLs already signed in the current window."""
+    global _url_cache_window
+
+    presigner = get_presigner(settings)
+    signed_at, _ = signing_window(expiry)
+    seconds = int(expiry.total_seconds())
+
+    with _url_cache_lock:
+        if _url_cache_window != signed_at:
+            _url_cache.clear()
+            _url_cache_window = signed_at
+
+    urls = {}
+    for object_name in object_names:
+        cache_key = (presigner, seconds, object_name)
+        url = _url_cache.get(cache_key)
+        if url is None:
+            url = presigner.presign(object_name, expiry, signed_at=signed_at)
+            _url_cache[cache_key] = url
+        urls[object_name] = url
+    return urls
+
+
+def presign_get_url(
+    settings: MinioSettings,
+    object_name: str,
+    expiry: timedelta = DEFAULT_EXPIRY,
+    response_headers: Optional[dict] = None,
+) -> str:
+    if response_headers:
+        return get_presigner(settings).presign(object_name, expiry, response_headers)
+    return presign_many(settings, [object_name], expiry)[object_name]
@@ -0,0 +1,481 @@
+"""
+Subsets of the GeoParquet partitions: bounding boxes and attribute queries.
+
+Every partition carries a `bbox` struct column (EPSG:3035) whose row group
+statistics bound the buildings of each row group. Footers are read once per
+object version and reduced to those bounds, so a query only opens partitions
+whose extent intersects the box and only reads the row groups that do. The
+extent the catalog keeps per object drops most partitions before any footer is
+read. Where
+ingestion left a spatial index sidecar (`spatial_index`) for the current
+version of a partition, it stands in for the footer and its packed Hilbert
+R-tree answers the row group lookup. The matching rows are written back out as
+a GeoParquet stream, row group by row group, without buffering the result.
+
+Attribute queries take a column list and simple predicates, which are pushed
+into an Arrow dataset scan (row group statistics prune what they can) and come
+back as an Arrow IPC stream of the projected columns.
+"""
+import asyncio
+import json
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from . import resolver
+from .async_store import run_io
+from .minio_client import MinioSettings, _normalize_endpoint
+from .models import CatalogObject
+from .spatial_index import PackedHilbertIndex, PartitionIndex, index_key
+from .streams import ChunkSink
+
+BBox = Tuple[float, float, float, float]  # (xmin, ymin, xmax, ymax)
+DATASET_CRS = 3035
+BBOX_COLUMN = "bbox"
+FOOTER_CACHE_SIZE = 2048
+
+# `column <op> value` or `column (+|-) column <op> value`
+_PREDICATE = re.compile(
+    r"^\s*(?P<left>[A-Za-z_]\w*)\s*(?:(?P<arith>[-+])\s*(?P<right>[A-Za-z_]\w*)\s*)?"
+    r"(?P<op>==|!=|<=|>=|<|>|=)\s*(?P<value>.+?)\s*$"
+)
+_COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class QueryError(ValueError):
+    """A column list or predicate that does not fit the dataset schema."""
+
+
+@dataclass(frozen=True)
+class PartitionFooter:
+    """The parts of a Parquet footer a bbox query needs."""
+
+    schema: pa.Schema
+    # Bounds of every row group, None where the statistics are missing
+    row_group_bboxes: Tuple[Optional[BBox], ...]
+    # R-tree over `row_group_bboxes` when the footer came from a sidecar
+    index: Optional[PackedHilbertIndex] = field(default=None, compare=False)
+
+    @property
+    def extent(self) -> Optional[BBox]:
+        if not self.row_group_bboxes or None in self.row_group_bboxes:
+            return None
+        xmins, ymins, xmaxs, ymaxs = zip(*self.row_group_bboxes)
+        return min(xmins), min(ymins), max(xmaxs), max(ymaxs)
+
+
+@dataclass
+class PartitionSelection:
+    entry: CatalogObject
+    footer: PartitionFooter
+    row_groups: List[int]
+
+
+def intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
+
+
+def area_km2(bbox: BBox) -> float:
+    return (bbox[2] - bbox[0]) * (bbox[3] - bbox[1]) / 1e6
+
+
+def to_dataset_crs(bbox: BBox, crs: int) -> BBox:
+    if crs == DATASET_CRS:
+        return bbox
+    from pyproj import Transformer
+
+    transformer = Transformer.from_crs(f"EPSG:{crs}", f"EPSG:{DATASET_CRS}", always_xy=True)
+    return transformer.transform_bounds(*bbox)
+
+
+@lru_cache(maxsize=8)
+def _filesystem(endpoint: str, secure: bool, access_key: str, secret_key: str, region: str):
+    host, secure = _normalize_endpoint(endpoint, secure)
+    return fs.S3FileSystem(
+        access_key=access_key,
+        secret_key=secret_key,
+        endpoint_override=host,
+        scheme="https" if secure else "http",
+        region=region,
+    )
+
+
+def get_filesystem(settings: MinioSettings) -> fs.FileSystem:
+    """Arrow filesystem on the internal MinIO endpoint, shared by the process."""
+    return _filesystem(
+        settings.endpoint, settings.secure, settings.access_key, settings.secret_key, settings.region
+    )
+
+
+def object_path(settings: MinioSettings, key: str) -> str:
+    return f"{settings.bucket}/{key}"
+
+
+def _row_group_bbox(row_group: pq.RowGroupMetaData, columns: Dict[str, int]) -> Optional[BBox]:
+    bounds = []
+    for axis, bound in (("xmin", "min"), ("ymin", "min"), ("xmax", "max"), ("ymax", "max")):
+        index = columns.get(f"{BBOX_COLUMN}.{axis}")
+        stats = row_group.column(index).statistics if index is not None else None
+        if stats is None or not stats.has_min_max:
+            return None
+        bounds.append(getattr(stats, bound))
+    return tuple(bounds)
+
+
+def parse_footer(parquet_file: pq.ParquetFile) -> PartitionFooter:
+    metadata = parquet_file.metadata
+    columns = {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+    return PartitionFooter(
+        schema=parquet_file.schema_arrow,
+        row_group_bboxes=tuple(
+            _row_group_bbox(metadata.row_group(i), columns) for i in range(metadata.num_row_groups)
+        ),
+    )
+
+
+def _json_value(value):
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, (bool, int, str)):
+        return value
+    return None
+
+
+def _column_stats(metadata: pq.FileMetaData) -> Dict[str, dict]:
+    """Null counts and min/max of every leaf column over all row groups, None where not recorded."""
+    nulls: Dict[str, Optional[int]] = {}
+    bounds: Dict[str, Optional[tuple]] = {}
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            path, stats = chunk.path_in_schema, chunk.statistics
+
+            count = stats.null_count if stats is not None and stats.has_null_count else None
+            total = nulls.get(path, 0)
+            nulls[path] = None if count is None or total is None else total + count
+
+            low = high = None
+            if stats is not None and stats.has_min_max:
+                low, high = _json_value(stats.min), _json_value(stats.max)
+            previous = bounds.get(path, ())
+            if previous is None or low is None or high is None:
+                bounds[path] = None
+            else:
+                bounds[path] = (min(previous[0], low), max(previous[1], high)) if previous else (low, high)
+
+    columns = {}
+    for path, count in nulls.items():
+        low, high = bounds[path] or (None, None)
+        columns[path] = {"null_count": count, "min": low, "max": high}
+    return columns
+
+
+def footer_stats(parquet_file: pq.ParquetFile) -> dict:
+    """The catalog fields summarising a Parquet footer (see `CatalogObject`)."""
+    metadata = parquet_file.metadata
+    footer = parse_footer(parquet_file)
+    return {
+        "num_rows": metadata.num_rows,
+        "num_row_groups": metadata.num_row_groups,
+        "uncompressed_size": sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)),
+        "footer_stats": {
+            "schema": [{"name": field.name, "type": str(field.type)} for field in footer.schema],
+            "columns": _column_stats(metadata),
+            "extent": list(footer.extent) if footer.extent is not None else None,
+        },
+    }
+
+
+def read_footer_stats(filesystem: fs.FileSystem, settings: MinioSettings, entry: CatalogObject) -> dict:
+    """`footer_stats` of a stored partition; only its footer is range-read."""
+    with filesystem.open_input_file(object_path(settings, entry.key)) as source:
+        return footer_stats(pq.ParquetFile(source))
+
+
+def build_partition_index(path: Path, source_crc32: int) -> bytes:
+    """Spatial index sidecar of the local Parquet file at `path`, whose CRC-32 is `source_crc32`."""
+    footer = parse_footer(pq.ParquetFile(path))
+    tree = PackedHilbertIndex.build(footer.row_group_bboxes)
+    return PartitionIndex(footer.schema, tree, source_crc32).to_bytes()
+
+
+_footer_cache: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+_footer_cache_lock = threading.Lock()
+
+
+def _cached(cache_key: Tuple[str, str], load: Callable[[], object]) -> object:
+    with _footer_cache_lock:
+        value = _footer_cache.get(cache_key)
+        if value is not None:
+            _footer_cache.move_to_end(cache_key)
+            return value
+
+    value = load()
+
+    with _footer_cache_lock:
+        _footer_cache[cache_key] = value
+        while len(_footer_cache) > FOOTER_CACHE_SIZE:
+            _footer_cache.popitem(last=False)
+    return value
+
+
+def read_footer(filesystem: fs.FileSystem, path: str, etag: str) -> PartitionFooter:
+    """Footer of the object at `path`, cached for as long as its ETag is unchanged."""
+
+    def load() -> PartitionFooter:
+        with filesystem.open_input_file(path) as source:
+            return parse_footer(pq.ParquetFile(source))
+
+    return _cached((path, etag), load)
+
+
+def read_index(filesystem: fs.FileSystem, path: str, etag: str) -> PartitionIndex:
+    """Spatial index sidecar at `path`, cached for as long as its ETag is unchanged."""
+
+    def load() -> PartitionIndex:
+        with filesystem.open_input_file(path) as source:
+            return PartitionIndex.from_bytes(source.readall())
+
+    return _cached((path, etag), load)
+
+
+def read_partition_footer(
+    filesystem: fs.FileSystem,
+    settings: MinioSettings,
+    entry: CatalogObject,
+    sidecar: Optional[CatalogObject] = None,
+) -> PartitionFooter:
+    """
+    Footer of a partition, taken from its spatial index sidecar when there is one.
+
+    The sidecar records the CRC-32 of the file it was built from and is only
+    trusted when that matches the catalog; otherwise the Parquet footer is read.
+    """
+    if sidecar is not None and entry.crc32 is not None:
+        try:
+            partition_index = read_index(filesystem, object_path(settings, sidecar.key), sidecar.etag)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Unreadable spatial index {sidecar.key}, using the Parquet footer: {e}")
+        else:
+            if partition_index.source_crc32 == entry.crc32:
+                tree = partition_index.tree
+                return PartitionFooter(partition_index.schema, tuple(tree.item_boxes()), tree)
+    return read_footer(filesystem, object_path(settings, entry.key), entry.etag)
+
+
+async def read_footers(
+    filesystem: fs.FileSystem, settings: MinioSettings, entries: Sequence[CatalogObject]
+) -> List[PartitionFooter]:
+    """Read the footers of `entries` concurrently on the datalake IO pool, preferring sidecars."""
+    versions = {entry.version for entry in entries}
+    sidecars = {}
+    for version in versions:
+        sidecars.update(await resolver.objects_by_key(version, [index_key(entry.key) for entry in entries]))
+    return await asyncio.gather(*(
+        run_io(read_partition_footer, filesystem, settings, entry, sidecars.get(index_key(entry.key)))
+        for entry in entries
+    ))
+
+
+def matching_row_groups(footer: PartitionFooter, bbox: BBox) -> List[int]:
+    """Row groups of a partition that may hold buildings intersecting `bbox`."""
+    if footer.index is not None:
+        return footer.index.search(bbox)
+    extent = footer.extent
+    if extent is not None and not intersects(extent, bbox):
+        return []
+    return [
+        i for i, bounds in enumerate(footer.row_group_bboxes)
+        if bounds is None or intersects(bounds, bbox)
+    ]
+
+
+def candidate_partitions(entries: Iterable[CatalogObject], bbox: BBox) -> List[CatalogObject]:
+    """The entries whose catalogued extent intersects `bbox`, plus those without one."""
+    candidates = []
+    for entry in entries:
+        extent = (entry.footer_stats or {}).get("extent")
+        if extent is None or intersects(tuple(extent), bbox):
+            candidates.append(entry)
+    return candidates
+
+
+def select_row_groups(
+    partitions: Iterable[Tuple[CatalogObject, PartitionFooter]], bbox: BBox
+) -> List[PartitionSelection]:
+    """The partitions and row groups whose statistics intersect `bbox`."""
+    selections = []
+    for entry, footer in partitions:
+        row_groups = matching_row_groups(footer, bbox)
+        if row_groups:
+            selections.append(PartitionSelection(entry, footer, row_groups))
+    return selections
+
+
+def output_schema(schemas: Sequence[pa.Schema]) -> pa.Schema:
+    """
+    Union of the partition schemas carrying their GeoParquet metadata.
+
+    The per-column `bbox` in the `geo` metadata describes a whole partition, so
+    it is dropped rather than copied into a subset.
+    """
+    schema = pa.unify_schemas(list(schemas))
+    metadata = dict(schema.metadata or {})
+    if b"geo" in metadata:
+        geo = json.loads(metadata[b"geo"])
+        for column in geo.get("columns", {}).values():
+            column.pop("bbox", None)
+        metadata[b"geo"] = json.dumps(geo).encode()
+    return schema.with_metadata(metadata)
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    columns = [
+        table.column(field.name).cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def bbox_filter(bbox: BBox) -> pc.Expression:
+    xmin, ymin, xmax, ymax = bbox
+    return (
+        (pc.field(BBOX_COLUMN, "xmin") <= xmax)
+        & (pc.field(BBOX_COLUMN, "xmax") >= xmin)
+        & (pc.field(BBOX_COLUMN, "ymin") <= ymax)
+        & (pc.field(BBOX_COLUMN, "ymax") >= ymin)
+    )
+
+
+def iter_bbox_geoparquet(
+    filesystem: fs.FileSystem,
+    settings: MinioSettings,
+    selections: Iterable[PartitionSelection],
+    bbox: BBox,
+    schema: pa.Schema,
+) -> Iterator[bytes]:
+    """Yield a GeoParquet file of the buildings intersecting `bbox`, one row group at a time."""
+    sink = ChunkSink()
+    row_filter = bbox_filter(bbox)
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for selection in selections:
+            path = object_path(settings, selection.entry.key)
+            with filesystem.open_input_file(path) as source:
+                parquet_file = pq.ParquetFile(source)
+                for row_group in selection.row_groups:
+                    table = parquet_file.read_row_group(row_group).filter(row_filter)
+                    if table.num_rows:
+                        writer.write_table(_conform(table, schema))
+                        yield from sink.drain()
+    yield from sink.drain()
+
+
+def _field(schema: pa.Schema, name: str) -> pa.Field:
+    index = schema.get_field_index(name)
+    if index < 0:
+        raise QueryError(f"Unknown column: {name}")
+    return schema.field(index)
+
+
+def _is_text(data_type: pa.DataType) -> bool:
+    if pa.types.is_dictionary(data_type):
+        data_type = data_type.value_type
+    return pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+
+
+def _is_number(data_type: pa.DataType) -> bool:
+    return pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+
+
+def parse_predicate(text: str, schema: pa.Schema) -> pc.Expression:
+    """
+    Parse one filter such as `height >= 10`, `type == residential` or
+    `height_confidence_upper - height_confidence_lower < 2` into an expression.
+    """
+    match = _PREDICATE.match(text)
+    if match is None:
+        raise QueryError(f"Cannot parse filter: {text}")
+    left = _field(schema, match["left"])
+    value = match["value"].strip("'\"")
+
+    if match["arith"]:
+        right = _field(schema, match["right"])
+        if not (_is_number(left.type) and _is_number(right.type)):
+            raise QueryError(f"Arithmetic needs numeric columns: {text}")
+        arithmetic = pc.subtract if match["arith"] == "-" else pc.add
+        operand = arithmetic(pc.field(left.name), pc.field(right.name))
+    else:
+        operand = pc.field(left.name)
+
+    if _is_text(left.type) and not match["arith"]:
+        literal = value
+    elif _is_number(left.type):
+        try:
+            literal = float(value)
+        except ValueError:
+            raise QueryError(f"Expected a number in filter: {text}")
+    else:
+        raise QueryError(f"Column {left.name} cannot be filtered on")
+    return _COMPARISONS[match["op"]](operand, literal)
+
+
+def parse_filters(filters: Iterable[str], schema: pa.Schema) -> Optional[pc.Expression]:
+    expression = None
+    for text in filters:
+        predicate = parse_predicate(text, schema)
+        expression = predicate if expression is None else expression & predicate
+    return expression
+
+
+def projection(columns: Optional[Iterable[str]], schema: pa.Schema) -> List[str]:
+    if not columns:
+        return schema.names
+    return [_field(schema, name).name for name in columns]
+
+
+def iter_arrow_stream(
+    filesystem: fs.FileSystem,
+    settings: MinioSettings,
+    entries: Iterable[CatalogObject],
+    schema: pa.Schema,
+    columns: List[str],
+    row_filter: Optional[pc.Expression] = None,
+) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream of `columns` for the rows of `entries` matching `row_filter`."""
+    dataset = ds.dataset(
+        [object_path(settings, entry.key) for entry in entries],
+        schema=schema,
+        format="parquet",
+        filesystem=filesystem,
+    )
+    scanner = dataset.scanner(columns=columns, filter=row_filter)
+    sink = ChunkSink()
+    with pa.ipc.new_stream(sink, scanner.projected_schema) as writer:
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                writer.write_batch(batch)
+                yield from sink.drain()
+    yield from sink.drain()
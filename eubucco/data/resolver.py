@@ -0,0 +1,80 @@
+"""
+Partition lookups whose cost depends on the partition, not on the dataset.
+
+Versions with a manifest are answered from its in-memory index without any
+query. Otherwise the catalog answers with one indexed query. For versions the
+catalog has not seen yet (e.g. before the first reconciliation), the resolver
+lists only the `{format}/nuts_id={nuts_id}/` prefixes, one concurrent listing
+per format, instead of walking the whole version.
+"""
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+from . import catalog
+from .async_store import AsyncObjectStore, run_db
+from .manifest import get_manifests
+from .models import CatalogObject
+
+
+async def has_version(version: str) -> bool:
+    if await get_manifests().get(version) is not None:
+        return True
+    return await run_db(catalog.has_version, version)
+
+
+async def version_objects(version: str, formats: Optional[Iterable[str]] = None) -> List[CatalogObject]:
+    index = await get_manifests().get(version)
+    if index is not None:
+        return index.version_objects(formats)
+    return await run_db(catalog.version_objects, version, formats)
+
+
+async def prefix_objects(version: str, nuts_prefix: str, fmt: str) -> List[CatalogObject]:
+    index = await get_manifests().get(version)
+    if index is not None:
+        return index.prefix_objects(nuts_prefix, fmt)
+    return await run_db(catalog.prefix_objects, version, nuts_prefix, fmt)
+
+
+async def objects_by_key(version: str, keys: Iterable[str]) -> Dict[str, CatalogObject]:
+    index = await get_manifests().get(version)
+    if index is not None:
+        return index.objects_by_key(keys)
+    return await run_db(catalog.objects_by_key, keys)
+
+
+async def version_fingerprint(version: str, formats: Iterable[str]) -> Optional[str]:
+    index = await get_manifests().get(version)
+    if index is not None:
+        return index.fingerprint(index.version_objects(formats))
+    return await run_db(catalog.version_fingerprint, version, formats)
+
+
+async def partition_fingerprint(version: str, nuts_id: str, formats: Iterable[str]) -> Optional[str]:
+    index = await get_manifests().get(version)
+    if index is not None:
+        return index.fingerprint(index.partition_objects(nuts_id, formats))
+    return await run_db(catalog.partition_fingerprint, version, nuts_id, formats)
+
+
+async def list_partition_prefixes(
+    store: AsyncObjectStore, version: str, nuts_id: str, formats: Iterable[str]
+) -> List[CatalogObject]:
+    listings = await asyncio.gather(
+        *(store.list_objects(catalog.partition_prefix(version, fmt, nuts_id)) for fmt in formats)
+    )
+    entries = (catalog.entry_from_object(obj) for objects in listings for obj in objects)
+    return [entry for entry in entries if entry is not None]
+
+
+async def resolve_partition(
+    store: AsyncObjectStore, version: str, nuts_id: str, formats: Iterable[str]
+) -> List[CatalogObject]:
+    formats = list(formats)
+    index = await get_manifests().get(version)
+    if index is not None:
+        return index.partition_objects(nuts_id, formats)
+    entries = await run_db(catalog.partition_objects, version, nuts_id, formats)
+    if entries or await run_db(catalog.has_version, version):
+        return entries
+    return await list_partition_prefixes(store, version, nuts_id, formats)
@@ -0,0 +1,166 @@
+"""
+Registry of the EUBUCCO building columns and their types in the download formats.
+
+`COLUMNS` mirrors docs/data-format/schema.md. `BatchNormaliser` compiles it
+against the schema of a partition into one Arrow cast plus a vectorised
+list-to-JSON kernel, so record batches are normalised without touching
+individual rows in Python. Columns that are not in the registry keep their
+type, except that dictionary-encoded (categorical) columns become strings, with
+missing values written as "nan" as the pandas converters always did.
+"""
+import json
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+FLOAT = "float"
+INT = "int"
+STRING = "string"
+LIST = "list"
+
+# Type of each kind in the normalised batch shared by all formats (lists become JSON strings)
+ARROW_TYPES = {FLOAT: pa.float64(), INT: pa.int64(), STRING: pa.string(), LIST: pa.string()}
+# Shapefiles have no nullable integer fields
+SHAPEFILE_DTYPES = {INT: "float64"}
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    kind: str
+    # Shapefile field names must be <= 10 chars
+    shp_name: Optional[str] = None
+
+
+COLUMNS = (
+    Column("id", STRING),
+    Column("region_id", STRING),
+    Column("city_id", STRING),
+    Column("type", STRING),
+    Column("subtype", STRING),
+    Column("height", FLOAT),
+    Column("floors", FLOAT),
+    Column("construction_year", INT, "const_yr"),
+    Column("type_confidence", FLOAT, "t_conf"),
+    Column("subtype_confidence", FLOAT, "s_conf"),
+    Column("height_confidence_lower", FLOAT, "h_conf_lo"),
+    Column("height_confidence_upper", FLOAT, "h_conf_hi"),
+    Column("floors_confidence_lower", FLOAT, "f_conf_lo"),
+    Column("floors_confidence_upper", FLOAT, "f_conf_hi"),
+    Column("construction_year_confidence_lower", INT, "c_conf_lo"),
+    Column("construction_year_confidence_upper", INT, "c_conf_hi"),
+    Column("geometry_source", STRING, "geom_src"),
+    Column("type_source", STRING, "t_src"),
+    Column("subtype_source", STRING, "s_src"),
+    Column("height_source", STRING, "h_src"),
+    Column("floors_source", STRING, "f_src"),
+    Column("construction_year_source", STRING, "c_src"),
+    Column("geometry_source_id", STRING, "geom_sid"),
+    Column("type_source_ids", LIST, "t_sids"),
+    Column("subtype_source_ids", LIST, "s_sids"),
+    Column("height_source_ids", LIST, "h_sids"),
+    Column("floors_source_ids", LIST, "f_sids"),
+    Column("construction_year_source_ids", LIST, "c_sids"),
+    Column("subtype_raw", STRING, "s_raw"),
+)
+KINDS = {column.name: column.kind for column in COLUMNS}
+SHAPEFILE_NAMES = {column.name: column.shp_name for column in COLUMNS if column.shp_name}
+
+
+def columns_of_kind(kind: str):
+    return [column.name for column in COLUMNS if column.kind == kind]
+
+
+def shapefile_dtypes(columns) -> Dict[str, str]:
+    """The columns among `columns` that need another dtype in a shapefile than in the shared batch."""
+    return {name: SHAPEFILE_DTYPES[KINDS[name]] for name in columns if KINDS.get(name) in SHAPEFILE_DTYPES}
+
+
+def _all_match(values: pa.Array, pattern: str) -> bool:
+    return pc.all(pc.match_substring_regex(values, pattern)).as_py() in (True, None)
+
+
+def list_to_json(values: pa.Array) -> pa.Array:
+    """
+    JSON strings of a list array, exactly as `json.dumps(list(x))` writes them;
+    null lists stay null. Lists of printable ASCII strings or integers are
+    encoded with Arrow kernels, anything else falls back to `json.dumps`.
+    """
+    if pa.types.is_null(values.type):
+        return pa.nulls(len(values), pa.string())
+    flat = pc.list_flatten(values)
+    is_string = pa.types.is_string(flat.type) or pa.types.is_large_string(flat.type)
+
+    if is_string and flat.null_count == 0 and _all_match(flat, r'^[ !#-\[\]-~]*$'):
+        # Nothing to escape: join the items of each list straight away
+        joined = pc.binary_join_element_wise('["', pc.binary_join(values, '", "'), '"]', "")
+        return pc.if_else(pc.equal(pc.list_value_length(values), 0), "[]", joined)
+
+    if pa.types.is_integer(flat.type):
+        items = pc.cast(flat, pa.string())
+    elif is_string and _all_match(flat, r"^[ -~]*$"):
+        escaped = pc.replace_substring(pc.replace_substring(flat, "\\", "\\\\"), '"', '\\"')
+        items = pc.binary_join_element_wise('"', escaped, '"', "")
+    else:
+        return pa.array(
+            [json.dumps(list(x)) if x is not None else None for x in values.to_pylist()], pa.string()
+        )
+    items = pc.fill_null(items, "null")
+
+    lengths = pc.fill_null(pc.list_value_length(values), 0).to_numpy(zero_copy_only=False)
+    offsets = pa.array(np.concatenate([[0], np.cumsum(lengths)]), pa.int32())
+    lists = pa.ListArray.from_arrays(offsets, items, mask=pc.is_null(values))
+    return pc.binary_join_element_wise("[", pc.binary_join(lists, ", "), "]", "")
+
+
+class BatchNormaliser:
+    """Normalises the record batches of one partition; build it once per partition schema."""
+
+    def __init__(self, schema: pa.Schema):
+        self.geo = json.loads(schema.metadata[b"geo"])
+        self.list_columns = []
+        self.nan_columns = []
+        self.category_columns = []
+        fields = []
+        for i, schema_field in enumerate(schema):
+            kind = KINDS.get(schema_field.name)
+            if kind is None and (pa.types.is_list(schema_field.type) or pa.types.is_large_list(schema_field.type)):
+                kind = LIST
+            if kind is not None:
+                target = ARROW_TYPES[kind]
+            elif pa.types.is_dictionary(schema_field.type):
+                target = pa.string()
+            else:
+                target = schema_field.type
+            if pa.types.is_dictionary(schema_field.type) and target == pa.string():
+                self.category_columns.append(i)
+            if kind == LIST:
+                self.list_columns.append(i)
+            elif kind == INT and pa.types.is_floating(schema_field.type):
+                # NaN is a value in Arrow; casting it to an integer would fail
+                self.nan_columns.append(i)
+            fields.append(pa.field(schema_field.name, target))
+        self.target = pa.schema(fields, metadata=schema.metadata)
+
+    def to_arrow(self, batch: Union[pa.RecordBatch, pa.Table]) -> pa.Table:
+        table = batch if isinstance(batch, pa.Table) else pa.Table.from_batches([batch])
+        for i in self.list_columns:
+            table = table.set_column(i, table.field(i).name, list_to_json(table.column(i).combine_chunks()))
+        for i in self.nan_columns:
+            column = table.column(i)
+            table = table.set_column(i, table.field(i).name, pc.if_else(pc.is_nan(column), None, column))
+        table = table.cast(self.target)
+        for i in self.category_columns:
+            table = table.set_column(i, table.field(i).name, pc.fill_null(table.column(i), "nan"))
+        return table
+
+    def __call__(self, batch: Union[pa.RecordBatch, pa.Table]) -> gpd.GeoDataFrame:
+        df = self.to_arrow(batch).to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+        for name, column in self.geo["columns"].items():
+            df[name] = gpd.GeoSeries.from_wkb(df[name], crs=column.get("crs", "OGC:CRS84"))
+        return gpd.GeoDataFrame(df, geometry=self.geo["primary_column"])
@@ -0,0 +1,185 @@
+"""
+Spatial index sidecars of the Parquet partitions.
+
+Each partition gets a small companion object holding the Arrow schema of the
+partition and a packed Hilbert R-tree (as in Flatbush) over the bounding boxes
+of its row groups. Readers fetch a few kilobytes instead of the Parquet footer
+to learn which row groups intersect an area, and only open the partition to
+read those.
+
+Layout (little endian)::
+
+    magic "EBIX" | u8 format version | u8 reserved | u16 node size
+    u32 row groups | u32 CRC-32 of the Parquet file | u32 schema length
+    Arrow IPC schema | f64[nodes, 4] boxes | u32[nodes] indices
+
+Leaves come first in Hilbert order of their centres and index their row group;
+every upper level follows and indexes the first of its children.
+"""
+import math
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from .constants import DATASET_PREFIX
+
+MAGIC = b"EBIX"
+FORMAT_VERSION = 1
+NODE_SIZE = 16
+INDEX_FORMAT = "_index"
+INDEX_EXTENSION = ".idx"
+_HEADER = struct.Struct("<4sBBHIII")
+_HILBERT_ORDER = 16
+# Stand-in box for row groups without statistics, so they always match
+_UNBOUNDED = (-math.inf, -math.inf, math.inf, math.inf)
+
+BBox = Tuple[float, float, float, float]
+
+
+def index_key(parquet_key: str) -> str:
+    """Key of the sidecar of a Parquet partition, in the `_index` sibling of its format folder."""
+    version, _, _, *rest = parquet_key.split("/")
+    name = rest[-1].rsplit(".", 1)[0] + INDEX_EXTENSION
+    return "/".join([version, DATASET_PREFIX, INDEX_FORMAT, *rest[:-1], name])
+
+
+def _hilbert(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Hilbert curve distance of integer grid coordinates in [0, 2**_HILBERT_ORDER)."""
+    n = 1 << _HILBERT_ORDER
+    x, y = x.astype(np.int64), y.astype(np.int64)
+    d = np.zeros_like(x)
+    s = n >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s >>= 1
+    return d
+
+
+def hilbert_order(centres: np.ndarray) -> np.ndarray:
+    """Stable argsort of (n, 2) points along a Hilbert curve over their extent; NaN points go first."""
+    finite = np.isfinite(centres).all(axis=1)
+    if not finite.any():
+        return np.arange(len(centres))
+    lo, hi = centres[finite].min(axis=0), centres[finite].max(axis=0)
+    scale = ((1 << _HILBERT_ORDER) - 1) / np.maximum(hi - lo, 1e-9)
+    grid = np.clip((np.where(finite[:, None], centres, lo) - lo) * scale, 0, (1 << _HILBERT_ORDER) - 1)
+    return np.argsort(_hilbert(grid[:, 0], grid[:, 1]), kind="stable")
+
+
+def _level_bounds(num_items: int, node_size: int) -> List[int]:
+    """End position of every level, leaves first and root last."""
+    bounds, count, total = [], num_items, num_items
+    bounds.append(total)
+    while count > 1:
+        count = math.ceil(count / node_size)
+        total += count
+        bounds.append(total)
+    return bounds
+
+
+@dataclass
+class PackedHilbertIndex:
+    boxes: np.ndarray  # (nodes, 4) float64
+    indices: np.ndarray  # (nodes,) uint32
+    num_items: int
+    node_size: int = NODE_SIZE
+
+    @classmethod
+    def build(cls, item_boxes: Sequence[Optional[BBox]], node_size: int = NODE_SIZE) -> "PackedHilbertIndex":
+        items = np.array([box or _UNBOUNDED for box in item_boxes], dtype=np.float64).reshape(-1, 4)
+        num_items = len(items)
+        level_bounds = _level_bounds(num_items, node_size)
+        boxes = np.empty((level_bounds[-1], 4), dtype=np.float64)
+        indices = np.empty(level_bounds[-1], dtype=np.uint32)
+
+        finite = np.isfinite(items).all(axis=1)
+        centres = np.full((num_items, 2), np.nan)
+        centres[finite] = (items[finite, :2] + items[finite, 2:]) / 2
+        order = hilbert_order(centres)
+
+        boxes[:num_items] = items[order]
+        indices[:num_items] = order
+        start = 0
+        for end in level_bounds[:-1]:
+            for parent, first in enumerate(range(start, end, node_size), start=end):
+                children = boxes[first:min(first + node_size, end)]
+                boxes[parent] = (*children[:, :2].min(axis=0), *children[:, 2:].max(axis=0))
+                indices[parent] = first
+            start = end
+        return cls(boxes, indices, num_items, node_size)
+
+    @property
+    def extent(self) -> Optional[BBox]:
+        if not self.num_items or not np.isfinite(self.boxes[-1]).all():
+            return None
+        return tuple(float(value) for value in self.boxes[-1])
+
+    def item_boxes(self) -> List[Optional[BBox]]:
+        """Boxes of the items in their original order (None where unbounded)."""
+        boxes: List[Optional[BBox]] = [None] * self.num_items
+        for box, item in zip(self.boxes[:self.num_items], self.indices[:self.num_items]):
+            boxes[int(item)] = tuple(float(v) for v in box) if np.isfinite(box).all() else None
+        return boxes
+
+    def search(self, bbox: BBox) -> List[int]:
+        """Sorted indices of the items whose box intersects `bbox`."""
+        if not self.num_items:
+            return []
+        xmin, ymin, xmax, ymax = bbox
+        level_bounds = _level_bounds(self.num_items, self.node_size)
+        results = []
+        stack = [(len(self.boxes) - 1, len(level_bounds) - 1)]
+        while stack:
+            position, level = stack.pop()
+            box = self.boxes[position]
+            if box[0] > xmax or box[2] < xmin or box[1] > ymax or box[3] < ymin:
+                continue
+            if level == 0:
+                results.append(int(self.indices[position]))
+                continue
+            first = int(self.indices[position])
+            last = min(first + self.node_size, level_bounds[level - 1])
+            stack.extend((child, level - 1) for child in range(first, last))
+        return sorted(results)
+
+
+@dataclass
+class PartitionIndex:
+    schema: pa.Schema
+    tree: PackedHilbertIndex
+    source_crc32: int
+
+    def to_bytes(self) -> bytes:
+        schema = self.schema.serialize().to_pybytes()
+        header = _HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, self.tree.node_size, self.tree.num_items, self.source_crc32, len(schema)
+        )
+        return b"".join([
+            header,
+            schema,
+            self.tree.boxes.astype("<f8").tobytes(),
+            self.tree.indices.astype("<u4").tobytes(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PartitionIndex":
+        magic, version, _, node_size, num_items, source_crc32, schema_length = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a partition index sidecar")
+        offset = _HEADER.size
+        schema = pa.ipc.read_schema(pa.py_buffer(data[offset:offset + schema_length]))
+        offset += schema_length
+        nodes = _level_bounds(num_items, node_size)[-1]
+        boxes = np.frombuffer(data, dtype="<f8", count=nodes * 4, offset=offset).reshape(nodes, 4)
+        offset += boxes.nbytes
+        indices = np.frombuffer(data, dtype="<u4", count=nodes, offset=offset)
+        return cls(schema, PackedHilbertIndex(boxes, indices, num_items, node_size), source_crc32)
@@ -0,0 +1,104 @@
+"""
+Hilbert-sorted rewrite of the Parquet partitions before upload.
+
+The source files keep their buildings in whatever order they were produced in,
+so every row group spans most of its partition and the `bbox` statistics prune
+next to nothing. Rewriting a partition in Hilbert order of the footprint
+centres turns each row group into a compact patch of the map, which the bbox
+and tile queries, the spatial index sidecars and DuckDB range reads can then
+skip. Row groups are cut to a target (uncompressed) size.
+
+`scan_cost` measures what a set of benchmark bbox queries has to read from a
+file, so the two layouts can be compared.
+"""
+import random
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .query import BBOX_COLUMN, BBox, matching_row_groups, parse_footer
+from .spatial_index import hilbert_order
+
+# Edge lengths (m) of the benchmark queries, centred on sampled buildings
+BENCHMARK_BOX_SIZES = (1000, 5000)
+BENCHMARK_QUERIES_PER_SIZE = 10
+
+
+def _centres(table: pa.Table) -> np.ndarray:
+    bbox = table.column(BBOX_COLUMN)
+    coordinates = [
+        pc.struct_field(bbox, field).to_numpy(zero_copy_only=False).astype(np.float64)
+        for field in ("xmin", "ymin", "xmax", "ymax")
+    ]
+    xmin, ymin, xmax, ymax = coordinates
+    return np.column_stack([(xmin + xmax) / 2, (ymin + ymax) / 2])
+
+
+def row_group_rows(table: pa.Table, target_bytes: int) -> int:
+    """Rows per row group so that a row group holds about `target_bytes` of uncompressed data."""
+    if not table.num_rows:
+        return 1
+    return max(1, int(target_bytes * table.num_rows / max(table.nbytes, 1)))
+
+
+def sort_partition(source: Path, output: Path, target_bytes: int) -> int:
+    """Rewrite `source` to `output` in Hilbert order of the footprint centres; returns the row group size."""
+    table = pq.read_table(source)
+    if BBOX_COLUMN not in table.column_names:
+        raise ValueError(f"{source} has no {BBOX_COLUMN} column to sort by")
+    table = table.take(pa.array(hilbert_order(_centres(table))))
+    rows = row_group_rows(table, target_bytes)
+    pq.write_table(table, output, row_group_size=rows, compression="zstd")
+    return rows
+
+
+@dataclass
+class ScanCost:
+    queries: int = 0
+    row_groups: int = 0
+    rows: int = 0
+    bytes: int = 0
+
+
+def benchmark_bboxes(path: Path, seed: int = 0) -> List[BBox]:
+    """Square queries of every `BENCHMARK_BOX_SIZES` around buildings sampled from `path`."""
+    centres = _centres(pq.read_table(path, columns=[BBOX_COLUMN]))
+    centres = centres[np.isfinite(centres).all(axis=1)]
+    if not len(centres):
+        return []
+    rng = random.Random(seed)
+    bboxes = []
+    for size in BENCHMARK_BOX_SIZES:
+        for _ in range(BENCHMARK_QUERIES_PER_SIZE):
+            x, y = centres[rng.randrange(len(centres))]
+            bboxes.append((x - size / 2, y - size / 2, x + size / 2, y + size / 2))
+    return bboxes
+
+
+def scan_cost(path: Path, bboxes: Sequence[BBox]) -> ScanCost:
+    """Row groups, rows and compressed bytes the queries read from `path` after statistics pruning."""
+    parquet_file = pq.ParquetFile(path)
+    footer = parse_footer(parquet_file)
+    metadata = parquet_file.metadata
+    cost = ScanCost(queries=len(bboxes))
+    for bbox in bboxes:
+        for i in matching_row_groups(footer, bbox):
+            row_group = metadata.row_group(i)
+            cost.row_groups += 1
+            cost.rows += row_group.num_rows
+            cost.bytes += sum(
+                row_group.column(column).total_compressed_size for column in range(row_group.num_columns)
+            )
+    return cost
+
+
+def scan_cost_report(before: Path, after: Path, bboxes: Sequence[BBox]) -> Dict[str, dict]:
+    return {
+        "before": asdict(scan_cost(before, bboxes)),
+        "after": asdict(scan_cost(after, bboxes)),
+    }
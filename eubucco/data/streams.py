@@ -0,0 +1,39 @@
+"""
+Helpers for producing file formats as a stream of chunks.
+"""
+import io
+from typing import Iterator, List
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only, non-seekable file object whose written bytes are drained as chunks.
+
+    Writers such as `zipfile.ZipFile` or `pyarrow.parquet.ParquetWriter` write
+    into it, and the caller yields whatever was written so far after each step.
+    Without `seek` the zipfile module falls back to data descriptors, which is
+    what allows an archive to be emitted front to back.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        for chunk in chunks:
+            if chunk:
+                yield chunk
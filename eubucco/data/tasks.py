@@ -3,21 +3,44 @@ import os
 import tempfile
 import time
 from pathlib import Path
+from typing import List, Optional
 
+import pyarrow.parquet as pq
 import redis
 from celery import chord, chain, group
+from django.conf import settings as django_settings
 from pottery import Redlock
 
 from config import celery_app
-from .converters import GeoPackageConverter, ShapefileConverter
-from .minio_client import build_client, file_exists, upload_file
+from .bundles import bundle_fingerprint, prebuilt_bundle_key, prebuilt_prefixes, write_bundle
+from .catalog import (
+    file_crc32,
+    fill_missing_checksums,
+    fill_missing_footer_stats,
+    prefix_objects,
+    reconcile_version,
+    register_object,
+)
+from .converters import (
+    SPATIAL_FORMATS,
+    ConversionReport,
+    convert_chunk,
+    convert_partition,
+    convert_partition_parallel,
+    get_process_pool,
+    plan_chunks,
+)
+from .conversions import ON_DEMAND_QUEUE, finish_conversion
+from .manifest import manifest_key, write_manifest
+from .minio_client import build_client, file_exists, list_objects, upload_file
 from .constants import DATASET_PREFIX
+from .models import PrebuiltBundle
+from .query import build_partition_index, footer_stats, get_filesystem, object_path, read_footer_stats
+from .spatial_index import index_key
+from .spatial_sort import benchmark_bboxes, scan_cost_report, sort_partition
 
 RAW_FILES_DIR = Path("data/s3")
-SPATIAL_FORMATS = {
-    "gpkg": (GeoPackageConverter(), ".gpkg"),
-    "shp": (ShapefileConverter(), ".zip"),
-}
+SORTED_FILES_DIR = Path("data/sorted")
 
 r = redis.Redis(
     host=os.environ["REDIS_URL"].split("//")[-1].split(":")[0],
@@ -25,6 +48,53 @@ r = redis.Redis(
     db=os.environ["REDIS_URL"].split("/")[-1],
 )
 
+# --- PHASE 0: SPATIAL SORT (optional) ---
+
+def sorted_path(version_tag: str, file_path: str) -> Path:
+    return SORTED_FILES_DIR / version_tag / Path(file_path).name
+
+
+@celery_app.task(soft_time_limit=3000, acks_late=True, queue="heavy_tasks")
+def sort_parquet_task(version_tag: str, file_path: str, rewrite: bool = False):
+    """Stage 0: Rewrite a Parquet file in Hilbert order with tuned row groups and report the scan cost."""
+    source = Path(file_path)
+    output = sorted_path(version_tag, file_path)
+    if not rewrite and output.exists() and output.stat().st_mtime >= source.stat().st_mtime:
+        logging.info(f"Skipping existing sorted parquet: {output}")
+        return None
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    staging = output.with_name(f"{output.name}.tmp")
+    rows = sort_partition(source, staging, django_settings.DATALAKE_ROW_GROUP_BYTES)
+    staging.replace(output)
+
+    report = scan_cost_report(source, output, benchmark_bboxes(source))
+    before, after = report["before"], report["after"]
+    logging.info(
+        f"Sorted {source.stem} ({rows} rows per row group): {before['queries']} benchmark queries read "
+        f"{before['row_groups']} -> {after['row_groups']} row groups, "
+        f"{before['bytes'] / 1e6:.1f} -> {after['bytes'] / 1e6:.1f} MB"
+    )
+    return {"nuts_id": source.stem, "row_group_rows": rows, **report}
+
+
+@celery_app.task
+def report_sort_phase(results):
+    """Log the benchmark scan cost of all sorted partitions before and after the rewrite."""
+    reports = [result for result in results or [] if result]
+    totals = {
+        side: {key: sum(report[side][key] for report in reports) for key in ("row_groups", "rows", "bytes")}
+        for side in ("before", "after")
+    }
+    before, after = totals["before"], totals["after"]
+    logging.info(
+        f"--- PHASE SUCCESS: Sort phase rewrote {len(reports)} partitions; benchmark queries read "
+        f"{before['row_groups']} -> {after['row_groups']} row groups, {before['rows']} -> {after['rows']} rows, "
+        f"{before['bytes'] / 1e6:.1f} -> {after['bytes'] / 1e6:.1f} MB ---"
+    )
+    return totals
+
+
 # --- PHASE 1: PARQUET UPLOADS ---
 
 @celery_app.task(soft_time_limit=600, queue="io_tasks")
@@ -35,68 +105,346 @@ def upload_parquet_task(version_tag: str, file_path: str, reupload: bool = False
     client, settings = build_client()
     parquet_key = f"{version_tag}/{DATASET_PREFIX}/parquet/nuts_id={nuts_id}/{source.name}"
 
+    crc32 = footer = None
     if reupload or not file_exists(client, settings, parquet_key):
         logging.info(f"Uploading: {parquet_key}")
         upload_file(client, settings, parquet_key, str(source))
+        crc32 = file_crc32(source)
+        footer = footer_stats(pq.ParquetFile(source))
     else:
         logging.info(f"Skipping existing parquet: {parquet_key}")
 
+    register_object(client, settings, parquet_key, crc32, footer)
+
+    # Sidecar spatial index, rebuilt whenever the partition was (re)uploaded
+    sidecar_key = index_key(parquet_key)
+    if crc32 is not None or not file_exists(client, settings, sidecar_key):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sidecar_path = Path(tmp_dir) / Path(sidecar_key).name
+            sidecar_path.write_bytes(build_partition_index(source, crc32 or file_crc32(source)))
+            upload_file(client, settings, sidecar_key, str(sidecar_path))
+            sidecar_crc32 = file_crc32(sidecar_path)
+        register_object(client, settings, sidecar_key, sidecar_crc32)
     return f"Uploaded {nuts_id}"
 
 
 # --- PHASE 2: CONVERSIONS ---
 
-@celery_app.task(soft_time_limit=3000, acks_late=True, queue="heavy_tasks")
-def convert_spatial_task(version_tag: str, file_path: str, reupload: bool = False):
-    """Stage 2: Heavy-duty conversion task. Isolated for OOM protection."""
-    source = Path(file_path)
-    nuts_id = source.stem
-    client, settings = build_client()
-
-    gdf = None
+def _convert_formats(client, settings, version_tag: str, nuts_id: str, source: Path, fmt_names) -> ConversionReport:
+    """Convert a parquet partition to several spatial formats in one pass, upload and register them."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outputs = {
+            fmt_name: (SPATIAL_FORMATS[fmt_name][0], Path(tmp_dir) / f"{nuts_id}{SPATIAL_FORMATS[fmt_name][1]}")
+            for fmt_name in fmt_names
+        }
+        pool = get_process_pool(django_settings.DATALAKE_CONVERT_PROCESSES)
+        if pool is None:
+            report = convert_partition(source, nuts_id, outputs, django_settings.DATALAKE_CONVERT_BATCH_ROWS)
+        else:
+            report = convert_partition_parallel(
+                source,
+                nuts_id,
+                outputs,
+                pool,
+                django_settings.DATALAKE_CONVERT_BATCH_ROWS,
+                django_settings.DATALAKE_CONVERT_CHUNK_ROWS,
+            )
+        logging.info(f"Converted {nuts_id} to {', '.join(fmt_names)}: {report.summary()}")
+
+        for fmt_name, (_, output_path) in outputs.items():
+            if fmt_name in report.errors:
+                continue
+            try:
+                _upload_converted(client, settings, version_tag, nuts_id, fmt_name, output_path)
+            except Exception as e:
+                report.errors[fmt_name] = e
+    return report
+
+
+def _upload_converted(client, settings, version_tag: str, nuts_id: str, fmt_name: str, output_path: Path):
+    object_key = f"{version_tag}/{DATASET_PREFIX}/{fmt_name}/nuts_id={nuts_id}/{output_path.name}"
+    # Check for zip output (common for shapefiles)
+    final_path = output_path if output_path.exists() else output_path.with_suffix('.zip')
+    upload_file(client, settings, object_key, str(final_path))
+    register_object(client, settings, object_key, file_crc32(final_path))
+
+
+def _missing_formats(client, settings, version_tag: str, nuts_id: str, reupload: bool) -> List[str]:
+    fmt_names = []
     for fmt_name, (converter, ext) in SPATIAL_FORMATS.items():
         object_key = f"{version_tag}/{DATASET_PREFIX}/{fmt_name}/nuts_id={nuts_id}/{nuts_id}{ext}"
 
         if not reupload and file_exists(client, settings, object_key):
             logging.info(f"Skipping existing {fmt_name} for {nuts_id}")
+            register_object(client, settings, object_key)
             continue
+        fmt_names.append(fmt_name)
+    return fmt_names
+
+
+def conversion_shards(file_path: str) -> List[List[int]]:
+    """Row groups of each shard of a partition too large for one conversion task; empty for the others."""
+    shard_rows = django_settings.DATALAKE_CONVERT_SHARD_ROWS
+    if not shard_rows or pq.ParquetFile(file_path).metadata.num_rows <= shard_rows:
+        return []
+    shards = plan_chunks(Path(file_path), shard_rows)
+    return shards if len(shards) > 1 else []
 
-        try:
-            if gdf is None:
-                # Local import to prevent memory bloat on non-conversion workers
-                import geopandas as gpd
-                logging.info(f"Loading {nuts_id} for conversion...")
-                gdf = gpd.read_parquet(source)
 
-            with tempfile.TemporaryDirectory() as tmp_dir:
-                output_path = Path(tmp_dir) / f"{nuts_id}{ext}"
-                converter.convert(gdf, output_path, nuts_id)
+def shard_prefix(version_tag: str, nuts_id: str, fmt_name: str) -> str:
+    # Outside of the dataset prefix, so the catalog never picks the staged parts up
+    return f"{version_tag}/_shards/{nuts_id}/{fmt_name}/"
+
+
+def _remove_staged(client, settings, prefix: str):
+    for obj in list_objects(client, settings, prefix):
+        client.remove_object(settings.bucket, obj.object_name)
+
+
+@celery_app.task(bind=True)
+def plan_conversions_task(self, version_tag: str, file_paths: list, reupload: bool = False):
+    """
+    Stage 2: Replace this task with the conversion of every partition. The
+    partitions above `DATALAKE_CONVERT_SHARD_ROWS` are split into shards of
+    row groups, converted by separate tasks and merged once all shards ran.
+    """
+    client, settings = build_client()
+    conversions, shards, merges = [], [], []
+    for file_path in file_paths:
+        nuts_id = Path(file_path).stem
+        chunks = conversion_shards(file_path)
+        fmt_names = _missing_formats(client, settings, version_tag, nuts_id, reupload) if chunks else []
+        if not fmt_names:
+            conversions.append(convert_spatial_task.si(version_tag, file_path, reupload))
+            continue
+        logging.info(f"Converting {nuts_id} to {', '.join(fmt_names)} in {len(chunks)} shards")
+        for fmt_name in fmt_names:
+            # Parts left by an earlier run may come from another shard plan
+            _remove_staged(client, settings, shard_prefix(version_tag, nuts_id, fmt_name))
+            shards.extend(
+                convert_shard_task.si(version_tag, nuts_id, fmt_name, part, row_groups)
+                for part, row_groups in enumerate(chunks)
+            )
+            merges.append(merge_shards_task.si(version_tag, nuts_id, fmt_name, len(chunks)))
+
+    if not merges:
+        return self.replace(chord(group(conversions), notify_phase_complete.si(None, "Conversion")))
+    return self.replace(
+        chain(
+            chord(group(conversions + shards), notify_phase_complete.si(None, "Conversion shards")),
+            chord(group(merges), notify_phase_complete.si(None, "Conversion")),
+        )
+    )
 
-                # Check for zip output (common for shapefiles)
-                final_path = output_path if output_path.exists() else output_path.with_suffix('.zip')
-                upload_file(client, settings, object_key, str(final_path))
 
-        except Exception as e:
+@celery_app.task(soft_time_limit=3000, acks_late=True, queue="heavy_tasks")
+def convert_shard_task(version_tag: str, nuts_id: str, fmt_name: str, part: int, row_groups: list):
+    """Stage 2: Convert some row groups of a stored Parquet partition and stage the part for the merge."""
+    client, settings = build_client()
+    converter, ext = SPATIAL_FORMATS[fmt_name]
+    parquet_key = f"{version_tag}/{DATASET_PREFIX}/parquet/nuts_id={nuts_id}/{nuts_id}.parquet"
+    prefix = shard_prefix(version_tag, nuts_id, fmt_name)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = Path(tmp_dir) / f"{nuts_id}{ext}"
+            # Range reads of the shard's row groups only, so any heavy worker can take it
+            with get_filesystem(settings).open_input_file(object_path(settings, parquet_key)) as source:
+                seconds = convert_chunk(
+                    source,
+                    nuts_id,
+                    converter,
+                    output_path,
+                    part,
+                    row_groups,
+                    django_settings.DATALAKE_CONVERT_BATCH_ROWS,
+                )
+            for path in converter.part_files(output_path, nuts_id, part):
+                upload_file(client, settings, prefix + path.relative_to(tmp_dir).as_posix(), str(path))
+    except Exception as e:
+        logging.error(f"Conversion failed for shard {part} of {nuts_id} to {fmt_name}: {e}")
+        return None
+    logging.info(f"Converted shard {part} of {nuts_id} to {fmt_name} in {seconds:.1f} s")
+    return f"Converted shard {part} of {nuts_id}"
+
+
+@celery_app.task(soft_time_limit=3000, acks_late=True, queue="heavy_tasks")
+def merge_shards_task(version_tag: str, nuts_id: str, fmt_name: str, parts: int):
+    """Stage 2: Merge the staged parts of a sharded partition into the final object."""
+    client, settings = build_client()
+    converter, ext = SPATIAL_FORMATS[fmt_name]
+    prefix = shard_prefix(version_tag, nuts_id, fmt_name)
+    staged = [obj.object_name for obj in list_objects(client, settings, prefix)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / f"{nuts_id}{ext}"
+        for object_name in staged:
+            client.fget_object(settings.bucket, object_name, str(Path(tmp_dir) / object_name[len(prefix):]))
+        missing = [part for part in range(parts) if not converter.part_files(output_path, nuts_id, part)]
+        if missing:
+            logging.error(f"Not merging {fmt_name} of {nuts_id}: shards {missing} failed")
+            return None
+        converter.merge_parts(output_path, nuts_id, parts)
+        _upload_converted(client, settings, version_tag, nuts_id, fmt_name, output_path)
+
+    _remove_staged(client, settings, prefix)
+    return f"Merged {parts} shards of {nuts_id} to {fmt_name}"
+
+
+@celery_app.task(soft_time_limit=3000, acks_late=True, queue="heavy_tasks")
+def convert_spatial_task(version_tag: str, file_path: str, reupload: bool = False):
+    """Stage 2: Conversion task, writing all spatial formats in one streaming pass over the partition."""
+    source = Path(file_path)
+    nuts_id = source.stem
+    client, settings = build_client()
+
+    fmt_names = _missing_formats(client, settings, version_tag, nuts_id, reupload)
+    if fmt_names:
+        report = _convert_formats(client, settings, version_tag, nuts_id, source, fmt_names)
+        for fmt_name, e in report.errors.items():
             logging.error(f"Conversion failed for {nuts_id} to {fmt_name}: {e}")
 
     return f"Converted {nuts_id}"
 
 
+@celery_app.task(soft_time_limit=3000, acks_late=True, queue=ON_DEMAND_QUEUE)
+def convert_partition_task(version_tag: str, nuts_id: str, fmt_name: str):
+    """On demand: Convert a stored Parquet partition to a format a client asked for."""
+    client, settings = build_client()
+    parquet_key = f"{version_tag}/{DATASET_PREFIX}/parquet/nuts_id={nuts_id}/{nuts_id}.parquet"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = Path(tmp_dir) / f"{nuts_id}.parquet"
+        client.fget_object(settings.bucket, parquet_key, str(source))
+        logging.info(f"Converting {nuts_id} to {fmt_name} on demand...")
+        report = _convert_formats(client, settings, version_tag, nuts_id, source, [fmt_name])
+    if report.errors:
+        raise report.errors[fmt_name]
+    # A failed job keeps its key until it expires, so clients do not retrigger it right away
+    finish_conversion(version_tag, nuts_id, fmt_name)
+
+    if file_exists(client, settings, manifest_key(version_tag)):
+        with Redlock(key=f"eubucco.data.manifest.{version_tag}", masters={r}, auto_release_time=60):
+            write_manifest(client, settings, version_tag)
+    return f"Converted {nuts_id} to {fmt_name}"
+
+
+# The global CELERY_TASK_TIME_LIMIT would kill a country long before its soft limit
+@celery_app.task(soft_time_limit=6 * 3600, time_limit=6 * 3600 + 600, acks_late=True, queue="heavy_tasks")
+def build_pmtiles_task(version_tag: str, country: str, file_paths: list, reupload: bool = False):
+    """Stage 2b: Render the building footprints of a country into a PMTiles archive."""
+    client, settings = build_client()
+    object_key = f"{version_tag}/{DATASET_PREFIX}/pmtiles/nuts_id={country}/{country}.pmtiles"
+
+    if not reupload and file_exists(client, settings, object_key):
+        logging.info(f"Skipping existing pmtiles for {country}")
+        register_object(client, settings, object_key)
+        return f"PMTiles {country} exists"
+
+    # Local import to keep shapely and the tile encoder off the other workers
+    from .tiles import build_pmtiles
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / f"{country}.pmtiles"
+        count = build_pmtiles(
+            [Path(f) for f in file_paths],
+            output_path,
+            django_settings.DATALAKE_TILES_MIN_ZOOM,
+            django_settings.DATALAKE_TILES_MAX_ZOOM,
+            name=f"EUBUCCO {version_tag} {country} buildings",
+        )
+        if not count:
+            return f"No tiles for {country}"
+        logging.info(f"Uploading {count} tiles: {object_key}")
+        upload_file(client, settings, object_key, str(output_path))
+        crc32 = file_crc32(output_path)
+
+    register_object(client, settings, object_key, crc32)
+    return f"Built PMTiles {country}"
+
+
+# --- PHASE 3: PREBUILT BUNDLES ---
+
+@celery_app.task(soft_time_limit=3000, acks_late=True, queue="io_tasks")
+def build_bundle_task(version_tag: str, nuts_prefix: str, fmt_name: str, rebuild: bool = False):
+    """Stage 3: Materialise the bundle ZIP of a NUTS prefix unless an up to date one exists."""
+    entries = prefix_objects(version_tag, nuts_prefix, fmt_name)
+    if not entries:
+        return f"No {fmt_name} objects for {nuts_prefix}"
+
+    fingerprint = bundle_fingerprint(entries)
+    existing = PrebuiltBundle.objects.filter(
+        version=version_tag, nuts_prefix=nuts_prefix, format=fmt_name
+    ).first()
+    if not rebuild and existing and existing.fingerprint == fingerprint:
+        logging.info(f"Skipping up to date {fmt_name} bundle for {nuts_prefix}")
+        return f"Bundle {nuts_prefix} {fmt_name} up to date"
+
+    client, settings = build_client()
+    object_key = prebuilt_bundle_key(version_tag, nuts_prefix, fmt_name)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = Path(tmp_dir) / f"{nuts_prefix}.zip"
+        write_bundle(client, settings, entries, output_path)
+        logging.info(f"Uploading bundle: {object_key}")
+        upload_file(client, settings, object_key, str(output_path))
+        size = output_path.stat().st_size
+
+    PrebuiltBundle.objects.update_or_create(
+        version=version_tag,
+        nuts_prefix=nuts_prefix,
+        format=fmt_name,
+        defaults={"key": object_key, "fingerprint": fingerprint, "size": size},
+    )
+    return f"Built bundle {nuts_prefix} {fmt_name}"
+
+
+# --- CATALOG ---
+
+@celery_app.task(soft_time_limit=3000, queue="io_tasks")
+def reconcile_catalog_task(version_tag: str):
+    """Sync the datalake catalog with the objects actually present in the bucket."""
+    client, settings = build_client()
+    stats = reconcile_version(client, settings, version_tag)
+    # Bundles of objects without a checksum cannot be served with Range support
+    stats["checksummed"] = fill_missing_checksums(client, settings, version_tag)
+    filesystem = get_filesystem(settings)
+    stats["footers_read"] = fill_missing_footer_stats(
+        version_tag, lambda entry: read_footer_stats(filesystem, settings, entry)
+    )
+    # The API prefers the manifest, so it must not outlive the catalog rows it was written from
+    with Redlock(key=f"eubucco.data.manifest.{version_tag}", masters={r}, auto_release_time=60):
+        stats["manifest_objects"] = write_manifest(client, settings, version_tag)
+    logging.info(f"Catalog reconciled for {version_tag}: {stats}")
+    return stats
+
+
 @celery_app.task
 def ingest_all_by_version(
     version_tag: str = "v0.2",
     reupload: bool = False,
     run_upload: bool = True,
-    run_conversion: bool = True
+    run_conversion: Optional[bool] = None,
+    run_bundles: bool = True,
+    run_pmtiles: bool = True,
+    run_hilbert_sort: bool = False,
 ):
     base_path = Path(RAW_FILES_DIR) / version_tag
     parquet_files = [str(p) for p in base_path.rglob("*.parquet")]
 
     if not parquet_files:
         return "No files found."
+    if run_conversion is None:
+        # In lazy mode spatial formats are only converted when a client asks for them
+        run_conversion = not django_settings.DATALAKE_LAZY_CONVERSION
 
     pipeline = []
 
+    # PHASE 0: Hilbert-sorted rewrite, which every later phase then reads
+    if run_hilbert_sort:
+        sort_tasks = group(sort_parquet_task.s(version_tag, f, reupload) for f in parquet_files)
+        pipeline.append(chord(sort_tasks, report_sort_phase.s()))
+        parquet_files = [str(sorted_path(version_tag, f)) for f in parquet_files]
+
     # PHASE 1: Uploads
     if run_upload:
         upload_tasks = group(upload_parquet_task.s(version_tag, f, reupload) for f in parquet_files)
@@ -105,8 +453,32 @@ def ingest_all_by_version(
 
     # PHASE 2: Conversions
     if run_conversion:
-        conversion_tasks = group(convert_spatial_task.s(version_tag, f, reupload) for f in parquet_files)
-        pipeline.append(chord(conversion_tasks, notify_phase_complete.si(None, "Conversion")))
+        # Planned when the phase starts, as the partitions may only be sorted by then
+        pipeline.append(plan_conversions_task.si(version_tag, parquet_files, reupload))
+
+    # PHASE 2b: Per-country PMTiles archives of the footprints
+    if run_pmtiles:
+        countries = {}
+        for f in parquet_files:
+            countries.setdefault(Path(f).stem[:2], []).append(f)
+        pmtiles_tasks = group(
+            build_pmtiles_task.si(version_tag, country, files, reupload)
+            for country, files in sorted(countries.items())
+        )
+        pipeline.append(chord(pmtiles_tasks, notify_phase_complete.si(None, "PMTiles")))
+
+    # Catch objects uploaded or removed outside of this run
+    pipeline.append(reconcile_catalog_task.si(version_tag))
+
+    # PHASE 3: Prebuilt bundles for countries and NUTS1 regions
+    if run_bundles:
+        prefixes = prebuilt_prefixes(Path(f).stem for f in parquet_files)
+        bundle_tasks = group(
+            build_bundle_task.si(version_tag, prefix, fmt_name, reupload)
+            for prefix in prefixes
+            for fmt_name in ["parquet", *([] if django_settings.DATALAKE_LAZY_CONVERSION else SPATIAL_FORMATS)]
+        )
+        pipeline.append(chord(bundle_tasks, notify_phase_complete.si(None, "Bundles")))
 
     # Final Step: Notification
     pipeline.append(notify_all_complete.si(None, version_tag))
@@ -126,7 +498,10 @@ def notify_phase_complete(results, phase_name: str):
 
 @celery_app.task
 def notify_all_complete(results, version_tag: str):
-    logging.info(f"Full data ingestion pipeline completed for {version_tag}.")
+    # One object the API processes load instead of querying the catalog per lookup
+    client, settings = build_client()
+    count = write_manifest(client, settings, version_tag)
+    logging.info(f"Full data ingestion pipeline completed for {version_tag}; manifest lists {count} objects.")
 
 
 @celery_app.task
@@ -0,0 +1,77 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import fs
+
+from eubucco.data.aggregate import AggregateQuery, catalog_rows, run_aggregate
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+from eubucco.data.query import QueryError, footer_stats
+
+
+def write_partition(root, nuts_id, types, heights):
+    key = f"v0.2/buildings/parquet/nuts_id={nuts_id}/{nuts_id}.parquet"
+    path = root / "eubucco" / key
+    path.parent.mkdir(parents=True)
+    pq.write_table(pa.table({"type": types, "height": heights}), path)
+    return CatalogObject(key=key, version="v0.2", format="parquet", nuts_id=nuts_id, size=0, etag=nuts_id)
+
+
+def test_aggregate_by_partition_and_type(tmp_path):
+    entries = [
+        write_partition(tmp_path, "AA11", ["residential", "residential", "non-residential"], [3.0, 5.0, 10.0]),
+        write_partition(tmp_path, "BB22", ["residential"], [None]),
+    ]
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    schema = pq.read_schema(tmp_path / "eubucco" / entries[0].key)
+    aggregate_query = AggregateQuery.parse(["nuts_id", "type"], ["count", "avg(height)"])
+    aggregate_query.validate(schema)
+
+    rows = run_aggregate(filesystem, MinioSettings(bucket="eubucco"), "v0.2", entries, schema, aggregate_query)
+
+    assert rows == [
+        {"nuts_id": "AA11", "type": "non-residential", "count": 1, "avg_height": 10.0},
+        {"nuts_id": "AA11", "type": "residential", "count": 2, "avg_height": 4.0},
+        {"nuts_id": "BB22", "type": "residential", "count": 1, "avg_height": None},
+    ]
+
+
+def test_counts_come_from_the_footer_summaries(tmp_path):
+    entries = [
+        write_partition(tmp_path, "AA11", ["residential", "residential", "non-residential"], [3.0, None, 10.0]),
+        write_partition(tmp_path, "BB22", ["residential"], [4.0]),
+    ]
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    schema = pq.read_schema(tmp_path / "eubucco" / entries[0].key)
+    aggregate_query = AggregateQuery.parse(["nuts_id"], ["count", "count(height)"])
+
+    assert catalog_rows(aggregate_query, entries) is None
+    for entry in entries:
+        for name, value in footer_stats(pq.ParquetFile(tmp_path / "eubucco" / entry.key)).items():
+            setattr(entry, name, value)
+
+    rows = catalog_rows(aggregate_query, entries)
+    assert rows == run_aggregate(filesystem, MinioSettings(bucket="eubucco"), "v0.2", entries, schema, aggregate_query)
+    assert rows == [
+        {"nuts_id": "AA11", "count": 3, "count_height": 2},
+        {"nuts_id": "BB22", "count": 1, "count_height": 1},
+    ]
+    assert catalog_rows(AggregateQuery.parse([], ["count"]), entries) == [{"count": 4}]
+    assert catalog_rows(AggregateQuery.parse(["type"], ["count"]), entries) is None
+    assert catalog_rows(AggregateQuery.parse([], ["avg(height)"]), entries) is None
+
+
+def test_cache_key_follows_inputs():
+    entry = CatalogObject(key="v0.2/buildings/parquet/nuts_id=AA11/AA11.parquet", etag="a")
+    aggregate_query = AggregateQuery.parse(["type"], ["count"])
+    key = aggregate_query.cache_key("v0.2", [entry])
+
+    assert AggregateQuery.parse([" type"], ["count"]).cache_key("v0.2", [entry]) == key
+    entry.etag = "b"
+    assert aggregate_query.cache_key("v0.2", [entry]) != key
+
+
+@pytest.mark.parametrize("group_by, metrics", [(["geometry"], ["count"]), ([], ["median(height)"]), ([], ["avg"])])
+def test_invalid_aggregations_are_rejected(group_by, metrics):
+    with pytest.raises(QueryError):
+        AggregateQuery.parse(group_by, metrics)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from eubucco.data import async_store
+from eubucco.data.async_store import AsyncObjectStore, iterate_io, run_io
+from eubucco.data.minio_client import MinioSettings
+
+DELAY = 0.2
+REQUESTS = 16
+
+
+class SlowClient:
+    """Blocking client whose calls take DELAY seconds, like a MinIO round trip."""
+
+    def stat_object(self, bucket, object_name):
+        time.sleep(DELAY)
+        return object_name
+
+    def list_objects(self, bucket, prefix="", recursive=False):
+        time.sleep(DELAY)
+        return iter([prefix])
+
+
+@pytest.fixture(autouse=True)
+def io_workers(settings, monkeypatch):
+    settings.DATALAKE_IO_WORKERS = REQUESTS
+    # Earlier tests may have started the shared pool with fewer workers
+    monkeypatch.setattr(async_store, "_executor", None)
+
+
+def test_parallel_requests_do_not_serialise():
+    store = AsyncObjectStore(SlowClient(), MinioSettings())
+
+    async def handle(i):
+        await store.stat_object(f"key-{i}")
+        return await store.list_objects(prefix=f"prefix-{i}/")
+
+    async def main():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(handle(i) for i in range(REQUESTS)))
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(main())
+
+    assert results == [[f"prefix-{i}/"] for i in range(REQUESTS)]
+    # Serialised this would take REQUESTS * 2 * DELAY = 6.4s
+    assert elapsed < 4 * DELAY
+
+
+def test_event_loop_stays_responsive():
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(DELAY / 10)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await run_io(time.sleep, DELAY)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(main()) >= 5
+
+
+def test_iterate_io_closes_generator():
+    closed = []
+
+    def chunks():
+        try:
+            yield from (b"a", b"b", b"c")
+        finally:
+            closed.append(True)
+
+    async def main():
+        received = []
+        stream = iterate_io(chunks())
+        async for chunk in stream:
+            received.append(chunk)
+            if len(received) == 2:
+                break
+        await stream.aclose()
+        return received
+
+    assert asyncio.run(main()) == [b"a", b"b"]
+    assert closed == [True]
+
+
+def test_iterate_io_closes_generator_cancelled_mid_item():
+    closed = []
+
+    def chunks():
+        try:
+            yield b"a"
+            time.sleep(DELAY)
+            yield b"b"
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = iterate_io(chunks())
+
+        async def consume():
+            async for _ in stream:
+                pass
+
+        task = asyncio.create_task(consume())
+        # Cancelled like a disconnecting client while next() runs on the pool
+        await asyncio.sleep(DELAY / 4)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert closed == [True]
@@ -0,0 +1,141 @@
+import io
+import os
+import zipfile
+import zlib
+from datetime import datetime, timezone
+
+from eubucco.data.bundles import ObjectPrefetcher, bundle_layout, iter_bundle_range, iter_zip_stream
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+
+
+class FakeResponse:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+
+class FakeClient:
+    def __init__(self, objects: dict):
+        self.objects = objects
+
+    def get_object(self, bucket, object_name, offset=0, length=0):
+        data = self.objects[object_name]
+        return FakeResponse(data[offset:offset + length] if length else data[offset:])
+
+
+def make_entries(sizes):
+    objects = {
+        f"v0.2/buildings/parquet/nuts_id=DE{i}/DE{i}.parquet": os.urandom(size)
+        for i, size in enumerate(sizes)
+    }
+    entries = [
+        CatalogObject(
+            key=key,
+            version="v0.2",
+            format="parquet",
+            nuts_id=key.split("=")[1].split("/")[0],
+            size=len(data),
+            etag=f"etag-{i}",
+            crc32=zlib.crc32(data),
+            last_modified=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        )
+        for i, (key, data) in enumerate(objects.items())
+    ]
+    return FakeClient(objects), entries
+
+
+def test_zip_stream_roundtrip():
+    client, entries = make_entries([0, 10, 3 * 1024 * 1024 + 7])
+
+    chunks = list(iter_zip_stream(client, MinioSettings(), entries))
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [entry.key.split("/")[-1] for entry in entries]
+        for entry in entries:
+            assert zf.read(entry.key.split("/")[-1]) == client.objects[entry.key]
+
+
+def test_zip_stream_is_incremental(settings):
+    settings.DATALAKE_BUNDLE_PART_SIZE = 1024 * 1024
+    client, entries = make_entries([4 * 1024 * 1024])
+
+    stream = iter_zip_stream(client, MinioSettings(), entries)
+    first = next(stream)
+
+    assert first.startswith(b"PK\x03\x04")
+    assert len(first) < entries[0].size
+
+
+def test_prefetcher_keeps_order_and_budget():
+    client, entries = make_entries([5, 2500, 0, 1000])
+    part_size, budget = 1000, 2000
+
+    fetched = []
+
+    class TrackingPrefetcher(ObjectPrefetcher):
+        def _fetch(self, entry, offset, length):
+            fetched.append(length)
+            return super()._fetch(entry, offset, length)
+
+    prefetcher = TrackingPrefetcher(
+        client,
+        MinioSettings(),
+        [(entry, 0, entry.size) for entry in entries],
+        workers=4,
+        part_size=part_size,
+        memory_budget=budget,
+    )
+    parts, consumed = [], 0
+    for entry, offset, data in prefetcher:
+        assert sum(fetched) - consumed <= budget
+        consumed += len(data)
+        parts.append((entry.key, offset, data))
+
+    expected = []
+    for entry in entries:
+        data = client.objects[entry.key]
+        offsets = range(0, len(data), part_size) if data else [0]
+        expected.extend((entry.key, offset, data[offset:offset + part_size]) for offset in offsets)
+    assert parts == expected
+
+
+def test_deterministic_bundle_roundtrip():
+    client, entries = make_entries([0, 10, 3 * 1024 * 1024 + 7])
+    layout = bundle_layout(entries)
+
+    archive = b"".join(iter_bundle_range(client, MinioSettings(), layout))
+
+    assert len(archive) == layout.size
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        for entry in entries:
+            info = zf.getinfo(entry.key.split("/")[-1])
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert zf.read(info) == client.objects[entry.key]
+
+
+def test_bundle_ranges_match_full_archive(settings):
+    settings.DATALAKE_BUNDLE_PART_SIZE = 1000
+    client, entries = make_entries([2500, 0, 7, 1200])
+    layout = bundle_layout(entries)
+    archive = b"".join(iter_bundle_range(client, MinioSettings(), layout))
+
+    for start, end in [(0, 1), (0, 30), (25, 2600), (2540, 2700), (layout.size - 22, layout.size)]:
+        assert b"".join(iter_bundle_range(client, MinioSettings(), layout, start, end)) == archive[start:end]
+
+
+def test_bundle_layout_needs_checksums():
+    client, entries = make_entries([10, 20])
+    entries[1].crc32 = None
+
+    assert bundle_layout(entries) is None
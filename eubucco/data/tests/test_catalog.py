@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from eubucco.data import catalog
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+
+SETTINGS = MinioSettings(bucket="eubucco")
+PARQUET = "v0.2/buildings/parquet/nuts_id=DE11/DE11.parquet"
+GPKG = "v0.2/buildings/gpkg/nuts_id=DE11/DE11.gpkg"
+FOOTER = {"num_rows": 10, "num_row_groups": 1, "uncompressed_size": 100, "footer_stats": {"rows": 10}}
+
+
+class FakeBucket:
+    def __init__(self):
+        self.objects = {}
+
+    def put(self, key, etag, size=10):
+        self.objects[key] = SimpleNamespace(
+            object_name=key,
+            etag=f'"{etag}"',
+            size=size,
+            last_modified=datetime(2025, 1, 1, tzinfo=timezone.utc),
+        )
+
+    def stat_object(self, bucket, key):
+        return self.objects[key]
+
+    def list_objects(self, bucket, prefix="", recursive=False):
+        return [obj for key, obj in sorted(self.objects.items()) if key.startswith(prefix)]
+
+
+def entry(key):
+    return CatalogObject.objects.get(key=key)
+
+
+@pytest.mark.django_db
+def test_register_object_keeps_content_fields_while_the_etag_is_unchanged():
+    bucket = FakeBucket()
+    bucket.put(PARQUET, "a")
+
+    registered = catalog.register_object(bucket, SETTINGS, PARQUET, crc32=123, footer=FOOTER)
+    assert (registered.version, registered.format, registered.nuts_id, registered.etag) == (
+        "v0.2", "parquet", "DE11", "a"
+    )
+    assert (registered.crc32, registered.num_rows, registered.footer_stats) == (123, 10, {"rows": 10})
+
+    # Re-registering a skipped upload keeps what was computed for this content
+    catalog.register_object(bucket, SETTINGS, PARQUET)
+    assert (entry(PARQUET).crc32, entry(PARQUET).num_rows) == (123, 10)
+
+    # A replaced object drops the values of the old content
+    bucket.put(PARQUET, "b", size=20)
+    catalog.register_object(bucket, SETTINGS, PARQUET)
+    replaced = entry(PARQUET)
+    assert (replaced.etag, replaced.size, replaced.crc32, replaced.num_rows) == ("b", 20, None, None)
+    assert CatalogObject.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_register_object_skips_bookkeeping_keys():
+    bucket = FakeBucket()
+    bucket.put("v0.2/buildings/_manifest.parquet", "a")
+
+    assert catalog.register_object(bucket, SETTINGS, "v0.2/buildings/_manifest.parquet") is None
+    assert not CatalogObject.objects.exists()
+
+
+@pytest.mark.django_db
+def test_reconcile_version_syncs_rows_with_the_bucket():
+    bucket = FakeBucket()
+    bucket.put(PARQUET, "a")
+    bucket.put(GPKG, "g")
+    catalog.register_object(bucket, SETTINGS, PARQUET, crc32=123, footer=FOOTER)
+    catalog.register_object(bucket, SETTINGS, GPKG, crc32=456)
+    other_version = "v0.1/buildings/parquet/nuts_id=DE11/DE11.parquet"
+    bucket.put(other_version, "o")
+    catalog.register_object(bucket, SETTINGS, other_version)
+
+    added = "v0.2/buildings/parquet/nuts_id=FR10/FR10.parquet"
+    bucket.put(added, "f")
+    bucket.put("v0.2/buildings/_manifest.parquet", "m")
+    del bucket.objects[GPKG]
+
+    stats = catalog.reconcile_version(bucket, SETTINGS, "v0.2")
+
+    assert stats == {"created": 1, "updated": 0, "deleted": 1}
+    assert set(CatalogObject.objects.values_list("key", flat=True)) == {PARQUET, added, other_version}
+    assert (entry(PARQUET).crc32, entry(PARQUET).num_rows) == (123, 10)
+    assert (entry(added).nuts_id, entry(added).crc32) == ("FR10", None)
+
+    bucket.put(PARQUET, "b", size=20)
+    stats = catalog.reconcile_version(bucket, SETTINGS, "v0.2")
+
+    assert stats == {"created": 0, "updated": 1, "deleted": 0}
+    replaced = entry(PARQUET)
+    assert (replaced.etag, replaced.size) == ("b", 20)
+    assert (replaced.crc32, replaced.num_rows, replaced.footer_stats) == (None, None, None)
+    assert catalog.reconcile_version(bucket, SETTINGS, "v0.2") == {"created": 0, "updated": 0, "deleted": 0}
+
+
+@pytest.mark.django_db
+def test_path_listing_leaves_out_derived_objects():
+    bucket = FakeBucket()
+    for key in [
+        PARQUET,
+        GPKG,
+        "v0.2/buildings/_index/nuts_id=DE11/DE11.idx",
+        "v0.2/buildings/pmtiles/nuts_id=DE/DE.pmtiles",
+        "v0.2/buildings/metadata/README.md",
+    ]:
+        bucket.put(key, "a")
+    catalog.reconcile_version(bucket, SETTINGS, "v0.2")
+    listed = [GPKG, "v0.2/buildings/metadata/README.md", PARQUET]
+
+    assert [entry.key for entry in catalog.path_objects("v0.2/buildings/")] == listed
+    assert [entry.key for entry in catalog.path_page("v0.2/buildings/", after=GPKG, limit=10)] == listed[1:]
+    expected = catalog.listing_fingerprint((key, "a", None) for key in listed)
+    assert catalog.path_fingerprint("v0.2/buildings/") == expected
+    assert catalog.path_objects("v0.2/buildings/_index/") == []
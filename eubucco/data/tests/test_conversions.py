@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+
+import pytest
+from django.core.cache import cache
+
+from config import celery_app
+from eubucco.data import conversions
+from eubucco.data.models import CatalogObject
+
+pytestmark = pytest.mark.django_db
+
+
+def add_object(nuts_id, fmt, ext):
+    CatalogObject.objects.create(
+        key=f"v0.2/buildings/{fmt}/nuts_id={nuts_id}/{nuts_id}.{ext}",
+        version="v0.2",
+        format=fmt,
+        nuts_id=nuts_id,
+        size=1,
+        etag=f"{nuts_id}-{fmt}",
+        last_modified=datetime(2025, 1, 1, tzinfo=timezone.utc),
+    )
+
+
+def test_concurrent_requests_share_one_conversion(monkeypatch):
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, queue: sent.append((name, args, queue)))
+    cache.clear()
+    for nuts_id in ["DE11", "DE12"]:
+        add_object(nuts_id, "parquet", "parquet")
+    add_object("DE11", "gpkg", "gpkg")
+
+    assert conversions.request_conversions("v0.2", ["DE11", "DE12", "FR10"], "gpkg") == ["DE12"]
+    assert conversions.request_conversions("v0.2", ["DE12"], "gpkg") == ["DE12"]
+    assert sent == [(conversions.CONVERT_TASK, ("v0.2", "DE12", "gpkg"), conversions.ON_DEMAND_QUEUE)]
+
+    add_object("DE12", "gpkg", "gpkg")
+    conversions.finish_conversion("v0.2", "DE12", "gpkg")
+    assert conversions.request_conversions("v0.2", ["DE11", "DE12"], "gpkg") == []
+    assert len(sent) == 1
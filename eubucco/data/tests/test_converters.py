@@ -0,0 +1,212 @@
+import time
+import zipfile
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+from shapely.geometry import box
+
+from eubucco.data import converters
+from eubucco.data.converters import (
+    GeoPackageConverter,
+    LayerWriter,
+    ShapefileConverter,
+    SpatialConverter,
+    convert_chunk,
+    convert_partition,
+    convert_partition_parallel,
+    plan_chunks,
+    read_batches,
+)
+from eubucco.data.schema import FLOAT, INT, LIST, columns_of_kind
+
+
+def write_partition(path, n=25, row_group_size=None):
+    """Buildings whose first rows have no attributes, so early batches are all null."""
+    df = pd.DataFrame({"id": [f"b{i}" for i in range(n)]})
+    for col in columns_of_kind(FLOAT):
+        df[col] = [None if i < 12 else float(i) for i in range(n)]
+    for col in columns_of_kind(INT):
+        df[col] = pd.array([None if i < 12 else 1900 + i for i in range(n)], dtype="Int64")
+    for col in columns_of_kind(LIST):
+        df[col] = [None if i < 12 else ["osm", "msft"] for i in range(n)]
+    df["type"] = pd.Categorical([None if i < 12 else "residential" for i in range(n)])
+    gdf = gpd.GeoDataFrame(df, geometry=[box(i, 0, i + 1, 1) for i in range(n)], crs=3035)
+    gdf.to_parquet(path, row_group_size=row_group_size)
+    return gdf
+
+
+def test_streamed_gpkg_matches_whole_conversion(tmp_path):
+    source = tmp_path / "AA11.parquet"
+    write_partition(source)
+    assert [len(batch) for batch in read_batches(source, batch_rows=10)] == [10, 10, 5]
+
+    GeoPackageConverter().convert_file(source, tmp_path / "streamed.gpkg", "AA11", batch_rows=10)
+    GeoPackageConverter().convert_file(source, tmp_path / "whole.gpkg", "AA11", batch_rows=1000)
+    streamed = gpd.read_file(tmp_path / "streamed.gpkg", layer="AA11")
+    whole = gpd.read_file(tmp_path / "whole.gpkg", layer="AA11")
+
+    assert streamed.crs.to_epsg() == 3035
+    assert streamed.dtypes.equals(whole.dtypes)
+    pd.testing.assert_frame_equal(pd.DataFrame(streamed), pd.DataFrame(whole))
+    assert streamed.loc[12, "type_source_ids"] == '["osm", "msft"]'
+
+
+def test_streamed_shapefile_and_empty_partition(tmp_path):
+    source, empty = tmp_path / "AA11.parquet", tmp_path / "AA12.parquet"
+    write_partition(source).iloc[:0].to_parquet(empty)
+
+    ShapefileConverter().convert_file(source, tmp_path / "AA11.zip", "AA11", batch_rows=10)
+    shp = gpd.read_file(f"zip://{tmp_path / 'AA11.zip'}")
+    assert len(shp) == 25
+    assert shp.loc[24, "const_yr"] == 1924
+
+    GeoPackageConverter().convert_file(empty, tmp_path / "AA12.gpkg", "AA12")
+    assert len(gpd.read_file(tmp_path / "AA12.gpkg", layer="AA12")) == 0
+
+
+class FailingConverter(SpatialConverter):
+    def writer(self, output_path, nuts_id):
+        class Writer(LayerWriter):
+            def _write(self, gdf, mode):
+                raise ValueError("disk full")
+
+        return Writer(output_path, nuts_id)
+
+
+def test_single_pass_fan_out_matches_separate_conversions(tmp_path):
+    source = tmp_path / "AA11.parquet"
+    write_partition(source)
+
+    report = convert_partition(source, "AA11", {
+        "gpkg": (GeoPackageConverter(), tmp_path / "AA11.gpkg"),
+        "shp": (ShapefileConverter(), tmp_path / "AA11.zip"),
+        "broken": (FailingConverter(), tmp_path / "AA11.broken"),
+    }, batch_rows=10)
+
+    assert list(report.seconds) == ["read", "normalise", "gpkg", "shp", "broken"]
+    assert list(report.errors) == ["broken"]
+    GeoPackageConverter().convert_file(source, tmp_path / "alone.gpkg", "AA11")
+    ShapefileConverter().convert_file(source, tmp_path / "alone.zip", "AA11")
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(gpd.read_file(tmp_path / "AA11.gpkg", layer="AA11")),
+        pd.DataFrame(gpd.read_file(tmp_path / "alone.gpkg", layer="AA11")),
+    )
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(gpd.read_file(f"zip://{tmp_path / 'AA11.zip'}")),
+        pd.DataFrame(gpd.read_file(f"zip://{tmp_path / 'alone.zip'}")),
+    )
+
+
+def test_chunked_conversion_merges_parts(tmp_path):
+    source = tmp_path / "AA11.parquet"
+    write_partition(source, n=95, row_group_size=10)
+    assert plan_chunks(source, chunk_rows=30) == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        report = convert_partition_parallel(source, "AA11", {
+            "gpkg": (GeoPackageConverter(), tmp_path / "AA11.gpkg"),
+            "shp": (ShapefileConverter(), tmp_path / "AA11.zip"),
+        }, executor, batch_rows=7, chunk_rows=30)
+    assert report.errors == {}
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["AA11.gpkg", "AA11.parquet", "AA11.zip"]
+
+    GeoPackageConverter().convert_file(source, tmp_path / "alone.gpkg", "AA11")
+    merged = gpd.read_file(tmp_path / "AA11.gpkg", layer="AA11")
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(merged), pd.DataFrame(gpd.read_file(tmp_path / "alone.gpkg", layer="AA11"))
+    )
+    # The spatial index covers the appended parts, and GDAL can still append afterwards
+    assert len(gpd.read_file(tmp_path / "AA11.gpkg", layer="AA11", bbox=(50, 0, 60.5, 1))) == 12
+    merged.iloc[:3].to_file(tmp_path / "AA11.gpkg", layer="AA11", mode="a")
+    assert len(gpd.read_file(tmp_path / "AA11.gpkg", layer="AA11", bbox=(0, 0, 2.5, 1))) == 6
+
+    names = zipfile.ZipFile(tmp_path / "AA11.zip").namelist()
+    assert sorted(name for name in names if name.endswith(".shp")) == [f"AA11_part{i}.shp" for i in range(4)]
+
+
+class FailingFirstPart(GeoPackageConverter):
+    def __init__(self):
+        self.started = []
+
+    def part_writer(self, output_path, nuts_id, part):
+        self.started.append(part)
+        time.sleep(0.05)
+        if part == 0:
+            raise ValueError("disk full")
+        return super().part_writer(output_path, nuts_id, part)
+
+
+def test_failed_format_leaves_no_chunk_running(tmp_path):
+    source = tmp_path / "AA11.parquet"
+    write_partition(source, n=40, row_group_size=10)
+    converter = FailingFirstPart()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        report = convert_partition_parallel(
+            source, "AA11", {"gpkg": (converter, tmp_path / "AA11.gpkg")}, executor, batch_rows=7, chunk_rows=10
+        )
+        started = list(converter.started)
+    assert isinstance(report.errors["gpkg"], ValueError)
+    # The queued chunks were cancelled and the running one awaited, so none writes after the caller cleaned up
+    assert converter.started == started
+    assert len(started) < 4
+
+
+class BrokenPool(Executor):
+    def __init__(self):
+        self.shutdowns = []
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shutdowns.append((wait, cancel_futures))
+
+
+def test_broken_process_pool_is_shut_down_and_replaced(tmp_path, monkeypatch):
+    source = tmp_path / "AA11.parquet"
+    write_partition(source)
+    pool = BrokenPool()
+    monkeypatch.setattr(converters, "_process_pool", pool)
+
+    report = convert_partition_parallel(source, "AA11", {
+        "gpkg": (GeoPackageConverter(), tmp_path / "AA11.gpkg"),
+        "shp": (ShapefileConverter(), tmp_path / "AA11.zip"),
+    }, pool)
+
+    assert {fmt: type(error) for fmt, error in report.errors.items()} == {
+        "gpkg": BrokenProcessPool, "shp": BrokenProcessPool
+    }
+    assert pool.shutdowns[0] == (False, True)
+    assert converters._process_pool is None
+
+
+def test_shards_merge_after_moving_their_part_files(tmp_path):
+    source = tmp_path / "AA11.parquet"
+    write_partition(source, n=45, row_group_size=10)
+    shards = plan_chunks(source, chunk_rows=20)
+
+    for converter, name in [(GeoPackageConverter(), "AA11.gpkg"), (ShapefileConverter(), "AA11.zip")]:
+        # Each shard is written on its own node and staged by its path relative to the output directory
+        merge_dir = tmp_path / f"merge_{name}"
+        for part, row_groups in enumerate(shards):
+            shard_dir = tmp_path / f"shard{part}_{name}"
+            shard_dir.mkdir()
+            with pa.OSFile(str(source)) as f:
+                convert_chunk(f, "AA11", converter, shard_dir / name, part, row_groups, batch_rows=7)
+            for path in converter.part_files(shard_dir / name, "AA11", part):
+                staged = merge_dir / path.relative_to(shard_dir)
+                staged.parent.mkdir(parents=True, exist_ok=True)
+                path.replace(staged)
+        assert all(converter.part_files(merge_dir / name, "AA11", part) for part in range(len(shards)))
+        converter.merge_parts(merge_dir / name, "AA11", len(shards))
+
+        merged = gpd.read_file(merge_dir / name) if name.endswith(".gpkg") else pd.concat(
+            [gpd.read_file(f"zip://{merge_dir / name}!AA11_part{part}.shp") for part in range(len(shards))]
+        )
+        assert len(merged) == 45
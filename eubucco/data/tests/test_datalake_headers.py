@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from eubucco.api.v1 import datalake
+
+SIZE = 1000
+ETAG = '"abc"'
+
+
+def make_request(headers=None, path="/v1/datalake/nuts/v0.2", query=""):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "root_path": "",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def byte_range(range_header=None, if_range=None):
+    headers = {"Range": range_header} if range_header is not None else {}
+    if if_range is not None:
+        headers["If-Range"] = if_range
+    return datalake._byte_range(make_request(headers), SIZE, ETAG)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 100)),
+    ("bytes=900-", (900, SIZE)),
+    ("bytes=-100", (900, SIZE)),
+    ("bytes=-5000", (0, SIZE)),
+    ("bytes=990-5000", (990, SIZE)),
+    # Invalid, multiple or foreign ranges are ignored and get the full body
+    ("bytes=500-100", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=a-b", None),
+    ("items=0-1", None),
+])
+def test_byte_range(header, expected):
+    assert byte_range(header) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_byte_range(header):
+    with pytest.raises(HTTPException) as error:
+        byte_range(header)
+    assert error.value.status_code == 416
+    assert error.value.headers == {"Content-Range": f"bytes */{SIZE}"}
+
+
+def test_if_range_only_applies_the_range_to_the_same_object():
+    assert byte_range("bytes=0-99", if_range=ETAG) == (0, 100)
+    assert byte_range("bytes=0-99", if_range='"stale"') is None
+
+
+def test_not_modified_matches_the_listing_etag():
+    headers = datalake._cache_headers(make_request(), "fingerprint")
+    etag = headers["ETag"]
+
+    assert headers["Vary"] == "Accept"
+    for if_none_match in [etag, f"W/{etag}", f'"other", {etag}', "*"]:
+        response = datalake._not_modified(make_request({"If-None-Match": if_none_match}), headers)
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+    assert datalake._not_modified(make_request({"If-None-Match": '"other"'}), headers) is None
+    assert datalake._not_modified(make_request(), headers) is None
+
+
+def test_listing_etag_follows_content_and_representation():
+    etag = datalake._cache_headers(make_request(), "fingerprint")["ETag"]
+
+    assert datalake._cache_headers(make_request(), "fingerprint")["ETag"] == etag
+    assert datalake._cache_headers(make_request(), "changed")["ETag"] != etag
+    assert datalake._cache_headers(make_request(query="limit=5"), "fingerprint")["ETag"] != etag
+    ndjson = make_request({"Accept": datalake.NDJSON_MEDIA_TYPE})
+    assert datalake._cache_headers(ndjson, "fingerprint")["ETag"] != etag
+    # Versions the catalog does not know get no validators
+    assert datalake._cache_headers(make_request(), None) == {}
+    assert datalake._not_modified(make_request({"If-None-Match": "*"}), {}) is None
+
+
+# run_db closes stale connections on the IO pool threads
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("after, limit, expected", [
+    (None, None, list(range(10))),
+    (None, 5, list(range(5))),
+    (3, None, list(range(4, 10))),
+    (3, 4, [4, 5, 6, 7]),
+    (9, None, []),
+])
+def test_iter_pages_walks_keyset_pages(monkeypatch, after, limit, expected):
+    monkeypatch.setattr(datalake, "STREAM_PAGE_SIZE", 3)
+    pages = []
+
+    def fetch_page(after, page_size):
+        page = [item for item in range(10) if after is None or item > after][:page_size]
+        pages.append(page)
+        return page
+
+    async def collect():
+        return [item async for item in datalake._iter_pages(fetch_page, after, limit, lambda item: item)]
+
+    assert asyncio.run(collect()) == expected
+    # Pages of at most STREAM_PAGE_SIZE items, and none past the limit
+    assert all(len(page) <= 3 for page in pages)
+    assert sum(len(page) for page in pages) == len(expected)
@@ -0,0 +1,138 @@
+import asyncio
+import io
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pyarrow.parquet as pq
+import pytest
+
+from eubucco.data import catalog
+from eubucco.data.manifest import ManifestIndex, ManifestStore, manifest_key, manifest_table
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+
+
+def make_entries(etag="a"):
+    entries = []
+    for nuts_id in ["DE11", "DE12", "DE21", "FR10"]:
+        for fmt, ext in [("parquet", "parquet"), ("gpkg", "gpkg")]:
+            entries.append(CatalogObject(
+                key=f"v0.2/buildings/{fmt}/nuts_id={nuts_id}/{nuts_id}.{ext}",
+                version="v0.2",
+                format=fmt,
+                nuts_id=nuts_id,
+                size=len(nuts_id),
+                etag=f"{etag}-{nuts_id}-{fmt}",
+                last_modified=datetime(2025, 1, 1, tzinfo=timezone.utc),
+                crc32=123,
+                num_rows=10 if fmt == "parquet" else None,
+                footer_stats={"extent": [0.0, 0.0, 1.0, 1.0]} if fmt == "parquet" else None,
+            ))
+    return entries
+
+
+def manifest_bytes(entries):
+    sink = io.BytesIO()
+    pq.write_table(manifest_table(entries), sink)
+    return sink.getvalue()
+
+
+def test_manifest_roundtrip_and_lookups():
+    entries = make_entries()
+    index = ManifestIndex.load("v0.2", "m1", manifest_bytes(entries))
+
+    loaded = index.version_objects()
+    assert [entry.key for entry in loaded] == [entry.key for entry in sorted(entries, key=lambda e: (e.nuts_id, e.key))]
+    parquet = index.partition_objects("DE12", ["parquet"])[0]
+    assert (parquet.size, parquet.crc32, parquet.num_rows) == (4, 123, 10)
+    assert parquet.footer_stats == {"extent": [0.0, 0.0, 1.0, 1.0]}
+    assert parquet.last_modified == datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    assert [entry.nuts_id for entry in index.prefix_objects("DE1", "gpkg")] == ["DE11", "DE12"]
+    assert [entry.nuts_id for entry in index.prefix_objects("", "parquet")] == ["DE11", "DE12", "DE21", "FR10"]
+    assert index.partition_objects("DE1") == []
+    assert len(index.version_objects(["gpkg"])) == 4
+    assert list(index.objects_by_key([parquet.key, "missing"])) == [parquet.key]
+    assert index.fingerprint(index.version_objects(["parquet"])) == catalog.listing_fingerprint(
+        (entry.key, entry.etag, entry.num_rows) for entry in entries if entry.format == "parquet"
+    )
+
+
+class FakeManifestClient:
+    def __init__(self):
+        self.objects = {}
+        self.downloads = 0
+
+    def stat_object(self, bucket, key):
+        return SimpleNamespace(etag=f'"{self.objects[key][0]}"')
+
+    def get_object(self, bucket, key):
+        self.downloads += 1
+        etag, data = self.objects[key]
+
+        class Response:
+            headers = {"ETag": f'"{etag}"'}
+
+            def read(self):
+                return data
+
+            def close(self):
+                pass
+
+            def release_conn(self):
+                pass
+
+        return Response()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_manifest_store_swaps_in_newer_manifests():
+    CatalogObject.objects.bulk_create(make_entries())
+    client = FakeManifestClient()
+    client.objects[manifest_key("v0.2")] = ("m1", manifest_bytes(make_entries("a")))
+    store = ManifestStore(client, MinioSettings(), check_interval=0)
+
+    async def lookup():
+        index = await store.get("v0.2")
+        return index.etag, index.partition_objects("DE11", ["parquet"])[0].etag
+
+    assert asyncio.run(lookup()) == ("m1", "a-DE11-parquet")
+    assert asyncio.run(lookup()) == ("m1", "a-DE11-parquet")
+    assert client.downloads == 1
+
+    client.objects[manifest_key("v0.2")] = ("m2", manifest_bytes(make_entries("b")))
+    assert asyncio.run(lookup()) == ("m2", "b-DE11-parquet")
+    assert client.downloads == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_versions_without_manifest_fall_back():
+    from minio.error import S3Error
+
+    CatalogObject.objects.bulk_create(make_entries())
+
+    class MissingClient:
+        def stat_object(self, bucket, key):
+            raise S3Error("NoSuchKey", "missing", key, "", "", None)
+
+    store = ManifestStore(MissingClient(), MinioSettings(), check_interval=60)
+
+    assert asyncio.run(store.get("v0.2")) is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_unknown_versions_are_not_checked_or_tracked():
+    class NoClient:
+        def stat_object(self, bucket, key):
+            raise AssertionError("unknown versions must not reach MinIO")
+
+    store = ManifestStore(NoClient(), MinioSettings(), check_interval=60)
+
+    assert [asyncio.run(store.get(f"v{i}")) for i in range(3)] == [None] * 3
+    assert store._checked == {} and store._indexes == {}
+
+
+def test_manifest_is_not_a_catalog_object():
+    assert "/buildings/" not in manifest_key("v0.2")
+    assert catalog.parse_key("v0.2/buildings/_manifest.parquet") is None
+    assert catalog.parse_key("v0.2/buildings/_index/nuts_id=DE11/DE11.idx")["format"] == "_index"
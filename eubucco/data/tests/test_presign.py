@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from minio import Minio
+
+from eubucco.data.minio_client import MinioSettings, _normalize_endpoint
+from eubucco.data.presign import get_presigner, presign_many
+
+SIGNED_AT = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+def reference_url(settings: MinioSettings, object_name: str, response_headers=None) -> str:
+    endpoint, secure = _normalize_endpoint(settings.public_endpoint, settings.public_secure)
+    client = Minio(
+        endpoint,
+        access_key=settings.access_key,
+        secret_key=settings.secret_key,
+        secure=secure,
+        region=settings.region,
+    )
+    return client.presigned_get_object(
+        settings.bucket,
+        object_name,
+        expires=timedelta(hours=1),
+        request_date=SIGNED_AT,
+        response_headers=response_headers,
+    )
+
+
+def assert_same_url(url: str, expected: str):
+    url, expected = urlparse(url), urlparse(expected)
+    assert (url.scheme, url.netloc, url.path) == (expected.scheme, expected.netloc, expected.path)
+    assert parse_qs(url.query) == parse_qs(expected.query)
+
+
+@pytest.mark.parametrize(
+    "endpoint, secure",
+    [("https://s3.eubucco.com", True), ("http://127.0.0.1:9000", False), ("s3.eubucco.com:443", True)],
+)
+@pytest.mark.parametrize(
+    "object_name",
+    ["v0.2/buildings/parquet/nuts_id=DE11/DE11.parquet", "v0.2/metadata/a file~+ü.json"],
+)
+def test_signature_matches_minio_client(endpoint, secure, object_name):
+    settings = MinioSettings(public_endpoint=endpoint, public_secure=secure, secret_key="s3/cr+et")
+
+    url = get_presigner(settings).presign(object_name, timedelta(hours=1), signed_at=SIGNED_AT)
+
+    assert_same_url(url, reference_url(settings, object_name))
+
+
+def test_signature_with_response_headers():
+    settings = MinioSettings(public_endpoint="https://s3.eubucco.com")
+    headers = {"response-content-disposition": 'attachment; filename="eubucco_v0.2_DE_parquet.zip"'}
+
+    url = get_presigner(settings).presign("v0.2/bundles/parquet/DE.zip", timedelta(hours=1), headers, SIGNED_AT)
+
+    assert_same_url(url, reference_url(settings, "v0.2/bundles/parquet/DE.zip", headers))
+
+
+def test_presign_many_is_stable_within_window():
+    settings = MinioSettings(public_endpoint="https://s3.eubucco.com")
+    names = [f"v0.2/buildings/parquet/nuts_id=FR{i}/FR{i}.parquet" for i in range(10)]
+
+    first = presign_many(settings, names)
+    second = presign_many(settings, reversed(names))
+
+    assert first == second
+    assert len(set(first.values())) == len(names)
@@ -0,0 +1,142 @@
+import io
+import json
+
+import pyarrow as pa
+import pytest
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+from eubucco.data.query import (
+    QueryError,
+    candidate_partitions,
+    footer_stats,
+    iter_arrow_stream,
+    iter_bbox_geoparquet,
+    output_schema,
+    parse_filters,
+    parse_predicate,
+    read_footer,
+    select_row_groups,
+)
+
+GEO = {"version": "1.1.0", "primary_column": "geometry", "columns": {"geometry": {"bbox": [0, 0, 1, 1]}}}
+
+
+def write_partition(root, nuts_id, x_offsets, rows_per_group=10):
+    """One partition with a row group of unit squares per x offset."""
+    ids, xs = [], []
+    for group, x0 in enumerate(x_offsets):
+        for i in range(rows_per_group):
+            ids.append(f"{nuts_id}-{group}-{i}")
+            xs.append(x0 + i * 10.0)
+    bbox = pa.array(
+        [{"xmin": x, "ymin": 0.0, "xmax": x + 1.0, "ymax": 1.0} for x in xs]
+    )
+    table = pa.table({"id": ids, "bbox": bbox}).replace_schema_metadata({"geo": json.dumps(GEO)})
+    key = f"v0.2/buildings/parquet/nuts_id={nuts_id}/{nuts_id}.parquet"
+    path = root / "eubucco" / key
+    path.parent.mkdir(parents=True)
+    pq.write_table(table, path, row_group_size=rows_per_group)
+    etag = f"{root.name}-{nuts_id}"
+    entry = CatalogObject(key=key, version="v0.2", format="parquet", nuts_id=nuts_id, size=0, etag=etag)
+    return entry
+
+
+def run_query(tmp_path, entries, bbox):
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    settings = MinioSettings(bucket="eubucco")
+    footers = [read_footer(filesystem, f"eubucco/{entry.key}", entry.etag) for entry in entries]
+    selections = select_row_groups(zip(entries, footers), bbox)
+    schema = output_schema([footer.schema for footer in footers])
+    data = b"".join(iter_bbox_geoparquet(filesystem, settings, selections, bbox, schema))
+    return selections, pq.read_table(io.BytesIO(data))
+
+
+def test_bbox_query_prunes_partitions_and_row_groups(tmp_path):
+    entries = [
+        write_partition(tmp_path, "AA11", [0, 1000, 2000]),
+        write_partition(tmp_path, "BB22", [5000, 6000]),
+    ]
+
+    selections, table = run_query(tmp_path, entries, (1005, 0, 1025, 1))
+
+    assert [(s.entry.nuts_id, s.row_groups) for s in selections] == [("AA11", [1])]
+    assert table.column("id").to_pylist() == ["AA11-1-1", "AA11-1-2"]
+    assert "bbox" not in json.loads(table.schema.metadata[b"geo"])["columns"]["geometry"]
+
+
+def test_catalogued_extents_drop_partitions_before_their_footers(tmp_path):
+    entries = [
+        write_partition(tmp_path, "AA11", [0, 1000, 2000]),
+        write_partition(tmp_path, "BB22", [5000, 6000]),
+        write_partition(tmp_path, "CC33", [9000]),
+    ]
+    for entry in entries[:2]:
+        entry.footer_stats = footer_stats(pq.ParquetFile(tmp_path / "eubucco" / entry.key))["footer_stats"]
+
+    # CC33 has no footer summary in the catalog yet, so only its footer can rule it out
+    assert [entry.nuts_id for entry in candidate_partitions(entries, (1005, 0, 1025, 1))] == ["AA11", "CC33"]
+    assert [entry.nuts_id for entry in candidate_partitions(entries, (5500, 0, 5600, 1))] == ["BB22", "CC33"]
+
+
+def test_bbox_query_without_matches_is_empty_geoparquet(tmp_path):
+    entries = [write_partition(tmp_path, "AA11", [0])]
+
+    selections, table = run_query(tmp_path, entries, (50000, 50000, 50001, 50001))
+
+    assert selections == []
+    assert table.num_rows == 0
+    assert b"geo" in table.schema.metadata
+
+
+def test_attribute_query_projects_and_filters(tmp_path):
+    table = pa.table({
+        "id": ["a", "b", "c", "d"],
+        "type": pa.array(["residential", "residential", "non-residential", "residential"]).dictionary_encode(),
+        "height": [5.0, 12.0, 20.0, None],
+        "height_confidence_lower": [4.0, 11.5, 10.0, None],
+        "height_confidence_upper": [5.5, 12.5, 30.0, None],
+    })
+    key = "v0.2/buildings/parquet/nuts_id=AA11/AA11.parquet"
+    path = tmp_path / "eubucco" / key
+    path.parent.mkdir(parents=True)
+    pq.write_table(table, path)
+    entry = CatalogObject(key=key, version="v0.2", format="parquet", nuts_id="AA11", size=0, etag="x")
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+
+    row_filter = parse_filters(
+        ["height_confidence_upper - height_confidence_lower < 2", "type == residential"], table.schema
+    )
+    data = b"".join(iter_arrow_stream(
+        filesystem, MinioSettings(bucket="eubucco"), [entry], table.schema, ["id", "height"], row_filter
+    ))
+
+    result = pa.ipc.open_stream(data).read_all()
+    assert result.column_names == ["id", "height"]
+    assert result.column("id").to_pylist() == ["a", "b"]
+
+
+@pytest.mark.parametrize("text", ["nope > 1", "height >", "height > tall", "id - height < 2"])
+def test_invalid_filters_are_rejected(text):
+    schema = pa.schema([("id", pa.string()), ("height", pa.float64())])
+
+    with pytest.raises(QueryError):
+        parse_predicate(text, schema)
+
+
+def test_footer_stats_summarise_the_partition(tmp_path):
+    entry = write_partition(tmp_path, "AA11", [0, 1000, 2000])
+
+    stats = footer_stats(pq.ParquetFile(tmp_path / "eubucco" / entry.key))
+
+    assert stats["num_rows"] == 30
+    assert stats["num_row_groups"] == 3
+    assert stats["uncompressed_size"] > 0
+    summary = stats["footer_stats"]
+    assert summary["extent"] == [0.0, 0.0, 2091.0, 1.0]
+    assert [field["name"] for field in summary["schema"]] == ["id", "bbox"]
+    assert summary["columns"]["id"] == {"null_count": 0, "min": "AA11-0-0", "max": "AA11-2-9"}
+    assert summary["columns"]["bbox.xmax"]["max"] == 2091.0
+    json.dumps(stats)
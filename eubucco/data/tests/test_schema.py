@@ -0,0 +1,49 @@
+import json
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from eubucco.data.management.commands.benchmark_normalise import pandas_normalise
+from eubucco.data.schema import BatchNormaliser, list_to_json
+from eubucco.data.tests.test_converters import write_partition
+
+
+def plain(gdf):
+    df = pd.DataFrame(gdf).astype(object)
+    return df.where(df.notna(), None)
+
+
+def test_list_to_json_matches_json_dumps():
+    cases = [
+        [["osm_1", "msft_2"], None, [], ["gov-france_3"]],
+        [["osm_1", "msft_2"], None, [], ["with \"quote\"", "back\\slash", None]],
+        [["Indifférencié"], ["tab\there"], None],
+        [[1, 2], None, [], [None, 3]],
+    ]
+    for values in cases:
+        array = pa.array(values)
+        expected = [json.dumps(list(x)) if x is not None else None for x in values]
+        assert list_to_json(array).to_pylist() == expected
+        assert list_to_json(array.slice(1)).to_pylist() == expected[1:]
+
+
+def test_arrow_normalisation_matches_pandas(tmp_path):
+    source = tmp_path / "AA11.parquet"
+    gdf = write_partition(source)
+    gdf["construction_year"] = gdf["construction_year"].astype(float)
+    gdf["subtype"] = [None if i < 12 else "detached" for i in range(len(gdf))]
+    gdf.to_parquet(source)
+
+    normaliser = BatchNormaliser(pq.read_schema(source))
+    arrow = normaliser(pq.read_table(source))
+    pandas = pandas_normalise(pq.read_table(source))
+
+    assert arrow["construction_year"].dtype == pandas["construction_year"].dtype == "Int64"
+    assert arrow["height"].dtype == pandas["height"].dtype == "float64"
+    pd.testing.assert_frame_equal(plain(arrow), plain(pandas))
+    # Missing categoricals keep the "nan" of the original converters, plain strings stay null
+    assert arrow.loc[0, "type"] == pandas.loc[0, "type"] == "nan"
+    assert arrow.loc[12, "type"] == "residential"
+    assert pd.isna(arrow.loc[0, "subtype"]) and pd.isna(pandas.loc[0, "subtype"])
+    assert arrow.crs.to_epsg() == 3035
@@ -0,0 +1,94 @@
+import json
+import random
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+from eubucco.data.query import build_partition_index, matching_row_groups, read_partition_footer
+from eubucco.data.spatial_index import PackedHilbertIndex, PartitionIndex, index_key
+
+GEO = {"version": "1.1.0", "primary_column": "geometry", "columns": {"geometry": {}}}
+
+
+def brute_force(boxes, bbox):
+    return [
+        i for i, box in enumerate(boxes)
+        if box is None or (box[0] <= bbox[2] and box[2] >= bbox[0] and box[1] <= bbox[3] and box[3] >= bbox[1])
+    ]
+
+
+def test_packed_hilbert_index_matches_brute_force():
+    rng = random.Random(7)
+    boxes = []
+    for _ in range(500):
+        x, y = rng.uniform(0, 1e5), rng.uniform(0, 1e5)
+        boxes.append((x, y, x + rng.uniform(0, 500), y + rng.uniform(0, 500)))
+    boxes[3] = None
+
+    index = PartitionIndex(pa.schema([("id", pa.string())]), PackedHilbertIndex.build(boxes), 42)
+    restored = PartitionIndex.from_bytes(index.to_bytes())
+
+    assert restored.source_crc32 == 42
+    assert restored.schema.names == ["id"]
+    assert restored.tree.item_boxes() == boxes
+    for _ in range(50):
+        x, y = rng.uniform(0, 1e5), rng.uniform(0, 1e5)
+        bbox = (x, y, x + 2000, y + 2000)
+        assert restored.tree.search(bbox) == brute_force(boxes, bbox)
+
+
+def test_index_key_is_a_sibling_of_the_format_folder():
+    key = index_key("v0.2/buildings/parquet/nuts_id=DE11/DE11.parquet")
+    assert key == "v0.2/buildings/_index/nuts_id=DE11/DE11.idx"
+
+
+def write_partition(root, nuts_id, crc32):
+    xs = [group * 1000.0 + i for group in range(4) for i in range(10)]
+    bbox = pa.array([{"xmin": x, "ymin": 0.0, "xmax": x + 1.0, "ymax": 1.0} for x in xs])
+    table = pa.table({"id": [str(x) for x in xs], "bbox": bbox})
+    table = table.replace_schema_metadata({"geo": json.dumps(GEO)})
+    key = f"v0.2/buildings/parquet/nuts_id={nuts_id}/{nuts_id}.parquet"
+    path = root / "eubucco" / key
+    path.parent.mkdir(parents=True)
+    pq.write_table(table, path, row_group_size=10)
+
+    sidecar_path = root / "eubucco" / index_key(key)
+    sidecar_path.parent.mkdir(parents=True)
+    sidecar_path.write_bytes(build_partition_index(path, 1234))
+
+    entry = CatalogObject(
+        key=key, version="v0.2", format="parquet", nuts_id=nuts_id, size=0,
+        etag=f"{root.name}-{nuts_id}", crc32=crc32,
+    )
+    sidecar = CatalogObject(
+        key=index_key(key), version="v0.2", format="_index", nuts_id=nuts_id, size=0,
+        etag=f"{root.name}-{nuts_id}-idx",
+    )
+    return entry, sidecar
+
+
+def test_footer_comes_from_a_current_sidecar(tmp_path):
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    settings = MinioSettings(bucket="eubucco")
+    entry, sidecar = write_partition(tmp_path, "AA11", crc32=1234)
+
+    footer = read_partition_footer(filesystem, settings, entry, sidecar)
+
+    assert footer.index is not None
+    assert footer.schema.names == ["id", "bbox"]
+    assert len(footer.row_group_bboxes) == 4
+    assert matching_row_groups(footer, (1000, 0, 2005, 1)) == [1, 2]
+
+
+def test_stale_sidecar_falls_back_to_the_parquet_footer(tmp_path):
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    settings = MinioSettings(bucket="eubucco")
+    entry, sidecar = write_partition(tmp_path, "BB22", crc32=999)
+
+    footer = read_partition_footer(filesystem, settings, entry, sidecar)
+
+    assert footer.index is None
+    assert matching_row_groups(footer, (1000, 0, 2005, 1)) == [1, 2]
@@ -0,0 +1,38 @@
+import json
+import random
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from eubucco.data.spatial_sort import benchmark_bboxes, scan_cost_report, sort_partition
+
+GEO = {"version": "1.1.0", "primary_column": "geometry", "columns": {"geometry": {}}}
+
+
+def write_shuffled_partition(path, side=40):
+    """A grid of unit squares in random order, in row groups of 100."""
+    cells = [(x * 500.0, y * 500.0) for x in range(side) for y in range(side)]
+    random.Random(3).shuffle(cells)
+    bbox = pa.array([{"xmin": x, "ymin": y, "xmax": x + 1.0, "ymax": y + 1.0} for x, y in cells])
+    table = pa.table({"id": [f"{x}-{y}" for x, y in cells], "bbox": bbox})
+    pq.write_table(table.replace_schema_metadata({"geo": json.dumps(GEO)}), path, row_group_size=100)
+    return table
+
+
+def test_hilbert_sort_keeps_rows_and_cuts_scan_cost(tmp_path):
+    source, output = tmp_path / "AA11.parquet", tmp_path / "sorted.parquet"
+    original = write_shuffled_partition(source)
+
+    rows = sort_partition(source, output, target_bytes=original.nbytes // 16)
+    rewritten = pq.read_table(output)
+
+    assert 50 <= rows <= 150
+    assert pq.ParquetFile(output).metadata.num_row_groups == -(-original.num_rows // rows)
+    assert sorted(rewritten.column("id").to_pylist()) == sorted(original.column("id").to_pylist())
+    assert json.loads(rewritten.schema.metadata[b"geo"]) == GEO
+
+    report = scan_cost_report(source, output, benchmark_bboxes(source))
+    before, after = report["before"], report["after"]
+    assert before["queries"] == after["queries"] == 20
+    assert after["row_groups"] < before["row_groups"] / 2
+    assert after["rows"] < before["rows"] / 2
@@ -0,0 +1,175 @@
+import asyncio
+import gzip
+
+import mapbox_vector_tile
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from pmtiles.reader import MmapSource, Reader
+from pmtiles.tile import TileType
+from pyarrow import fs
+
+from eubucco.data.minio_client import MinioSettings
+from eubucco.data.models import CatalogObject
+from eubucco.data.query import read_footer, select_row_groups
+from eubucco.data.tiles import TILE_EXTENT, TileCache, build_pmtiles, render_tile, tile_bbox
+
+# Tile around Berlin Mitte at zoom 15
+Z, X, Y = 15, 17602, 10745
+
+
+def write_buildings(root, centres, nuts_id="DE30"):
+    squares = [shapely.box(x - 5, y - 5, x + 5, y + 5) for x, y in centres]
+    bounds = shapely.bounds(squares)
+    table = pa.table({
+        "id": [f"b{i}" for i in range(len(squares))],
+        "height": [10.0] * (len(squares) - 1) + [float("nan")],
+        "bbox": pa.array([dict(zip(["xmin", "ymin", "xmax", "ymax"], b)) for b in bounds.tolist()]),
+        "geometry": shapely.to_wkb(squares),
+    })
+    key = f"v0.2/buildings/parquet/nuts_id={nuts_id}/{nuts_id}.parquet"
+    path = root / "eubucco" / key
+    path.parent.mkdir(parents=True)
+    pq.write_table(table, path, row_group_size=2)
+    return CatalogObject(key=key, version="v0.2", format="parquet", nuts_id=nuts_id, size=0, etag=root.name)
+
+
+def test_render_tile_encodes_buildings_inside_the_tile(tmp_path):
+    xmin, ymin, xmax, ymax = tile_bbox(Z, X, Y)
+    centre = ((xmin + xmax) / 2, (ymin + ymax) / 2)
+    far_away = (centre[0] + 50000, centre[1])
+    entry = write_buildings(tmp_path, [centre, (centre[0] + 100, centre[1]), far_away, far_away, centre])
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    footer = read_footer(filesystem, f"eubucco/{entry.key}", entry.etag)
+    selections = select_row_groups([(entry, footer)], tile_bbox(Z, X, Y))
+
+    tile = render_tile(filesystem, MinioSettings(bucket="eubucco"), selections, Z, X, Y)
+
+    assert [s.row_groups for s in selections] == [[0, 2]]
+    features = mapbox_vector_tile.decode(tile)["buildings"]["features"]
+    assert [f["properties"] for f in features] == [
+        {"id": "b0", "height": 10.0},
+        {"id": "b1", "height": 10.0},
+        {"id": "b4"},
+    ]
+    x, y = features[0]["geometry"]["coordinates"][0][0]
+    assert 0 < x < TILE_EXTENT and 0 < y < TILE_EXTENT
+
+
+def test_render_tile_without_buildings_is_empty(tmp_path):
+    entry = write_buildings(tmp_path, [(4000000, 3000000)])
+    filesystem = fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem())
+    footer = read_footer(filesystem, f"eubucco/{entry.key}", entry.etag)
+
+    assert render_tile(filesystem, MinioSettings(bucket="eubucco"), [], Z, X, Y) == b""
+    assert select_row_groups([(entry, footer)], tile_bbox(Z, X, Y)) == []
+
+
+def test_tile_cache_evicts_least_recently_used():
+    cache = TileCache(max_bytes=3 * 1256)
+    for key in "abc":
+        cache.put(key, b"x" * 1000)
+    cache.get("a")
+    cache.put("d", b"x" * 1000)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+
+
+def test_build_pmtiles_archive(tmp_path):
+    xmin, ymin, xmax, ymax = tile_bbox(Z, X, Y)
+    entry = write_buildings(tmp_path, [((xmin + xmax) / 2, (ymin + ymax) / 2)] * 2)
+    output_path = tmp_path / "DE.pmtiles"
+
+    count = build_pmtiles([tmp_path / "eubucco" / entry.key], output_path, Z - 1, Z + 1, "test")
+
+    with open(output_path, "rb") as fh:
+        reader = Reader(MmapSource(fh))
+        assert reader.header()["tile_type"] == TileType.MVT
+        assert reader.metadata()["name"] == "test"
+        tile = gzip.decompress(reader.get(Z, X, Y))
+    # One tile at Z - 1 and Z, four at Z + 1 as the buildings sit on their shared corner
+    assert count == 6
+    assert len(mapbox_vector_tile.decode(tile)["buildings"]["features"]) == 2
+
+
+def test_build_pmtiles_reads_each_partition_once_and_joins_shared_tiles(tmp_path, monkeypatch):
+    xmin, ymin, xmax, ymax = tile_bbox(Z, X, Y)
+    centre = ((xmin + xmax) / 2, (ymin + ymax) / 2)
+    far_away = (centre[0] + 50000, centre[1])
+    paths = [
+        tmp_path / "eubucco" / write_buildings(tmp_path, [centre] * 2, "DE30").key,
+        tmp_path / "eubucco" / write_buildings(tmp_path, [centre, far_away, far_away], "DE40").key,
+    ]
+    reads = []
+    read_table = pq.read_table
+
+    def counting_read_table(path, columns):
+        reads.append(columns)
+        return read_table(path, columns=columns)
+
+    monkeypatch.setattr(pq, "read_table", counting_read_table)
+
+    build_pmtiles(paths, tmp_path / "DE.pmtiles", Z, Z, "test")
+
+    assert [len(columns) for columns in reads] == [1, 1, 4, 4]
+    with open(tmp_path / "DE.pmtiles", "rb") as fh:
+        reader = Reader(MmapSource(fh))
+        tile = gzip.decompress(reader.get(Z, X, Y))
+    # Two buildings of DE30 and one of DE40 in the one tile they share
+    assert len(mapbox_vector_tile.decode(tile)["buildings"]["features"]) == 3
+
+
+def tile_api(monkeypatch, entries, footer_reads):
+    from eubucco.api.v1 import tiles as tiles_api
+
+    async def version_fingerprint(version, formats):
+        return "f1"
+
+    async def version_objects(version, formats):
+        return entries
+
+    async def read_footers(filesystem, settings, entries):
+        footer_reads.append([entry.nuts_id for entry in entries])
+        return []
+
+    monkeypatch.setattr(tiles_api.resolver, "version_fingerprint", version_fingerprint)
+    monkeypatch.setattr(tiles_api.resolver, "version_objects", version_objects)
+    monkeypatch.setattr(tiles_api.query, "read_footers", read_footers)
+    monkeypatch.setattr(tiles_api.query, "get_filesystem", lambda settings: None)
+    monkeypatch.setattr(tiles_api, "settings_from_django", lambda: MinioSettings(bucket="eubucco"))
+    monkeypatch.setattr(tiles_api.tiles, "render_tile", lambda *args: b"tile")
+    return tiles_api
+
+
+def test_cached_tile_skips_the_footers(monkeypatch):
+    footer_reads = []
+    entry = CatalogObject(key="k", version="v-cached", format="parquet", nuts_id="DE30", size=0, etag="e")
+    tiles_api = tile_api(monkeypatch, [entry], footer_reads)
+
+    first = asyncio.run(tiles_api.get_tile("v-cached", Z, X, Y))
+    second = asyncio.run(tiles_api.get_tile("v-cached", Z, X, Y))
+
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert second.body == b"tile"
+    assert footer_reads == [["DE30"]]
+
+
+def test_tile_miss_reads_only_the_footers_of_intersecting_partitions(monkeypatch):
+    xmin, ymin, xmax, ymax = tile_bbox(Z, X, Y)
+
+    def entry(nuts_id, dx):
+        extent = [xmin + dx, ymin, xmax + dx, ymax]
+        return CatalogObject(
+            key=nuts_id, version="v-pruned", format="parquet", nuts_id=nuts_id, size=0, etag=nuts_id,
+            footer_stats={"extent": extent},
+        )
+
+    footer_reads = []
+    tiles_api = tile_api(monkeypatch, [entry("DE30", 0), entry("DE40", 50000)], footer_reads)
+    assert asyncio.run(tiles_api.get_tile("v-pruned", Z, X, Y)).body == b"tile"
+    assert footer_reads == [["DE30"]]
+
+    tiles_api = tile_api(monkeypatch, [entry("DE40", 50000)], footer_reads)
+    assert asyncio.run(tiles_api.get_tile("v-empty", Z, X, Y)).status_code == 204
+    assert footer_reads == [["DE30"]]
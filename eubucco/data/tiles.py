@@ -0,0 +1,341 @@
+"""
+Mapbox vector tiles rendered straight from the Parquet partitions.
+
+A tile's bounds are projected into the dataset CRS and matched against the
+partition and row group `bbox` statistics like a bbox query. The footprints of
+the matching rows are projected, clipped and simplified with vectorized
+shapely operations before being encoded, and rendered tiles are kept in a
+bounded in-process LRU so hot tiles are served from memory.
+
+The same encoder also bakes whole countries into PMTiles archives at ingest
+time, which are then served as static range reads straight from MinIO.
+"""
+import gzip
+import math
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import mapbox_vector_tile
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from django.conf import settings as django_settings
+from pmtiles.tile import Compression, TileType, zxy_to_tileid
+from pmtiles.writer import Writer
+from pyarrow import fs
+
+from .minio_client import MinioSettings
+from .query import (
+    BBOX_COLUMN,
+    BBox,
+    DATASET_CRS,
+    PartitionFooter,
+    PartitionSelection,
+    bbox_filter,
+    object_path,
+    parse_footer,
+)
+
+WEB_MERCATOR_CRS = 3857
+WEB_MERCATOR_HALF_SIZE = 20037508.342789244
+TILE_EXTENT = 4096
+# Tile units rendered beyond the edges so polygons are not cut at tile seams
+TILE_BUFFER = 64
+# Footprints smaller than this many tile units² are dropped
+MIN_AREA = 1.0
+LAYER_NAME = "buildings"
+GEOMETRY_COLUMN = "geometry"
+TILE_ATTRIBUTES = ("id", "height", "construction_year", "type")
+# Bytes charged per cached tile on top of its data, so empty tiles count too
+CACHE_ENTRY_OVERHEAD = 256
+
+
+def tile_bounds(z: int, x: int, y: int) -> BBox:
+    """Web Mercator bounds of an XYZ tile."""
+    size = 2 * WEB_MERCATOR_HALF_SIZE / 2 ** z
+    xmin = -WEB_MERCATOR_HALF_SIZE + x * size
+    ymax = WEB_MERCATOR_HALF_SIZE - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+@lru_cache(maxsize=2)
+def _transformer(source: int, target: int):
+    from pyproj import Transformer
+
+    return Transformer.from_crs(f"EPSG:{source}", f"EPSG:{target}", always_xy=True)
+
+
+def tile_bbox(z: int, x: int, y: int) -> BBox:
+    """Bounds of a tile, including its buffer, in the dataset CRS."""
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    margin = (xmax - xmin) * TILE_BUFFER / TILE_EXTENT
+    return _transformer(WEB_MERCATOR_CRS, DATASET_CRS).transform_bounds(
+        xmin - margin, ymin - margin, xmax + margin, ymax + margin
+    )
+
+
+def read_rows(
+    filesystem: fs.FileSystem, parts: Iterable[Tuple[str, PartitionFooter, List[int]]], bbox: BBox
+) -> Optional[pa.Table]:
+    """Tile columns of the rows intersecting `bbox` from `(path, footer, row_groups)` parts."""
+    row_filter = bbox_filter(bbox)
+    tables = []
+    for path, footer, row_groups in parts:
+        names = footer.schema.names
+        columns = [GEOMETRY_COLUMN, BBOX_COLUMN, *(name for name in TILE_ATTRIBUTES if name in names)]
+        with filesystem.open_input_file(path) as source:
+            table = pq.ParquetFile(source).read_row_groups(row_groups, columns=columns)
+        table = table.filter(row_filter)
+        if table.num_rows:
+            tables.append(table)
+    if not tables:
+        return None
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def _to_tile_space(geometries: np.ndarray, z: int, x: int, y: int) -> np.ndarray:
+    xmin, _, xmax, ymax = tile_bounds(z, x, y)
+    scale = TILE_EXTENT / (xmax - xmin)
+    transformer = _transformer(DATASET_CRS, WEB_MERCATOR_CRS)
+
+    def project(coords: np.ndarray) -> np.ndarray:
+        mx, my = transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([(mx - xmin) * scale, (ymax - my) * scale])
+
+    return shapely.transform(geometries, project)
+
+
+def _properties(table: pa.Table) -> List[dict]:
+    columns = {
+        name: table.column(name).to_pylist() for name in TILE_ATTRIBUTES if name in table.column_names
+    }
+    properties = []
+    for row in range(table.num_rows):
+        values = {}
+        for name, column in columns.items():
+            value = column[row]
+            if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                values[name] = value
+        properties.append(values)
+    return properties
+
+
+def encode_tile(table: Optional[pa.Table], z: int, x: int, y: int) -> bytes:
+    """Encode the rows of `table` as the MVT tile z/x/y; empty bytes when nothing is visible."""
+    if table is None or table.num_rows == 0:
+        return b""
+
+    geometries = shapely.from_wkb(table.column(GEOMETRY_COLUMN).to_numpy(zero_copy_only=False))
+    geometries = _to_tile_space(geometries, z, x, y)
+    geometries = shapely.clip_by_rect(
+        geometries, -TILE_BUFFER, -TILE_BUFFER, TILE_EXTENT + TILE_BUFFER, TILE_EXTENT + TILE_BUFFER
+    )
+    geometries = shapely.simplify(geometries, tolerance=0.5, preserve_topology=True)
+    keep = ~shapely.is_empty(geometries) & (shapely.area(geometries) >= MIN_AREA)
+    if not keep.any():
+        return b""
+
+    rows = np.flatnonzero(keep)
+    properties = _properties(table.take(pa.array(rows)))
+    features = [
+        {"geometry": geometry, "properties": values}
+        for geometry, values in zip(geometries[rows], properties)
+    ]
+    return mapbox_vector_tile.encode(
+        [{"name": LAYER_NAME, "features": features}],
+        default_options={"extents": TILE_EXTENT, "y_coord_down": True},
+    )
+
+
+def render_tile(
+    filesystem: fs.FileSystem,
+    settings: MinioSettings,
+    selections: List[PartitionSelection],
+    z: int,
+    x: int,
+    y: int,
+) -> bytes:
+    """Encode the buildings of a tile as MVT; empty bytes when there are none."""
+    parts = [
+        (object_path(settings, selection.entry.key), selection.footer, selection.row_groups)
+        for selection in selections
+    ]
+    return encode_tile(read_rows(filesystem, parts, tile_bbox(z, x, y)), z, x, y)
+
+
+def _archive_header(extent: BBox, min_zoom: int) -> dict:
+    lon_min, lat_min, lon_max, lat_max = _transformer(DATASET_CRS, 4326).transform_bounds(*extent)
+    return {
+        "tile_type": TileType.MVT,
+        "tile_compression": Compression.GZIP,
+        "min_lon_e7": int(lon_min * 1e7),
+        "min_lat_e7": int(lat_min * 1e7),
+        "max_lon_e7": int(lon_max * 1e7),
+        "max_lat_e7": int(lat_max * 1e7),
+        "center_zoom": min_zoom,
+        "center_lon_e7": int((lon_min + lon_max) / 2 * 1e7),
+        "center_lat_e7": int((lat_min + lat_max) / 2 * 1e7),
+    }
+
+
+def _row_tiles(bboxes: pa.ChunkedArray, z: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    `(rows, tiles)` pairs of the rows whose `bbox` reaches a zoom `z` tile
+    including its buffer; tiles are numbered `x * 2 ** z + y`.
+    """
+    bboxes = bboxes.combine_chunks()
+    valid = np.flatnonzero(bboxes.is_valid().to_numpy(zero_copy_only=False))
+    xmin, ymin, xmax, ymax = (
+        bboxes.field(name).to_numpy(zero_copy_only=False)[valid] for name in ("xmin", "ymin", "xmax", "ymax")
+    )
+    # Buildings are small, so the corners of their bbox bound them in Web Mercator too
+    mx, my = _transformer(DATASET_CRS, WEB_MERCATOR_CRS).transform(
+        np.concatenate([xmin, xmin, xmax, xmax]), np.concatenate([ymin, ymax, ymin, ymax])
+    )
+    mx, my = mx.reshape(4, -1), my.reshape(4, -1)
+    size = 2 * WEB_MERCATOR_HALF_SIZE / 2 ** z
+    margin = size * TILE_BUFFER / TILE_EXTENT
+
+    def index(values: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor(values / size), 0, 2 ** z - 1).astype(np.int64)
+
+    x0 = index(mx.min(axis=0) - margin + WEB_MERCATOR_HALF_SIZE)
+    x1 = index(mx.max(axis=0) + margin + WEB_MERCATOR_HALF_SIZE)
+    y0 = index(WEB_MERCATOR_HALF_SIZE - my.max(axis=0) - margin)
+    y1 = index(WEB_MERCATOR_HALF_SIZE - my.min(axis=0) + margin)
+    rows, tiles = [], []
+    for dx in range(int((x1 - x0).max(initial=-1)) + 1):
+        for dy in range(int((y1 - y0).max(initial=-1)) + 1):
+            reach = (x0 + dx <= x1) & (y0 + dy <= y1)
+            rows.append(valid[reach])
+            tiles.append((x0[reach] + dx) * 2 ** z + y0[reach] + dy)
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return np.concatenate(rows), np.concatenate(tiles)
+
+
+def _write_pyramid(writer: Writer, table: pa.Table, min_zoom: int, max_zoom: int, x0: int, y0: int) -> int:
+    """Write the tiles from `min_zoom` tile x0/y0 down to `max_zoom` cut from its rows; returns how many."""
+    count = 0
+    for z in range(min_zoom, max_zoom + 1):
+        scale = 2 ** (z - min_zoom)
+        for x in range(x0 * scale, (x0 + 1) * scale):
+            for y in range(y0 * scale, (y0 + 1) * scale):
+                tile = encode_tile(table.filter(bbox_filter(tile_bbox(z, x, y))), z, x, y)
+                if tile:
+                    writer.write_tile(zxy_to_tileid(z, x, y), gzip.compress(tile, mtime=0))
+                    count += 1
+    return count
+
+
+def build_pmtiles(
+    parquet_paths: Sequence[Path], output_path: Path, min_zoom: int, max_zoom: int, name: str
+) -> int:
+    """
+    Render the buildings of local Parquet partitions into a PMTiles archive.
+
+    Every partition is read once and its rows are bucketed by `min_zoom` tile,
+    whatever the order of its rows; all tiles of a bucket down to `max_zoom`
+    are cut from it. Tiles on the border of several partitions are held until
+    the last of them was read, which a first pass over the `bbox` column
+    alone tells. Returns the number of tiles written; no archive is written
+    when there are none.
+    """
+    footers = [parse_footer(pq.ParquetFile(path)) for path in parquet_paths]
+    extents = [footer.extent for footer in footers if footer.extent is not None]
+    if not extents:
+        return 0
+    xmins, ymins, xmaxs, ymaxs = zip(*extents)
+    extent = min(xmins), min(ymins), max(xmaxs), max(ymaxs)
+
+    owners = Counter()
+    for path in parquet_paths:
+        _, tiles = _row_tiles(pq.read_table(path, columns=[BBOX_COLUMN]).column(BBOX_COLUMN), min_zoom)
+        owners.update(np.unique(tiles).tolist())
+
+    count = 0
+    pending: Dict[int, List[pa.Table]] = {}
+    with open(output_path, "wb") as fh:
+        writer = Writer(fh)
+        for path, footer in zip(parquet_paths, footers):
+            names = footer.schema.names
+            columns = [GEOMETRY_COLUMN, BBOX_COLUMN, *(name for name in TILE_ATTRIBUTES if name in names)]
+            table = pq.read_table(path, columns=columns)
+            rows, tiles = _row_tiles(table.column(BBOX_COLUMN), min_zoom)
+            order = np.argsort(tiles, kind="stable")
+            rows, tiles = rows[order], tiles[order]
+            bounds = np.flatnonzero(np.diff(tiles)) + 1
+            for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(tiles)]):
+                tile = int(tiles[start])
+                parts = pending.setdefault(tile, [])
+                parts.append(table.take(pa.array(rows[start:end])))
+                if len(parts) < owners[tile]:
+                    continue
+                del pending[tile]
+                rows_of_tile = pa.concat_tables(parts, promote_options="default")
+                count += _write_pyramid(writer, rows_of_tile, min_zoom, max_zoom, *divmod(tile, 2 ** min_zoom))
+        if count:
+            writer.finalize(
+                _archive_header(extent, min_zoom),
+                {
+                    "name": name,
+                    "vector_layers": [{
+                        "id": LAYER_NAME,
+                        "fields": {attribute: "" for attribute in TILE_ATTRIBUTES},
+                        "minzoom": min_zoom,
+                        "maxzoom": max_zoom,
+                    }],
+                },
+            )
+    return count
+
+
+class TileCache:
+    """Thread-safe LRU of encoded tiles, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._tiles: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    @staticmethod
+    def _cost(tile: bytes) -> int:
+        return len(tile) + CACHE_ENTRY_OVERHEAD
+
+    def put(self, key: Hashable, tile: bytes) -> None:
+        if self._cost(tile) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self._size -= self._cost(previous)
+            self._tiles[key] = tile
+            self._size += self._cost(tile)
+            while self._size > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self._size -= self._cost(evicted)
+
+
+_tile_cache: Optional[TileCache] = None
+_tile_cache_lock = threading.Lock()
+
+
+def get_tile_cache() -> TileCache:
+    global _tile_cache
+    if _tile_cache is None:
+        with _tile_cache_lock:
+            if _tile_cache is None:
+                _tile_cache = TileCache(django_settings.DATALAKE_TILE_CACHE_BYTES)
+    return _tile_cache
@@ -61,7 +61,23 @@ const getNutsName = (nutsId) => {
 
 /* ---------- NUTS partitions + v0.1 files ---------- */
 
-const loadNutsOrFiles = async () => {
+// Read an application/x-ndjson response line by line as it arrives
+const readNdjson = async (resp, onItem) => {
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.filter(line => line.trim()).forEach(line => onItem(JSON.parse(line)));
+  }
+  if (buffer.trim()) onItem(JSON.parse(buffer));
+};
+
+const loadNutsOrFiles = async (onProgress = () => {}) => {
   const baseApi = getApiBase();
   try {
     if (currentVersion === "v0.1") {
@@ -76,13 +92,17 @@ const loadNutsOrFiles = async () => {
       return;
     }
 
-    const resp = await fetch(`${baseApi}datalake/nuts/${currentVersion}`);
+    const resp = await fetch(`${baseApi}datalake/nuts/${currentVersion}`, {
+      headers: { Accept: "application/x-ndjson" }
+    });
+    nutsPartitions = [];
     if (!resp.ok) {
       console.error("Failed to load nuts partitions", resp.status, resp.statusText);
-      nutsPartitions = [];
     } else {
-      nutsPartitions = await resp.json();
-      if (!Array.isArray(nutsPartitions)) nutsPartitions = [];
+      await readNdjson(resp, part => {
+        nutsPartitions.push(part);
+        onProgress();
+      });
     }
   } catch (e) {
     console.error("Failed to load data", e);
@@ -573,14 +593,26 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   initMap();
   await loadNutsNames();
-  await loadNutsOrFiles();
+
+  // Re-render at most once per frame while partitions are streaming in
+  let renderPending = false;
+  const scheduleRender = () => {
+    if (renderPending) return;
+    renderPending = true;
+    requestAnimationFrame(() => {
+      renderPending = false;
+      renderNutsResults();
+    });
+  };
+  const loading = loadNutsOrFiles(scheduleRender);
 
   // Preselect France on initial load
   if (nutsNameInput && currentVersion === "v0.2") {
     nutsNameInput.value = "France";
     // Trigger the search to update results
     onNutsNameChange();
-  } else {
-    renderNutsResults();
   }
+
+  await loading;
+  scheduleRender();
 });
\ No newline at end of file